@@ -0,0 +1,127 @@
+"""Measure article search latency on a large synthetic ``articles`` table.
+
+Loads ``--rows`` generated articles (skipped with ``--skip-load``), makes
+sure the search indexes exist, then times the first page and a few
+keyset-paginated follow-up pages for a set of query terms, with and without
+filters. Run it against a scratch MySQL database, e.g.::
+
+    MYSQL_DB=bench python -m benchmarks.article_search --rows 2000000
+
+``--url`` takes any SQLAlchemy URL; on SQLite the search falls back to
+``LIKE`` scans, which is useful only as a baseline.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from common_utils import get_engine
+from services.core_engine.database import ensure_indexes, init_db
+from services.core_engine.models import Article
+from services.management_api.search import search_articles
+
+WORDS = (
+    "election market storm earthquake vaccine football climate energy court "
+    "strike budget protest summit inflation wildfire satellite merger border "
+    "harvest drought festival airline tariff refugee pipeline verdict"
+).split()
+FILLER = "the a of to in and for on with at by from report said officials new".split()
+HOSTS = [f"news{i}.example.com" for i in range(50)]
+STATUSES = ["PENDING_APPROVAL", "APPROVED", "PUBLISHED", "REJECTED"]
+
+
+def fake_text(rng: random.Random, words: int) -> str:
+    # Topic words follow a skewed distribution, as real news terms do.
+    return " ".join(
+        rng.choices(WORDS, weights=range(len(WORDS), 0, -1))[0]
+        if rng.random() < 0.3
+        else rng.choice(FILLER)
+        for _ in range(words)
+    )
+
+
+def load(engine, rows: int, batch: int = 10000, seed: int = 1) -> None:
+    rng = random.Random(seed)
+    start = datetime.utcnow() - timedelta(days=365)
+    with engine.begin() as conn:
+        done = conn.execute(select(func.count()).select_from(Article)).scalar()
+    while done < rows:
+        values = []
+        for i in range(done, min(done + batch, rows)):
+            text = fake_text(rng, 120)
+            values.append(
+                {
+                    "source_url": f"https://{rng.choice(HOSTS)}/{i}",
+                    "content": text,
+                    "translated_content": text,
+                    "summary": fake_text(rng, 30),
+                    "status": rng.choice(STATUSES),
+                    "created_at": start + timedelta(seconds=rng.randrange(365 * 86400)),
+                }
+            )
+        with engine.begin() as conn:
+            conn.execute(insert(Article), values)
+        done += len(values)
+        print(f"loaded {done}/{rows}", flush=True)
+
+
+def timed_search(db: Session, pages: int, **kwargs):
+    timings = []
+    cursor = None
+    for _ in range(pages):
+        started = time.perf_counter()
+        _, cursor = search_articles(db, cursor=cursor, **kwargs)
+        timings.append(time.perf_counter() - started)
+        if cursor is None:
+            break
+    return timings
+
+
+def report(name: str, timings) -> None:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(
+        f"{name:<28} n={len(timings):<4} p50={statistics.median(timings) * 1000:8.1f}ms "
+        f"p95={p95 * 1000:8.1f}ms max={timings[-1] * 1000:8.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="SQLAlchemy URL (default: the MYSQL_* settings)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--terms", type=int, default=10, help="query terms to time")
+    parser.add_argument("--pages", type=int, default=5, help="pages per query")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url) if args.url else get_engine()
+    init_db(engine)
+    ensure_indexes(engine)
+    if not args.skip_load:
+        load(engine, args.rows)
+
+    first, later, filtered = [], [], []
+    since = datetime.utcnow() - timedelta(days=30)
+    with Session(engine) as db:
+        for term in WORDS[: args.terms]:
+            timings = timed_search(db, args.pages, query=term, limit=20)
+            first.append(timings[0])
+            later.extend(timings[1:])
+            filtered.extend(
+                timed_search(
+                    db, 1, query=term, limit=20, status="PUBLISHED", source=HOSTS[0], since=since
+                )
+            )
+    report("first page", first)
+    if later:
+        report(f"pages 2-{args.pages} (keyset)", later)
+    report("filtered first page", filtered)
+
+
+if __name__ == "__main__":
+    main()
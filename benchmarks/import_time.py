@@ -0,0 +1,121 @@
+"""Measure how long each service takes to import, against a budget.
+
+Every service module is imported ``--repeat`` times in a fresh interpreter
+with ``python -X importtime``; the median cumulative time of the top-level
+module is compared with its budget, and the slowest imports beneath it
+are listed to show where the time goes::
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget core_engine=1500 --top 15
+
+Exits with status 1 if a service is over budget, so it can gate CI. Run
+it in each service's image for realistic numbers; a service whose
+dependencies are missing is reported and skipped.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICES = {
+    "source_crawler": "services.source_crawler.app",
+    "core_engine": "services.core_engine.app",
+    "telegram_bot": "services.telegram_bot.app",
+    "publisher_service": "services.publisher_service.app",
+    "management_api": "services.management_api.main",
+    "common_utils": "common_utils",
+}
+
+# Milliseconds, with headroom over a warm-cache run in the service images.
+BUDGETS_MS = {
+    "source_crawler": 600,
+    "core_engine": 800,
+    "telegram_bot": 1000,
+    "publisher_service": 800,
+    "management_api": 1000,
+    "common_utils": 50,
+}
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """``(module, self_us, cumulative_us)`` for each ``-X importtime`` line."""
+    rows = []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+
+def measure(module: str) -> Optional[List[Tuple[str, int, int]]]:
+    """Import ``module`` in a fresh interpreter; ``None`` if the import fails."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    if result.returncode != 0:
+        print(f"  import failed: {result.stderr.strip().splitlines()[-1]}")
+        return None
+    return parse_importtime(result.stderr)
+
+
+def total_us(rows: Sequence[Tuple[str, int, int]], module: str) -> int:
+    return next(cumulative for name, _, cumulative in rows if name == module)
+
+
+def parse_budgets(values: Sequence[str]) -> Dict[str, int]:
+    budgets = dict(BUDGETS_MS)
+    for value in values:
+        service, _, ms = value.partition("=")
+        if service not in SERVICES:
+            raise SystemExit(f"Unknown service: {service}")
+        budgets[service] = int(ms)
+    return budgets
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("services", nargs="*", help=f"default: all of {', '.join(SERVICES)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument(
+        "--budget", action="append", default=[], metavar="SERVICE=MS", help="override a budget"
+    )
+    args = parser.parse_args(argv)
+    budgets = parse_budgets(args.budget)
+
+    over = []
+    for service in args.services or SERVICES:
+        module = SERVICES[service]
+        print(f"{service} ({module})")
+        runs = []
+        for _ in range(args.repeat):
+            rows = measure(module)
+            if rows is None:
+                break
+            runs.append(rows)
+        if not runs:
+            continue
+        median_ms = statistics.median(total_us(rows, module) for rows in runs) / 1000
+        verdict = "ok" if median_ms <= budgets[service] else "OVER BUDGET"
+        print(f"  {median_ms:.1f} ms (budget {budgets[service]} ms) {verdict}")
+        if verdict != "ok":
+            over.append(service)
+        slowest = sorted(runs[-1], key=lambda row: row[1], reverse=True)[: args.top]
+        for name, self_us, cumulative_us in slowest:
+            print(f"    {self_us / 1000:7.1f} ms self {cumulative_us / 1000:8.1f} ms total  {name}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,20 @@
-from .db import get_engine, get_session, session_scope
-from .rabbitmq import get_rabbitmq_connection
-from .logging import configure_logging
-from .crypto import decrypt_env_var
+"""Shared helpers for the Robopost services.
+
+The names below are imported from their submodules on first access, so
+importing ``common_utils`` (or one light submodule such as
+``common_utils.lanes``) does not load SQLAlchemy, pika, python-json-logger
+and cryptography up front.
+"""
+import importlib
+
+_EXPORTS = {
+    "get_engine": "db",
+    "get_session": "db",
+    "session_scope": "db",
+    "get_rabbitmq_connection": "rabbitmq",
+    "configure_logging": "logging",
+    "decrypt_env_var": "crypto",
+}
 
 __all__ = [
     "get_engine",
@@ -10,3 +23,17 @@ __all__ = [
     "configure_logging",
     "decrypt_env_var",
 ]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Later lookups find it directly, without coming back here.
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -1,7 +1,44 @@
+"""Fernet encryption for secrets in env vars and database columns.
+
+``FERNET_KEYS`` holds comma-separated keys, newest first: values are
+encrypted with the first and decrypted with any of them, so a key is
+rotated by prepending a new one, re-encrypting the stored values (see
+``python -m services.management_api.credentials``) and then
+dropping the old key.
+"""
+import hashlib
 import os
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from .metrics import counter
+
+KEYS_ENV_VAR = "FERNET_KEYS"
+KEY_ENV_VAR = "FERNET_KEY"
+CACHE_SIZE_ENV_VAR = "DECRYPT_CACHE_SIZE"
+
+CACHE_LOOKUPS = counter(
+    "decrypt_cache_lookups_total",
+    "Field decryptions by cache result.",
+    ("result",),
+)
+
+
+_env_fernets: Dict[str, Fernet] = {}
+_env_fernets_lock = threading.Lock()
 
-from cryptography.fernet import Fernet, InvalidToken
+
+def _env_fernet(key: str) -> Fernet:
+    # Built once per key rather than on every decrypt_env_var call.
+    with _env_fernets_lock:
+        fernet = _env_fernets.get(key)
+        if fernet is None:
+            fernet = Fernet(key.encode())
+            _env_fernets[key] = fernet
+        return fernet
 
 
 def decrypt_env_var(var_name: str, key_env_var: str = "FERNET_KEY") -> Optional[str]:
@@ -19,8 +56,88 @@ def decrypt_env_var(var_name: str, key_env_var: str = "FERNET_KEY") -> Optional[
     key = os.getenv(key_env_var)
     if not encrypted_value or not key:
         return None
-    fernet = Fernet(key.encode())
     try:
-        return fernet.decrypt(encrypted_value.encode()).decode()
+        return _env_fernet(key).decrypt(encrypted_value.encode()).decode()
     except InvalidToken:
-        return None
\ No newline at end of file
+        return None
+
+
+def keys_from_env() -> List[str]:
+    """``FERNET_KEYS``, newest first, or else the single ``FERNET_KEY``."""
+    raw = os.getenv(KEYS_ENV_VAR) or os.getenv(KEY_ENV_VAR) or ""
+    return [key.strip() for key in raw.split(",") if key.strip()]
+
+
+class FieldCipher:
+    """Encrypt values with the newest key and decrypt them with a cache.
+
+    Decrypted plaintexts are kept in an LRU of ``cache_size`` entries keyed
+    by the SHA-256 of the ciphertext, so reading the same value again costs
+    a hash instead of an HMAC check and AES decryption.
+    """
+
+    def __init__(self, keys: List[str], cache_size: int = 1024) -> None:
+        if not keys:
+            raise ValueError(f"No encryption keys; set {KEYS_ENV_VAR}")
+        self._fernets = [Fernet(key.encode()) for key in keys]
+        self._multi = MultiFernet(self._fernets)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encrypt(self, plaintext: bytes) -> str:
+        return self._multi.encrypt(plaintext).decode()
+
+    def decrypt(self, token: str) -> bytes:
+        """Plaintext of ``token``; raises ``InvalidToken`` if no key fits."""
+        digest = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            plaintext = self._cache.get(digest)
+            if plaintext is not None:
+                self._cache.move_to_end(digest)
+        if plaintext is not None:
+            CACHE_LOOKUPS.labels("hit").inc()
+            return plaintext
+        CACHE_LOOKUPS.labels("miss").inc()
+        plaintext = self._multi.decrypt(token.encode())
+        with self._lock:
+            self._cache[digest] = plaintext
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return plaintext
+
+    def is_current(self, token: str) -> bool:
+        """Whether ``token`` is encrypted with the newest key."""
+        try:
+            self._fernets[0].decrypt(token.encode())
+        except InvalidToken:
+            return False
+        return True
+
+    def rotate(self, token: str) -> str:
+        """``token`` re-encrypted with the newest key."""
+        return self._multi.rotate(token.encode()).decode()
+
+
+_ciphers: Dict[Tuple[str, ...], FieldCipher] = {}
+_ciphers_lock = threading.Lock()
+
+
+def field_cipher() -> FieldCipher:
+    """The process-wide cipher for the keys currently in the environment."""
+    keys = tuple(keys_from_env())
+    with _ciphers_lock:
+        cipher = _ciphers.get(keys)
+        if cipher is None:
+            size = int(os.getenv(CACHE_SIZE_ENV_VAR, "1024"))
+            cipher = FieldCipher(list(keys), size)
+            _ciphers[keys] = cipher
+        return cipher
+
+
+def is_plaintext_json(value: str) -> bool:
+    """Whether a stored value predates encryption.
+
+    Fernet tokens never start with these characters.
+    """
+    return value.lstrip()[:1] in ("{", "[", '"')
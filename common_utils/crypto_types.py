@@ -0,0 +1,34 @@
+"""SQLAlchemy column types for encrypted values.
+
+Kept apart from :mod:`common_utils.crypto` so that decrypting env vars
+does not load SQLAlchemy.
+"""
+import json
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+from .crypto import field_cipher, is_plaintext_json
+
+
+class EncryptedJSON(TypeDecorator):
+    """A JSON value stored as a Fernet token in a text column.
+
+    Values written before the column was encrypted are still read as plain
+    JSON until they are re-encrypted.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return field_cipher().encrypt(json.dumps(value).encode())
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if is_plaintext_json(value):
+            return json.loads(value)
+        return json.loads(field_cipher().decrypt(value))
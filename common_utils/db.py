@@ -1,8 +1,11 @@
 import os
+import time
 from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from .metrics import DB_SESSION_SECONDS
+
 _engine = None
 _SessionLocal = None
 
@@ -32,12 +35,16 @@ def get_session():
 @contextmanager
 def session_scope():
     session = get_session()
+    start = time.perf_counter()
+    outcome = "commit"
     try:
         yield session
         session.commit()
     except Exception:
         # Roll back to prevent partial transactions from being committed on failure
+        outcome = "rollback"
         session.rollback()
         raise
     finally:
         session.close()
+        DB_SESSION_SECONDS.labels(outcome).observe(time.perf_counter() - start)
@@ -0,0 +1,192 @@
+"""Liveness, readiness and backlog endpoints for the worker services.
+
+:class:`Health` adds ``/healthz``, ``/readyz`` and ``/lag`` to the exporter
+started by :func:`common_utils.metrics.start_metrics_server`:
+
+* ``/healthz`` fails when the consume loop has not sent a heartbeat for
+  ``HEALTH_STALE_SECONDS`` (which must exceed the slowest message), i.e.
+  ``start_consuming`` is hung;
+* ``/readyz`` runs the registered checks (database, broker);
+* ``/lag`` reports in-flight messages and queue depths, which are also
+  exported as gauges for autoscaling on backlog.
+
+Queue depths come from passive ``queue_declare`` calls made by
+:func:`watch_queues` on the consumer's own connection, since pika
+connections must not be used from the HTTP thread.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from .metrics import gauge, register_route
+
+STALE_ENV_VAR = "HEALTH_STALE_SECONDS"
+INTERVAL_ENV_VAR = "HEALTH_QUEUE_INTERVAL_SECONDS"
+
+QUEUE_DEPTH = gauge(
+    "rabbitmq_queue_depth", "Messages ready in a queue.", ("queue",)
+)
+IN_FLIGHT = gauge(
+    "consumer_in_flight", "Messages being handled by this process."
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _json(status: int, body: Dict) -> Tuple[int, str, bytes]:
+    return status, "application/json", json.dumps(body).encode()
+
+
+class Health:
+    """Heartbeat, in-flight count, queue depths and readiness checks."""
+
+    def __init__(
+        self,
+        stale_after: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.stale_after = stale_after
+        self._clock = clock
+        self._last_beat = clock()
+        self._in_flight = 0
+        self._queues: Dict[str, int] = {}
+        self._checks: Dict[str, Callable[[], bool]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Health":
+        return cls(stale_after=float(os.getenv(STALE_ENV_VAR, "300")))
+
+    def beat(self) -> None:
+        self._last_beat = self._clock()
+
+    def started(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            IN_FLIGHT.set(self._in_flight)
+
+    def finished(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            IN_FLIGHT.set(self._in_flight)
+
+    @contextmanager
+    def track(self):
+        """Count the block as one in-flight message."""
+        self.beat()
+        self.started()
+        try:
+            yield
+        finally:
+            self.finished()
+            self.beat()
+
+    def set_queue_depth(self, queue: str, depth: int) -> None:
+        with self._lock:
+            self._queues[queue] = depth
+        QUEUE_DEPTH.labels(queue).set(depth)
+
+    def add_check(self, name: str, check: Callable[[], bool]) -> None:
+        self._checks[name] = check
+
+    def liveness(self) -> Tuple[int, str, bytes]:
+        age = self._clock() - self._last_beat
+        alive = age < self.stale_after
+        body = {"alive": alive, "heartbeat_age_seconds": round(age, 1)}
+        return _json(200 if alive else 503, body)
+
+    def readiness(self) -> Tuple[int, str, bytes]:
+        results = {}
+        for name, check in self._checks.items():
+            try:
+                results[name] = bool(check())
+            except Exception:
+                logger.warning(
+                    "Readiness check failed",
+                    extra={"check": name},
+                    exc_info=True,
+                )
+                results[name] = False
+        ready = all(results.values())
+        return _json(
+            200 if ready else 503, {"ready": ready, "checks": results}
+        )
+
+    def lag(self) -> Tuple[int, str, bytes]:
+        with self._lock:
+            body = {"in_flight": self._in_flight, "queues": dict(self._queues)}
+        body["heartbeat_age_seconds"] = round(
+            self._clock() - self._last_beat, 1
+        )
+        return _json(200, body)
+
+    def register(self) -> "Health":
+        register_route("/healthz", self.liveness)
+        register_route("/readyz", self.readiness)
+        register_route("/lag", self.lag)
+        return self
+
+
+def database_check() -> bool:
+    # Imported on first use, so importing this module does not load SQLAlchemy.
+    from sqlalchemy import text
+
+    from .db import get_engine
+
+    with get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+    return True
+
+
+def broker_check(conn) -> Callable[[], bool]:
+    return lambda: bool(conn.is_open)
+
+
+def update_queue_depths(
+    channel, queues: Iterable[str], health: Health
+) -> None:
+    """Beat and record each queue's depth with a passive declare."""
+    health.beat()
+    for queue in queues:
+        try:
+            result = channel.queue_declare(queue=queue, passive=True)
+        except Exception:
+            logger.warning(
+                "Failed to read queue depth",
+                extra={"queue": queue},
+                exc_info=True,
+            )
+            continue
+        health.set_queue_depth(queue, result.method.message_count)
+
+
+def watch_queues(
+    conn,
+    queues: Iterable[str],
+    health: Health,
+    interval: Optional[float] = None,
+) -> None:
+    """Refresh the heartbeat and queue depths from ``conn``'s I/O loop.
+
+    Runs every ``interval`` seconds (``HEALTH_QUEUE_INTERVAL_SECONDS``,
+    default 15) for as long as ``start_consuming`` keeps servicing timers,
+    which is what makes the heartbeat a liveness signal. The declares use a
+    channel of their own, as a missing queue makes the broker close it.
+    """
+    if interval is None:
+        interval = float(os.getenv(INTERVAL_ENV_VAR, "15"))
+    queues = list(queues)
+    probe = {}
+
+    def tick() -> None:
+        channel = probe.get("channel")
+        if channel is None or not getattr(channel, "is_open", True):
+            channel = probe["channel"] = conn.channel()
+        update_queue_depths(channel, queues, health)
+        conn.call_later(interval, tick)
+
+    tick()
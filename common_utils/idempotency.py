@@ -0,0 +1,91 @@
+"""Processed-message ledger for idempotent consumers.
+
+RabbitMQ delivers at least once: a worker that commits its result and then
+dies before acking gets the message again. Consumers record each message
+key in ``processed_messages`` in the same transaction as the result, and
+check it with one primary-key lookup before doing any expensive work, so a
+redelivery is acked without repeating the work or its side effects. If two
+workers race on the same key, the primary key makes the second commit fail
+and its result is rolled back with it.
+
+Keys are hashed to a fixed width and kept for ``LEDGER_RETENTION_DAYS``.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, String, delete
+from sqlalchemy.orm import declarative_base
+
+RETENTION_ENV_VAR = "LEDGER_RETENTION_DAYS"
+PRUNE_INTERVAL_ENV_VAR = "LEDGER_PRUNE_INTERVAL_SECONDS"
+
+Base = declarative_base()
+
+
+class ProcessedMessage(Base):
+    __tablename__ = "processed_messages"
+
+    consumer = Column(String(32), primary_key=True)
+    key = Column(String(40), primary_key=True)
+    processed_at = Column(DateTime, nullable=False, index=True)
+
+
+def message_key(value) -> str:
+    """Fixed-width key for a message id, URL or other identifier."""
+    if isinstance(value, str):
+        value = value.encode()
+    return hashlib.sha1(value).hexdigest()
+
+
+def init_db(engine) -> None:
+    Base.metadata.create_all(bind=engine)
+
+
+def already_processed(db, consumer: str, key: str) -> bool:
+    return db.get(ProcessedMessage, (consumer, key)) is not None
+
+
+def record_processed(
+    db, consumer: str, key: str, now: Optional[datetime] = None
+) -> None:
+    """Add ``key`` to the ledger as part of ``db``'s transaction."""
+    processed_at = now or datetime.utcnow()
+    db.add(
+        ProcessedMessage(consumer=consumer, key=key, processed_at=processed_at)
+    )
+
+
+def retention() -> timedelta:
+    return timedelta(days=float(os.getenv(RETENTION_ENV_VAR, "7")))
+
+
+def prune_processed(
+    db, older_than: timedelta, now: Optional[datetime] = None
+) -> int:
+    """Forget keys recorded more than ``older_than`` ago; return how many."""
+    cutoff = (now or datetime.utcnow()) - older_than
+    result = db.execute(
+        delete(ProcessedMessage).where(ProcessedMessage.processed_at < cutoff)
+    )
+    return result.rowcount
+
+
+def prune_periodically(
+    conn, session_scope, interval: Optional[float] = None
+) -> None:
+    """Prune the ledger from ``conn``'s I/O loop every ``interval`` seconds.
+
+    ``LEDGER_PRUNE_INTERVAL_SECONDS`` defaults to an hour; the first run
+    happens one interval after start-up.
+    """
+    if interval is None:
+        interval = float(os.getenv(PRUNE_INTERVAL_ENV_VAR, "3600"))
+
+    def tick() -> None:
+        with session_scope() as db:
+            prune_processed(db, retention())
+        conn.call_later(interval, tick)
+
+    conn.call_later(interval, tick)
@@ -0,0 +1,153 @@
+"""Priority lanes for the pipeline queues.
+
+Each logical queue is split into one queue per lane: ``high`` items (e.g.
+breaking news) go to ``<queue>.high``, ``normal`` ones keep the original
+queue name and ``low`` ones (backfill) go to ``<queue>.low``. Separate
+queues are used rather than ``x-max-priority`` so existing queues need not
+be redeclared.
+
+:func:`consume_lanes` buffers deliveries from every lane and hands them to
+the handler in smooth weighted round-robin order, so a backlog in a lower
+lane cannot delay higher ones by more than its share.
+"""
+import os
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .metrics import instrument_callback
+
+HIGH = "high"
+NORMAL = "normal"
+LOW = "low"
+LANES = (HIGH, NORMAL, LOW)
+
+HEADER = "priority"
+WEIGHTS_ENV_VAR = "LANE_WEIGHTS"
+PREFETCH_ENV_VAR = "LANE_PREFETCH"
+
+DEFAULT_WEIGHTS = {HIGH: 8, NORMAL: 3, LOW: 1}
+
+
+def normalize_lane(value) -> str:
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "replace")
+    value = (value or "").strip().lower()
+    return value if value in LANES else NORMAL
+
+
+def lane_for_headers(headers: Optional[Dict]) -> str:
+    """Lane named by a message's ``priority`` header, normal if absent."""
+    return normalize_lane((headers or {}).get(HEADER))
+
+
+def lane_queue(base: str, lane: str) -> str:
+    """Queue name for ``lane`` of the logical queue ``base``."""
+    lane = normalize_lane(lane)
+    return base if lane == NORMAL else f"{base}.{lane}"
+
+
+def lane_queues(base: str) -> List[str]:
+    return [lane_queue(base, lane) for lane in LANES]
+
+
+def declare_lanes(channel, base: str) -> None:
+    for queue in lane_queues(base):
+        channel.queue_declare(queue=queue, durable=True)
+
+
+def weights_from_env() -> Dict[str, int]:
+    """Parse ``LANE_WEIGHTS`` such as ``high=8,normal=3,low=1``."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in os.getenv(WEIGHTS_ENV_VAR, "").split(","):
+        lane, sep, weight = item.partition("=")
+        if sep and lane.strip() in LANES:
+            weights[lane.strip()] = max(1, int(weight))
+    return weights
+
+
+class WeightedLanes:
+    """Per-lane FIFO buffers drained by smooth weighted round-robin.
+
+    Among lanes holding items, each pick adds every lane's weight to its
+    credit and takes from the lane with the most credit, which then pays
+    the total weight. Over any stretch where all lanes are busy, lane ``l``
+    gets ``weight[l] / sum(weights)`` of the picks, interleaved rather than
+    in bursts.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, int]] = None) -> None:
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self._items: Dict[str, Deque] = {lane: deque() for lane in LANES}
+        self._credit: Dict[str, int] = {lane: 0 for lane in LANES}
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._items.values())
+
+    def push(self, lane: str, item) -> None:
+        self._items[normalize_lane(lane)].append(item)
+
+    def pop(self) -> Optional[Tuple[str, object]]:
+        ready = [lane for lane in LANES if self._items[lane]]
+        if not ready:
+            return None
+        total = 0
+        for lane in ready:
+            self._credit[lane] += self.weights[lane]
+            total += self.weights[lane]
+        lane = max(ready, key=lambda name: self._credit[name])
+        self._credit[lane] -= total
+        item = self._items[lane].popleft()
+        if not self._items[lane]:
+            # An idle lane does not bank credit for later.
+            self._credit[lane] = 0
+        return lane, item
+
+
+def consume_lanes(
+    conn,
+    channel,
+    base: str,
+    handler: Callable,
+    weights: Optional[Dict[str, int]] = None,
+    prefetch: Optional[int] = None,
+    poll: float = 1.0,
+) -> None:
+    """Consume every lane of ``base`` and call ``handler`` in weighted order.
+
+    ``handler`` has the usual pika callback signature and is responsible for
+    acking. ``prefetch`` (``LANE_PREFETCH``, default 10) bounds how many
+    unacked messages each lane's consumer holds locally. A ``priority``
+    header overrides the lane a message arrived on, so messages that went
+    through a shared queue (e.g. a retry or defer queue) keep their lane.
+    Returns when the connection closes.
+    """
+    if prefetch is None:
+        prefetch = int(os.getenv(PREFETCH_ENV_VAR, "10"))
+    if weights is None:
+        weights = weights_from_env()
+    lanes = WeightedLanes(weights)
+    raw = getattr(channel, "wrapped", channel)
+    # Per-consumer limit, so a full low lane cannot use up the high lane's
+    # share.
+    raw.basic_qos(prefetch_count=prefetch)
+
+    for lane in LANES:
+        queue = lane_queue(base, lane)
+        instrumented = instrument_callback(queue, handler, channel)
+
+        def buffer(
+            ch, method, properties, body, lane=lane, instrumented=instrumented
+        ):
+            headers = getattr(properties, "headers", None) or {}
+            chosen = normalize_lane(headers.get(HEADER, lane))
+            lanes.push(chosen, (instrumented, ch, method, properties, body))
+
+        raw.basic_consume(queue=queue, on_message_callback=buffer)
+
+    while conn.is_open:
+        # Take in everything that has arrived before choosing what to run.
+        conn.process_data_events(time_limit=0 if lanes else poll)
+        picked = lanes.pop()
+        if picked is not None:
+            _, (instrumented, ch, method, properties, body) = picked
+            instrumented(ch, method, properties, body)
@@ -1,17 +1,161 @@
+import atexit
+import itertools
+import json
 import logging
 import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
 from pythonjsonlogger import jsonlogger
 
+try:  # pragma: no cover - exercised when orjson is installed
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from .metrics import counter
+
+ASYNC_ENV_VAR = "LOG_ASYNC"
+QUEUE_SIZE_ENV_VAR = "LOG_QUEUE_SIZE"
+LEVELS_ENV_VAR = "LOG_LEVELS"
+SAMPLE_ENV_VAR = "LOG_SAMPLE_RATES"
+
+DROPPED = counter(
+    "log_records_dropped_total",
+    "Log records dropped because the log queue was full.",
+)
+
+_listener: Optional[QueueListener] = None
+
+
+def _dumps(obj, default=None, **_kwargs) -> str:
+    """JSON serializer for ``JsonFormatter``, using orjson when available."""
+    if orjson is None:
+        return json.dumps(obj, default=default, ensure_ascii=False)
+    return orjson.dumps(
+        obj, default=default or str, option=orjson.OPT_NON_STR_KEYS
+    ).decode()
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    """Parse ``"a=1,b=2"`` into ``{"a": "1", "b": "2"}``."""
+    pairs = {}
+    for item in value.split(","):
+        name, sep, setting = item.rpartition("=")
+        if sep and name.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of high-volume records.
+
+    ``rates`` maps a message format string (the first argument to
+    ``logger.info``) to the fraction of its records to keep; one record in
+    every ``round(1 / rate)`` passes. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.every = {
+            msg: max(1, round(1 / rate)) if rate > 0 else 0
+            for msg, rate in rates.items()
+        }
+        self._counters = {msg: itertools.count() for msg in self.every}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        every = (
+            self.every.get(record.msg) if isinstance(record.msg, str) else None
+        )
+        if every is None:
+            return True
+        if every == 0:
+            return False
+        with self._lock:
+            return next(self._counters[record.msg]) % every == 0
+
+
+class _QueueHandler(QueueHandler):
+    """Queue records for the listener thread, leaving JSON encoding to it.
+
+    Only the message interpolation and traceback rendering happen in the
+    logging thread. When the queue is full the record is dropped rather
+    than blocking the caller.
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(
+                record.exc_info
+            )
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
 
 def configure_logging():
+    """Configure JSON logging on the root logger once per process.
+
+    By default records are handed to a background thread through a queue
+    (``LOG_ASYNC=false`` writes synchronously). ``LOG_LEVELS`` sets levels
+    per logger, e.g. ``pika=WARNING,services.core_engine=DEBUG``, and
+    ``LOG_SAMPLE_RATES`` keeps only a fraction of chosen messages, e.g.
+    ``Published new URL=0.1``.
+    """
+    global _listener
     level = os.getenv("LOG_LEVEL", "INFO").upper()
     logger = logging.getLogger()
     if logger.handlers:
         return logger
 
+    levels = _parse_pairs(os.getenv(LEVELS_ENV_VAR, ""))
+    for name, logger_level in levels.items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
     handler = logging.StreamHandler()
-    formatter = jsonlogger.JsonFormatter()
+    formatter = jsonlogger.JsonFormatter(json_serializer=_dumps)
     handler.setFormatter(formatter)
     logger.setLevel(level)
-    logger.addHandler(handler)
+
+    if os.getenv(ASYNC_ENV_VAR, "true").lower() in ("1", "true", "yes"):
+        records = queue.Queue(int(os.getenv(QUEUE_SIZE_ENV_VAR, "10000")))
+        front = _QueueHandler(records)
+        _stop_listener()
+        _listener = QueueListener(records, handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        front = handler
+
+    rates = _parse_pairs(os.getenv(SAMPLE_ENV_VAR, ""))
+    if rates:
+        front.addFilter(
+            SamplingFilter({msg: float(rate) for msg, rate in rates.items()})
+        )
+    logger.addHandler(front)
     return logger
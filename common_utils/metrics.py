@@ -0,0 +1,422 @@
+"""In-process metrics with a Prometheus text exporter.
+
+Counters, gauges and histograms live in a process-wide :data:`REGISTRY` and
+are served by :func:`start_metrics_server` on ``/metrics`` in the Prometheus
+text exposition format, so no client library is needed in the images.
+"""
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+PORT_ENV_VAR = "METRICS_PORT"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Prometheus client defaults, extended for slow network and model calls.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(
+    names: Sequence[str], values: Sequence[str], extra: str = ""
+) -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """Base for metric families: one child per combination of label values."""
+
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """Return the child for one combination of label values."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} requires labels {self.labelnames}")
+        return self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child for a new combination of label values."""
+
+    @abstractmethod
+    def _samples(self, key, child) -> List[str]:
+        """Exposition lines for the child with label values ``key``."""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(self._samples(key, child))
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = float(value)
+
+
+class Counter(_Metric):
+    """A monotonically increasing count; names should end in ``_total``."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def _samples(self, key, child) -> List[str]:
+        labels = _format_labels(self.labelnames, key)
+        return [f"{self.name}{labels} {_format_value(child.value)}"]
+
+
+class Gauge(Counter):
+    """A value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, e.g. durations in seconds."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _Histogram:
+        return _Histogram(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _samples(self, key, child) -> List[str]:
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            labels = _format_labels(self.labelnames, key, le)
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(
+                    f"{name} is already registered as a {metric.kind}"
+                )
+            return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames, buckets
+        )
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# Shared instrumentation used by common_utils and the services.
+MESSAGES_CONSUMED = counter(
+    "rabbitmq_messages_consumed_total",
+    "Messages handled by a consumer.",
+    ("queue", "outcome"),
+)
+MESSAGE_HANDLE_SECONDS = histogram(
+    "rabbitmq_message_handle_seconds",
+    "Time spent handling one message.",
+    ("queue",),
+)
+MESSAGES_PUBLISHED = counter(
+    "rabbitmq_messages_published_total",
+    "Messages published.",
+    ("routing_key",),
+)
+DB_SESSION_SECONDS = histogram(
+    "db_session_seconds", "Duration of session_scope blocks.", ("outcome",)
+)
+TELEGRAM_SENDS = counter(
+    "telegram_sends_total",
+    "Telegram API calls made by the send scheduler.",
+    ("outcome",),
+)
+TELEGRAM_SEND_SECONDS = histogram(
+    "telegram_send_seconds", "Duration of Telegram API calls.", ()
+)
+TELEGRAM_QUEUE_DEPTH = gauge(
+    "telegram_send_queue_depth",
+    "Sends waiting in the scheduler.",
+    ("priority",),
+)
+
+
+def instrument_callback(queue: str, callback, channel):
+    """Count and time ``callback`` as the handler for messages from ``queue``.
+
+    The wrapped callback is called with ``channel`` in place of the channel
+    pika passes in.
+    """
+    handle_seconds = MESSAGE_HANDLE_SECONDS.labels(queue)
+
+    def instrumented(ch, method, properties, body):
+        outcome = "error"
+        try:
+            with handle_seconds.time():
+                result = callback(channel, method, properties, body)
+            outcome = "ok"
+            return result
+        finally:
+            MESSAGES_CONSUMED.labels(queue, outcome).inc()
+
+    return instrumented
+
+
+class InstrumentedChannel:
+    """Wrap a pika channel to count and time consumed and published messages.
+
+    Everything else is delegated to the wrapped channel. Consumer callbacks
+    receive the wrapper, so publishes made while handling a message are
+    counted too.
+    """
+
+    def __init__(self, channel) -> None:
+        self._channel = channel
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+    @property
+    def wrapped(self):
+        return self._channel
+
+    def basic_publish(self, exchange, routing_key, body, **kwargs):
+        result = self._channel.basic_publish(
+            exchange=exchange, routing_key=routing_key, body=body, **kwargs
+        )
+        MESSAGES_PUBLISHED.labels(routing_key or exchange).inc()
+        return result
+
+    def basic_consume(self, queue, on_message_callback, **kwargs):
+        return self._channel.basic_consume(
+            queue=queue,
+            on_message_callback=instrument_callback(
+                queue, on_message_callback, self
+            ),
+            **kwargs,
+        )
+
+
+# Extra paths served next to /metrics: path -> handler returning
+# ``(status, content_type, body)``.
+ROUTES: Dict[str, Callable[[], Tuple[int, str, bytes]]] = {}
+
+
+def register_route(
+    path: str, handler: Callable[[], Tuple[int, str, bytes]]
+) -> None:
+    ROUTES[path] = handler
+
+
+ROUTES["/metrics"] = lambda: (200, CONTENT_TYPE, REGISTRY.render().encode())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        handler = ROUTES.get(self.path.split("?", 1)[0])
+        if handler is None:
+            status, content_type, body = 404, "text/plain", b"not found\n"
+        else:
+            try:
+                status, content_type, body = handler()
+            except Exception:
+                logger.exception(
+                    "Metrics endpoint failed", extra={"path": self.path}
+                )
+                status, content_type, body = 500, "text/plain", b"error\n"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # Scrapes every few seconds would drown the service's own logs.
+        pass
+
+
+def start_metrics_server(
+    port: Optional[int] = None, addr: str = ""
+) -> Optional[ThreadingHTTPServer]:
+    """Serve ``ROUTES`` from a daemon thread.
+
+    ``port`` defaults to ``METRICS_PORT`` (9100); setting that to an empty
+    value or ``0`` disables the exporter.
+    """
+    if port is None:
+        port = int(os.getenv(PORT_ENV_VAR, "9100") or 0)
+        if not port:
+            return None
+    try:
+        server = ThreadingHTTPServer((addr, port), _Handler)
+    except OSError:
+        # Metrics are not worth taking the service down for.
+        logger.exception(
+            "Metrics exporter failed to start", extra={"port": port}
+        )
+        return None
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    ).start()
+    logger.info(
+        "Metrics exporter listening", extra={"port": server.server_address[1]}
+    )
+    return server
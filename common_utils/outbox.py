@@ -0,0 +1,258 @@
+"""Transactional outbox for messages that follow a database write.
+
+Publishing to RabbitMQ after a commit loses the message if the process
+dies in between, and publishing before it announces data that may be
+rolled back. Instead, :func:`enqueue` adds the message to the
+``outbox_events`` table in the caller's transaction, and
+:class:`OutboxRelay` publishes committed rows in id order with publisher
+confirms, deleting each batch once the broker has acknowledged it. The
+writer never waits on the broker, and a message is only lost if its
+transaction is.
+
+A relay that dies between the broker's ack and the delete publishes that
+batch again, so consumers must tolerate duplicates (see
+:mod:`common_utils.idempotency`). Several relays can run at once: rows are
+claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``. Ordering then only
+holds per relay, as two relays publish their batches concurrently;
+consumers must not rely on a global order.
+
+``python -m common_utils.outbox`` runs a standalone relay for writers with
+no broker connection of their own.
+"""
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import pika
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    LargeBinary,
+    String,
+    delete,
+    select,
+)
+from sqlalchemy.orm import declarative_base
+
+from .metrics import InstrumentedChannel, counter, gauge
+
+BATCH_ENV_VAR = "OUTBOX_BATCH_SIZE"
+INTERVAL_ENV_VAR = "OUTBOX_POLL_SECONDS"
+
+RELAYED = counter(
+    "outbox_events_relayed_total", "Outbox events published to the broker."
+)
+FAILURES = counter(
+    "outbox_relay_failures_total", "Outbox events the broker did not confirm."
+)
+LAG = gauge(
+    "outbox_oldest_event_age_seconds",
+    "Age of the oldest event left after a relay run.",
+)
+
+Base = declarative_base()
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    exchange = Column(String(255), nullable=False, default="")
+    routing_key = Column(String(255), nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    content_type = Column(String(64))
+    headers = Column(JSON)
+    created_at = Column(DateTime, nullable=False)
+
+
+def init_db(engine) -> None:
+    Base.metadata.create_all(bind=engine)
+
+
+def enqueue(
+    db,
+    routing_key: str,
+    body: bytes,
+    headers: Optional[Dict] = None,
+    content_type: Optional[str] = None,
+    exchange: str = "",
+) -> None:
+    """Add a message to the outbox as part of ``db``'s transaction."""
+    db.add(
+        OutboxEvent(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            content_type=content_type,
+            headers=headers,
+            created_at=datetime.utcnow(),
+        )
+    )
+
+
+class OutboxRelay:
+    """Publish committed outbox events with publisher confirms.
+
+    ``channel`` should be dedicated to the relay, as confirm mode makes
+    every publish on it wait for the broker's ack. Queues on the default
+    exchange are declared before their first message, like the services'
+    own producers do. A channel the broker closed after an error is
+    replaced with a new one from the attached connection.
+    """
+
+    def __init__(
+        self,
+        channel,
+        session_scope: Callable,
+        batch_size: int = 100,
+        interval: float = 1.0,
+    ) -> None:
+        self._use(channel)
+        self.session_scope = session_scope
+        self.batch_size = batch_size
+        self.interval = interval
+        self._declared = set()
+        self._conn = None
+        self._woken = False
+
+    @classmethod
+    def from_env(cls, channel, session_scope: Callable) -> "OutboxRelay":
+        return cls(
+            channel,
+            session_scope,
+            batch_size=int(os.getenv(BATCH_ENV_VAR, "100")),
+            interval=float(os.getenv(INTERVAL_ENV_VAR, "1")),
+        )
+
+    def _use(self, channel) -> None:
+        channel.confirm_delivery()
+        self.channel = InstrumentedChannel(channel)
+
+    def _reopen_if_closed(self) -> None:
+        if self.channel.is_closed and self._conn is not None:
+            logger.info("Reopening closed outbox relay channel")
+            self._use(self._conn.channel())
+
+    def _publish(self, event: OutboxEvent) -> None:
+        if not event.exchange and event.routing_key not in self._declared:
+            self.channel.queue_declare(queue=event.routing_key, durable=True)
+            self._declared.add(event.routing_key)
+        self.channel.basic_publish(
+            exchange=event.exchange,
+            routing_key=event.routing_key,
+            body=event.body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                content_type=event.content_type,
+                headers=event.headers,
+                timestamp=int(time.time()),
+            ),
+        )
+
+    def publish_batch(self) -> int:
+        """Publish up to ``batch_size`` events and return how many were sent.
+
+        Stops at the first event the broker rejects; everything confirmed
+        before it is still deleted.
+        """
+        self._reopen_if_closed()
+        sent = []
+        with self.session_scope() as db:
+            events = (
+                db.execute(
+                    select(OutboxEvent)
+                    .order_by(OutboxEvent.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                .scalars()
+                .all()
+            )
+            for event in events:
+                try:
+                    self._publish(event)
+                except Exception:
+                    FAILURES.inc()
+                    logger.warning(
+                        "Failed to relay outbox event",
+                        extra={
+                            "id": event.id,
+                            "routing_key": event.routing_key,
+                        },
+                        exc_info=True,
+                    )
+                    break
+                sent.append(event.id)
+            if sent:
+                db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(sent)))
+            left = events[len(sent):]
+            oldest = left[0].created_at if left else None
+        RELAYED.inc(len(sent))
+        LAG.set((datetime.utcnow() - oldest).total_seconds() if oldest else 0)
+        return len(sent)
+
+    def publish_pending(self) -> int:
+        """Publish batches until the outbox is empty or the broker fails."""
+        self._woken = False
+        total = 0
+        while True:
+            sent = self.publish_batch()
+            total += sent
+            if sent < self.batch_size:
+                return total
+
+    def run_once(self) -> None:
+        # Runs inside the connection's I/O loop, which must not see errors.
+        try:
+            self.publish_pending()
+        except Exception:
+            logger.warning("Outbox relay run failed", exc_info=True)
+
+    def attach(self, conn) -> "OutboxRelay":
+        """Poll the outbox every ``interval`` seconds from ``conn``'s loop."""
+        self._conn = conn
+
+        def tick() -> None:
+            self.run_once()
+            conn.call_later(self.interval, tick)
+
+        conn.call_later(self.interval, tick)
+        return self
+
+    def wake(self) -> None:
+        """Relay as soon as the I/O loop is idle, e.g. right after a commit."""
+        if self._conn is not None and not self._woken:
+            self._woken = True
+            self._conn.call_later(0, self.run_once)
+
+
+def main() -> None:  # pragma: no cover - process entry point
+    from . import (
+        configure_logging,
+        get_engine,
+        get_rabbitmq_connection,
+        session_scope,
+    )
+
+    log = configure_logging()
+    log.info("Outbox relay starting")
+    init_db(get_engine())
+    conn = get_rabbitmq_connection()
+    OutboxRelay.from_env(conn.channel(), session_scope).attach(conn)
+    while conn.is_open:
+        conn.process_data_events(time_limit=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""On-demand profiling for long-running services.
+
+Three tools can be switched on together, at start-up with ``PROFILE=1`` or
+at runtime by sending ``SIGUSR1`` (send it again to stop and write the
+results to ``PROFILE_DIR``):
+
+* a sampling CPU profiler that records every thread's stack at a fixed
+  interval and writes them in the collapsed format used by flame graph
+  tools;
+* tracemalloc snapshots, written as the top allocation differences since
+  profiling started;
+* :func:`timed`, a decorator recording wall-clock time per stage.
+
+``PROFILE_MODES`` limits which of ``cpu``, ``memory`` and ``timers`` are
+used. When profiling is off nothing runs in the background and
+:func:`timed` costs a single flag check per call.
+"""
+import functools
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+ENABLED_ENV_VAR = "PROFILE"
+MODES_ENV_VAR = "PROFILE_MODES"
+DIR_ENV_VAR = "PROFILE_DIR"
+INTERVAL_ENV_VAR = "PROFILE_INTERVAL_SECONDS"
+TOP_ENV_VAR = "PROFILE_TOP_ALLOCATIONS"
+
+ALL_MODES = ("cpu", "memory", "timers")
+
+logger = logging.getLogger(__name__)
+
+# Read on every call to a ``timed`` function, so keep it a plain global.
+_timers_enabled = False
+_timings: Dict[str, list] = {}
+_timings_lock = threading.Lock()
+
+
+def _record(stage: str, elapsed: float) -> None:
+    with _timings_lock:
+        entry = _timings.get(stage)
+        if entry is None:
+            _timings[stage] = [1, elapsed, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+
+def timed(stage: Optional[str] = None) -> Callable:
+    """Record the wall-clock time of each call while profiling is on."""
+
+    def decorate(func: Callable) -> Callable:
+        name = stage or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _timers_enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+def stage_timings() -> Dict[str, Dict[str, float]]:
+    """Calls, total and maximum seconds per stage since timers were enabled."""
+    with _timings_lock:
+        return {
+            stage: {
+                "calls": calls,
+                "total_seconds": total,
+                "max_seconds": peak,
+            }
+            for stage, (calls, total, peak) in _timings.items()
+        }
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    where = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+    return f"{code.co_name} ({where})"
+
+
+class SamplingProfiler:
+    """Sample the stacks of all threads every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cpu-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Samples in ``stack;frames count`` lines, most frequent first."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.samples.most_common()
+        )
+
+
+class Profiler:
+    """Switches the profiling tools on and off and writes their results."""
+
+    def __init__(
+        self,
+        service: str,
+        directory: str = "/tmp/profiles",
+        modes=ALL_MODES,
+        interval: float = 0.01,
+        top: int = 25,
+    ) -> None:
+        self.service = service
+        self.directory = directory
+        self.modes = tuple(modes)
+        self.interval = interval
+        self.top = top
+        self.active = False
+        self._cpu: Optional[SamplingProfiler] = None
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, service: str) -> "Profiler":
+        raw_modes = os.getenv(MODES_ENV_VAR, ",".join(ALL_MODES))
+        modes = [m.strip() for m in raw_modes.split(",")]
+        return cls(
+            service,
+            directory=os.getenv(DIR_ENV_VAR, "/tmp/profiles"),
+            modes=[m for m in modes if m in ALL_MODES],
+            interval=float(os.getenv(INTERVAL_ENV_VAR, "0.01")),
+            top=int(os.getenv(TOP_ENV_VAR, "25")),
+        )
+
+    def start(self) -> None:
+        global _timers_enabled
+        with self._lock:
+            if self.active:
+                return
+            if "cpu" in self.modes:
+                self._cpu = SamplingProfiler(self.interval)
+                self._cpu.start()
+            if "memory" in self.modes:
+                self._started_tracemalloc = not tracemalloc.is_tracing()
+                if self._started_tracemalloc:
+                    tracemalloc.start(10)
+                self._baseline = self._snapshot()
+            if "timers" in self.modes:
+                with _timings_lock:
+                    _timings.clear()
+                _timers_enabled = True
+            self.active = True
+        logger.info("Profiling started", extra={"modes": list(self.modes)})
+
+    def stop(self) -> list:
+        """Stop profiling and return the paths of the files written."""
+        global _timers_enabled
+        with self._lock:
+            if not self.active:
+                return []
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = time.strftime("%Y%m%dT%H%M%S")
+            prefix = os.path.join(
+                self.directory, f"{self.service}-{os.getpid()}-{stamp}"
+            )
+            written = []
+            if self._cpu is not None:
+                self._cpu.stop()
+                written.append(
+                    self._write(f"{prefix}.cpu.folded", self._cpu.collapsed())
+                )
+                self._cpu = None
+            if self._baseline is not None:
+                written.append(
+                    self._write(f"{prefix}.memory.txt", self.memory_diff())
+                )
+                self._baseline = None
+                if self._started_tracemalloc:
+                    tracemalloc.stop()
+            if "timers" in self.modes:
+                _timers_enabled = False
+                body = json.dumps(stage_timings(), indent=2, sort_keys=True)
+                written.append(self._write(f"{prefix}.timers.json", body))
+            self.active = False
+        logger.info("Profiling stopped", extra={"files": written})
+        return written
+
+    def toggle(self) -> None:
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    def memory_diff(self) -> str:
+        """Top allocation differences since profiling started."""
+        stats = self._snapshot().compare_to(self._baseline, "lineno")
+        return "".join(f"{stat}\n" for stat in stats[:self.top])
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+
+    @staticmethod
+    def _write(path: str, body: str) -> str:
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(body)
+        return path
+
+
+def configure_profiling(
+    service: str, signum: int = signal.SIGUSR1
+) -> Profiler:
+    """Create the service's profiler, start it if ``PROFILE`` is set and
+    let ``signum`` toggle it.
+
+    Signal handlers can only be installed from the main thread; called
+    from any other thread (a worker, an embedding server) the profiler is
+    still created and ``PROFILE`` still honored, but there is no toggle.
+    The toggle runs on a separate thread so that writing the results never
+    happens inside the handler.
+    """
+    profiler = Profiler.from_env(service)
+
+    def handle(_signum, _frame) -> None:
+        threading.Thread(
+            target=profiler.toggle, name="profile-toggle", daemon=True
+        ).start()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signum, handle)
+    else:
+        logger.warning(
+            "Not in the main thread; profiling cannot be toggled by signal",
+            extra={
+                "service": service,
+                "thread_name": threading.current_thread().name,
+            },
+        )
+    if os.getenv(ENABLED_ENV_VAR, "").lower() in ("1", "true", "yes"):
+        profiler.start()
+    return profiler
@@ -0,0 +1,75 @@
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``.
+    Callers never block inside the bucket; :meth:`try_acquire` reports how
+    long to wait instead so the caller can decide whether to sleep or defer
+    the work, and :meth:`reserve` books a future slot for callers that will
+    not come back to ask again.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(
+            capacity if capacity is not None else max(rate, 1.0)
+        )
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(
+                self.capacity, self._tokens + elapsed * self.rate
+            )
+            self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take ``tokens`` if available.
+
+        Returns ``0.0`` when the tokens were taken, otherwise the number of
+        seconds until enough tokens will have accumulated.
+        """
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take ``tokens`` now or in the future and return the wait.
+
+        The balance may go negative, so each caller is handed its own slot:
+        ``n`` reservations in a row wait ``0``, ``1/rate``, ``2/rate`` ...
+        instead of all being told the same time.
+        """
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def set_rate(self, rate: float, capacity: Optional[float] = None) -> None:
+        """Change the refill rate, keeping the tokens accumulated so far."""
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = float(rate)
+            if capacity is not None:
+                self.capacity = float(capacity)
+            self._tokens = min(self._tokens, self.capacity)
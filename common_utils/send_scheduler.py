@@ -0,0 +1,346 @@
+import asyncio
+import bisect
+import inspect
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from .metrics import (
+    TELEGRAM_QUEUE_DEPTH,
+    TELEGRAM_SEND_SECONDS,
+    TELEGRAM_SENDS,
+)
+from .ratelimit import TokenBucket
+
+# Lower values are sent first.
+PRIORITY_ADMIN = 0
+PRIORITY_PUBLISH = 10
+
+# Telegram Bot API limits: ~30 messages/s per bot, ~1 message/s per private
+# chat and 20 messages/minute per group or channel.
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+GROUP_RATE = 20 / 60
+GROUP_BURST = 3.0
+
+logger = logging.getLogger(__name__)
+
+ChatId = Union[int, str]
+
+
+def _is_group(chat_id: ChatId) -> bool:
+    text = str(chat_id)
+    return text.startswith("-") or text.startswith("@")
+
+
+def _bot_token(send: Callable[..., Any]) -> Optional[str]:
+    # The bot a bound send method belongs to; None for plain callables.
+    return getattr(getattr(send, "__self__", None), "token", None)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    # Duck-typed so common_utils does not depend on python-telegram-bot.
+    value = getattr(exc, "retry_after", None)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value) if value is not None else None
+
+
+class _Job:
+    __slots__ = ("send", "chat_id", "kwargs", "future", "retries", "released")
+
+    def __init__(self, send, chat_id, kwargs, future):
+        self.send = send
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.future = future
+        self.retries = 0
+        self.released = False
+
+
+class SendScheduler:
+    """Rate-limited, prioritized dispatcher for Telegram sends.
+
+    Jobs wait in one priority queue and are released when both the sending
+    bot's global bucket and the target chat's bucket allow it; each bot
+    token has its own global limit. Jobs for a chat that is
+    out of tokens are held aside in order, so they neither block other chats
+    nor overtake each other. A ``RetryAfter`` error pauses the chat for the
+    requested time before the job is retried.
+
+    Async callers use :meth:`send` on the scheduler's loop; synchronous
+    callers use :meth:`submit`, which returns a ``concurrent.futures.Future``.
+    :meth:`stop` ends dispatching at shutdown.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        group_rate: float = GROUP_RATE,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._clock = clock
+        self.global_rate = global_rate
+        self._globals: Dict[Optional[str], TokenBucket] = {}
+        self._chats: Dict[ChatId, TokenBucket] = {}
+        self._paused: Dict[ChatId, float] = {}
+        self._waiting: Dict[ChatId, List[tuple]] = {}
+        self._releases: Dict[ChatId, asyncio.TimerHandle] = {}
+        self._seq = itertools.count()
+        self._depth: Counter = Counter()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Start dispatching on ``loop``, or on a private thread if omitted."""
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=loop.run_forever, name="send-scheduler", daemon=True
+            )
+            self._thread.start()
+        self._loop = loop
+        ready = threading.Event()
+
+        def begin() -> None:
+            self._queue = asyncio.PriorityQueue()
+            self._task = loop.create_task(self._dispatch())
+            ready.set()
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            begin()
+            return
+        loop.call_soon_threadsafe(begin)
+        ready.wait()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop dispatching and cancel the jobs not yet sent.
+
+        The private loop and thread of :meth:`start` are shut down and
+        joined; a loop passed to :meth:`start` keeps running.
+        """
+        loop = self._loop
+        if loop is None:
+            return
+        self._loop = None
+        stopped = threading.Event()
+
+        def shutdown() -> None:
+            if self._task is not None:
+                self._task.cancel()
+            for handle in self._releases.values():
+                handle.cancel()
+            self._releases.clear()
+            held = [item for items in self._waiting.values() for item in items]
+            self._waiting.clear()
+            while not self._queue.empty():
+                held.append(self._queue.get_nowait())
+            for _, _, job in held:
+                job.future.cancel()
+            for priority, count in list(self._depth.items()):
+                self._add_depth(priority, -count)
+            if self._thread is not None:
+                loop.stop()
+            stopped.set()
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            shutdown()
+        elif loop.is_running():
+            loop.call_soon_threadsafe(shutdown)
+            stopped.wait(timeout)
+        if self._thread is None:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+        if loop.is_running():
+            logger.warning("Send scheduler thread did not stop in time")
+            return
+        # Let the cancelled tasks finish, as asyncio.run does on exit.
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+
+    def queue_depth(self) -> Dict[int, int]:
+        """Number of jobs not yet handed to Telegram, per priority lane."""
+        return {
+            priority: count for priority, count in self._depth.items() if count
+        }
+
+    def _add_depth(self, priority: int, amount: int) -> None:
+        self._depth[priority] += amount
+        TELEGRAM_QUEUE_DEPTH.labels(priority).set(self._depth[priority])
+
+    def _bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if _is_group(chat_id):
+                bucket = TokenBucket(
+                    self.group_rate, GROUP_BURST, clock=self._clock
+                )
+            else:
+                bucket = TokenBucket(self.chat_rate, 1.0, clock=self._clock)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _global(self, send: Callable[..., Any]) -> TokenBucket:
+        token = _bot_token(send)
+        bucket = self._globals.get(token)
+        if bucket is None:
+            bucket = TokenBucket(
+                self.global_rate, self.global_rate, clock=self._clock
+            )
+            self._globals[token] = bucket
+        return bucket
+
+    def _hold(self, item: tuple, delay: float) -> None:
+        chat_id = item[2].chat_id
+        bisect.insort(self._waiting.setdefault(chat_id, []), item)
+        self._schedule_release(chat_id, delay)
+
+    def _schedule_release(self, chat_id: ChatId, delay: float) -> None:
+        when = self._loop.time() + delay
+        handle = self._releases.get(chat_id)
+        if handle is not None:
+            if handle.when() >= when:
+                return
+            handle.cancel()
+        self._releases[chat_id] = self._loop.call_at(
+            when, self._release, chat_id
+        )
+
+    def _release(self, chat_id: ChatId) -> None:
+        self._releases.pop(chat_id, None)
+        waiting = self._waiting.get(chat_id)
+        if not waiting:
+            self._waiting.pop(chat_id, None)
+            return
+        item = waiting.pop(0)
+        if not waiting:
+            del self._waiting[chat_id]
+        item[2].released = True
+        self._queue.put_nowait(item)
+
+    async def send(
+        self,
+        send: Callable[..., Any],
+        chat_id: ChatId,
+        priority: int = PRIORITY_PUBLISH,
+        **kwargs,
+    ):
+        """Queue ``send(chat_id=chat_id, **kwargs)`` and await its result."""
+        future = self._loop.create_future()
+        self._add_depth(priority, 1)
+        job = _Job(send, chat_id, kwargs, future)
+        self._queue.put_nowait((priority, next(self._seq), job))
+        return await future
+
+    def submit(
+        self,
+        send: Callable[..., Any],
+        chat_id: ChatId,
+        priority: int = PRIORITY_PUBLISH,
+        **kwargs,
+    ) -> Future:
+        """Thread-safe variant of :meth:`send` for synchronous callers."""
+        return asyncio.run_coroutine_threadsafe(
+            self.send(send, chat_id, priority, **kwargs), self._loop
+        )
+
+    def submit_all(
+        self,
+        send: Callable[..., Any],
+        chat_id: ChatId,
+        messages: List[Dict[str, Any]],
+        priority: int = PRIORITY_PUBLISH,
+    ) -> Future:
+        """Send several messages to one chat strictly in order.
+
+        Each entry of ``messages`` holds the keyword arguments for one call.
+        The returned future resolves to the list of results.
+        """
+
+        async def run_in_order():
+            return [
+                await self.send(send, chat_id, priority, **kwargs)
+                for kwargs in messages
+            ]
+
+        return asyncio.run_coroutine_threadsafe(run_in_order(), self._loop)
+
+    async def _dispatch(self) -> None:
+        while True:
+            item = await self._queue.get()
+            priority, _, job = item
+            chat_id = job.chat_id
+            if chat_id in self._waiting and not job.released:
+                # Earlier jobs for this chat are still held; keep the order.
+                bisect.insort(self._waiting[chat_id], item)
+                continue
+            job.released = False
+            bucket = self._bucket(chat_id)
+            paused_for = self._paused.get(chat_id, 0.0) - self._clock()
+            wait = paused_for if paused_for > 0 else bucket.try_acquire()
+            if wait > 0:
+                self._hold(item, wait)
+                continue
+            if chat_id in self._waiting:
+                self._schedule_release(chat_id, 1.0 / bucket.rate)
+            bot_bucket = self._global(job.send)
+            wait = bot_bucket.try_acquire()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = bot_bucket.try_acquire()
+            self._add_depth(priority, -1)
+            self._loop.create_task(self._perform(item))
+
+    async def _perform(self, item: tuple) -> None:
+        priority, _, job = item
+        start = time.perf_counter()
+        try:
+            result = job.send(chat_id=job.chat_id, **job.kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as exc:
+            TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - start)
+            retry_after = _retry_after(exc)
+            if retry_after is not None and job.retries < self.max_retries:
+                TELEGRAM_SENDS.labels("retry").inc()
+                job.retries += 1
+                self._paused[job.chat_id] = self._clock() + retry_after
+                logger.warning(
+                    "Telegram rate limit hit, retrying",
+                    extra={"chat_id": job.chat_id, "retry_after": retry_after},
+                )
+                self._add_depth(priority, 1)
+                self._hold(item, retry_after)
+                return
+            TELEGRAM_SENDS.labels("error").inc()
+            if not job.future.done():
+                job.future.set_exception(exc)
+            return
+        TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - start)
+        TELEGRAM_SENDS.labels("ok").inc()
+        if not job.future.done():
+            job.future.set_result(result)
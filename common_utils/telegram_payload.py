@@ -0,0 +1,106 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAX_PARTS_ENV_VAR = "PUBLISH_MAX_PARTS"
+
+# Telegram rejects messages longer than 4096 characters.
+MESSAGE_LIMIT = 4096
+ELLIPSIS = "…"
+
+# Preferred places to break a long text, best first.
+_BREAKS = (
+    re.compile(r"\n\s*\n"),
+    re.compile(r"\n"),
+    re.compile(r"(?<=[.!?])\s"),
+    re.compile(r"\s"),
+)
+
+
+def _cut(text: str, limit: int) -> int:
+    """Index at which to end a part of at most ``limit`` characters."""
+    if len(text) <= limit:
+        return len(text)
+    window = text[:limit]
+    for pattern in _BREAKS:
+        ends = [m.end() for m in pattern.finditer(window)]
+        # Ignore breaks that would leave a very short part.
+        if ends and ends[-1] > limit // 2:
+            return ends[-1]
+    return limit
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Split ``text`` into parts of at most ``limit``, on natural breaks."""
+    parts = []
+    while text:
+        end = _cut(text, limit)
+        part = text[:end].strip()
+        if part:
+            parts.append(part)
+        text = text[end:]
+    return parts
+
+
+def render_payload(
+    text: Optional[str],
+    link: Optional[str] = None,
+    max_parts: Optional[int] = None,
+    parse_mode: Optional[str] = None,
+) -> Dict:
+    """Render the final Telegram payload for an article.
+
+    Text that fits in ``max_parts`` messages is split across them. Anything
+    longer is cut off in the last part, which ends with ``link``.
+    """
+    if max_parts is None:
+        max_parts = int(os.getenv(MAX_PARTS_ENV_VAR, "3"))
+    text = (text or "").strip() or (link or "")
+    parts = split_message(text)
+    if len(parts) > max_parts:
+        tail = f"{ELLIPSIS}\n\n{link}" if link else ELLIPSIS
+        parts = parts[:max_parts]
+        last = parts[-1]
+        cut = _cut(last, MESSAGE_LIMIT - len(tail))
+        parts[-1] = last[:cut].rstrip() + tail
+    return {"parts": parts, "parse_mode": parse_mode}
+
+
+def render_article(article, max_parts: Optional[int] = None) -> Dict:
+    """Render the payload for an ``Article``-like object."""
+    return render_payload(
+        article.translated_content or article.content,
+        article.source_url,
+        max_parts,
+    )
+
+
+def render_digest(
+    items: Iterable[Tuple[Optional[str], Optional[str]]]
+) -> Dict:
+    """Render several ``(text, link)`` items as one digest payload.
+
+    Items are separated by blank lines and packed into as few messages as
+    the length limit allows; an item is never split across two messages
+    unless it is longer than a message on its own.
+    """
+    entries = []
+    for text, link in items:
+        lines = [line for line in ((text or "").strip(), link or "") if line]
+        if lines:
+            entries.append("\n".join(lines))
+    parts: List[str] = []
+    for entry in entries:
+        if parts and len(parts[-1]) + 2 + len(entry) <= MESSAGE_LIMIT:
+            parts[-1] = f"{parts[-1]}\n\n{entry}"
+        else:
+            parts.extend(split_message(entry))
+    return {"parts": parts, "parse_mode": None}
+
+
+def message_kwargs(payload: Dict) -> List[Dict]:
+    """``send_message`` keyword arguments for each part of ``payload``."""
+    extra = {}
+    if payload.get("parse_mode"):
+        extra["parse_mode"] = payload["parse_mode"]
+    return [dict(text=part, **extra) for part in payload["parts"]]
@@ -1,6 +1,6 @@
 from cryptography.fernet import Fernet
 
-from common_utils import decrypt_env_var
+from common_utils import crypto, decrypt_env_var
 
 
 def test_decrypt_env_var(monkeypatch):
@@ -14,7 +14,49 @@ def test_decrypt_env_var(monkeypatch):
     assert decrypt_env_var("SECRET_VAR") == secret
 
 
+def test_decrypt_env_var_builds_one_fernet_per_key(monkeypatch):
+    key = Fernet.generate_key()
+    monkeypatch.setenv("FERNET_KEY", key.decode())
+    monkeypatch.setenv("SECRET_VAR", Fernet(key).encrypt(b"secret").decode())
+    built = []
+    monkeypatch.setattr(
+        crypto, "Fernet", lambda key: built.append(key) or Fernet(key)
+    )
+
+    assert decrypt_env_var("SECRET_VAR") == "secret"
+    assert decrypt_env_var("SECRET_VAR") == "secret"
+    assert len(built) == 1
+
+
 def test_decrypt_env_var_missing(monkeypatch):
     monkeypatch.delenv("FERNET_KEY", raising=False)
     monkeypatch.setenv("SECRET_VAR", "value")
-    assert decrypt_env_var("SECRET_VAR") is None
\ No newline at end of file
+    assert decrypt_env_var("SECRET_VAR") is None
+
+
+def test_field_cipher_caches_by_ciphertext_and_rotates(monkeypatch):
+    old, new = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    cipher = crypto.FieldCipher([old], cache_size=2)
+    tokens = [cipher.encrypt(f"value {i}".encode()) for i in range(3)]
+
+    decrypts = []
+    real_decrypt = cipher._multi.decrypt
+    monkeypatch.setattr(
+        cipher._multi,
+        "decrypt",
+        lambda t: decrypts.append(t) or real_decrypt(t),
+    )
+    assert cipher.decrypt(tokens[0]) == b"value 0"
+    assert cipher.decrypt(tokens[0]) == b"value 0"
+    assert len(decrypts) == 1
+    cipher.decrypt(tokens[1])
+    cipher.decrypt(tokens[2])
+    # The cache is bounded; the least recently used entry was evicted.
+    cipher.decrypt(tokens[0])
+    assert len(decrypts) == 4
+
+    rotated = crypto.FieldCipher([new, old])
+    assert not rotated.is_current(tokens[0])
+    token = rotated.rotate(tokens[0])
+    assert rotated.is_current(token)
+    assert crypto.FieldCipher([new]).decrypt(token) == b"value 0"
@@ -0,0 +1,34 @@
+from cryptography.fernet import Fernet
+from sqlalchemy import Column, Integer, create_engine, insert, select, text
+from sqlalchemy.orm import declarative_base
+
+from common_utils.crypto_types import EncryptedJSON
+
+
+def test_encrypted_json_column(monkeypatch):
+    monkeypatch.setenv("FERNET_KEYS", Fernet.generate_key().decode())
+    Base = declarative_base()
+
+    class Row(Base):
+        __tablename__ = "rows"
+        id = Column(Integer, primary_key=True)
+        value = Column(EncryptedJSON)
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Row),
+            [
+                {"id": 1, "value": {"token": "secret"}},
+                {"id": 2, "value": None},
+            ],
+        )
+        conn.execute(text("INSERT INTO rows VALUES (3, '{\"legacy\": true}')"))
+        query = text("SELECT value FROM rows WHERE id = 1")
+        stored = conn.execute(query).scalar()
+        query = select(Row.value).order_by(Row.id)
+        values = conn.execute(query).scalars().all()
+
+    assert "secret" not in stored
+    assert values == [{"token": "secret"}, None, {"legacy": True}]
@@ -0,0 +1,88 @@
+import json
+from types import SimpleNamespace
+
+from common_utils.health import Health, update_queue_depths, watch_queues
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_liveness_fails_when_heartbeat_is_stale():
+    clock = Clock()
+    health = Health(stale_after=60, clock=clock)
+    assert health.liveness()[0] == 200
+
+    clock.now = 61
+    status, _, body = health.liveness()
+    assert status == 503
+    assert json.loads(body) == {"alive": False, "heartbeat_age_seconds": 61}
+
+    with health.track():
+        assert json.loads(health.lag()[2])["in_flight"] == 1
+    assert health.liveness()[0] == 200
+    assert json.loads(health.lag()[2])["in_flight"] == 0
+
+
+def test_readiness_reports_each_check():
+    health = Health()
+    health.add_check("database", lambda: True)
+    assert health.readiness()[0] == 200
+
+    def broken():
+        raise ConnectionError("down")
+
+    health.add_check("broker", broken)
+    status, _, body = health.readiness()
+    assert status == 503
+    assert json.loads(body) == {
+        "ready": False,
+        "checks": {"database": True, "broker": False},
+    }
+
+
+def test_watch_queues_uses_passive_declares_and_reschedules():
+    declared = []
+
+    class Channel:
+        is_open = True
+
+        def queue_declare(self, queue, passive=False):
+            declared.append((queue, passive))
+            if queue == "missing":
+                raise RuntimeError("NOT_FOUND")
+            return SimpleNamespace(method=SimpleNamespace(message_count=42))
+
+    class Connection:
+        def __init__(self):
+            self.timers = []
+
+        def channel(self):
+            return Channel()
+
+        def call_later(self, delay, callback):
+            self.timers.append((delay, callback))
+
+    conn = Connection()
+    health = Health()
+    watch_queues(conn, ["url.new", "missing"], health, interval=5)
+
+    assert declared == [("url.new", True), ("missing", True)]
+    assert json.loads(health.lag()[2])["queues"] == {"url.new": 42}
+    assert conn.timers[0][0] == 5
+
+    conn.timers[0][1]()
+    assert len(declared) == 4
+    assert len(conn.timers) == 2
+
+
+def test_update_queue_depths_beats():
+    clock = Clock()
+    health = Health(stale_after=10, clock=clock)
+    clock.now = 100
+    update_queue_depths(SimpleNamespace(), [], health)
+    assert health.liveness()[0] == 200
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from common_utils import idempotency
+
+
+@pytest.fixture
+def Session():
+    engine = create_engine("sqlite:///:memory:")
+    idempotency.init_db(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_ledger_records_and_finds_keys(Session):
+    key = idempotency.message_key("http://example.com/a")
+    assert len(key) == 40
+
+    with Session() as db:
+        assert not idempotency.already_processed(db, "core", key)
+        idempotency.record_processed(db, "core", key)
+        db.commit()
+
+    with Session() as db:
+        assert idempotency.already_processed(db, "core", key)
+        # Keys are per consumer.
+        assert not idempotency.already_processed(db, "publisher", key)
+
+
+def test_second_record_of_a_key_fails_its_transaction(Session):
+    key = idempotency.message_key("http://example.com/a")
+    with Session() as db:
+        idempotency.record_processed(db, "core", key)
+        db.commit()
+
+    with Session() as db:
+        idempotency.record_processed(db, "core", key)
+        with pytest.raises(IntegrityError):
+            db.commit()
+
+
+def test_prune_forgets_old_keys(Session):
+    now = datetime(2024, 1, 10)
+    with Session() as db:
+        idempotency.record_processed(
+            db, "core", "old", now=now - timedelta(days=8)
+        )
+        idempotency.record_processed(
+            db, "core", "new", now=now - timedelta(days=1)
+        )
+        db.commit()
+        assert idempotency.prune_processed(db, timedelta(days=7), now=now) == 1
+        db.commit()
+        assert not idempotency.already_processed(db, "core", "old")
+        assert idempotency.already_processed(db, "core", "new")
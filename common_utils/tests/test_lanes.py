@@ -0,0 +1,94 @@
+import types
+
+from common_utils import lanes
+
+
+def test_lane_queue_names():
+    assert lanes.lane_queue("url.new", "high") == "url.new.high"
+    assert lanes.lane_queue("url.new", "normal") == "url.new"
+    assert lanes.lane_queue("url.new", "bogus") == "url.new"
+    assert lanes.lane_queues("article.approved") == [
+        "article.approved.high",
+        "article.approved",
+        "article.approved.low",
+    ]
+    assert lanes.lane_for_headers({"priority": b"LOW"}) == "low"
+    assert lanes.lane_for_headers(None) == "normal"
+
+
+def test_weighted_lanes_share_picks_by_weight():
+    queue = lanes.WeightedLanes({"high": 3, "normal": 2, "low": 1})
+    for lane in lanes.LANES:
+        for i in range(60):
+            queue.push(lane, i)
+
+    picks = [queue.pop()[0] for _ in range(60)]
+
+    assert picks.count("high") == 30
+    assert picks.count("normal") == 20
+    assert picks.count("low") == 10
+    # Interleaved: the low lane is served within every window of six picks.
+    assert all("low" in picks[i:i + 6] for i in range(0, 60, 6))
+
+
+def test_weighted_lanes_serves_waiting_lanes_in_order():
+    queue = lanes.WeightedLanes()
+    queue.push("low", "a")
+    queue.push("low", "b")
+    assert queue.pop() == ("low", "a")
+    queue.push("high", "c")
+    assert queue.pop() == ("high", "c")
+    assert queue.pop() == ("low", "b")
+    assert queue.pop() is None
+
+
+def test_weights_from_env(monkeypatch):
+    monkeypatch.setenv(lanes.WEIGHTS_ENV_VAR, "high=20, low=0, other=5")
+    assert lanes.weights_from_env() == {"high": 20, "normal": 3, "low": 1}
+
+
+def test_consume_lanes_runs_backlog_in_weighted_order():
+    handled = []
+
+    class Channel:
+        def __init__(self):
+            self.callbacks = {}
+            self.prefetch = None
+
+        def basic_qos(self, prefetch_count):
+            self.prefetch = prefetch_count
+
+        def basic_consume(self, queue, on_message_callback):
+            self.callbacks[queue] = on_message_callback
+
+    channel = Channel()
+
+    class Connection:
+        is_open = True
+        rounds = 0
+
+        def process_data_events(self, time_limit):
+            self.rounds += 1
+            if self.rounds == 1:
+                # A backfill arrives first, then a breaking item.
+                for i in range(3):
+                    deliver("url.new.low", f"old-{i}", {})
+                deliver("url.new.high", "breaking", {})
+                # Deferred through a shared queue, back on the normal lane.
+                deliver("url.new", "retried", {"priority": "high"})
+            elif time_limit:
+                self.is_open = False
+
+    def deliver(queue, body, headers):
+        method = types.SimpleNamespace(delivery_tag=body)
+        properties = types.SimpleNamespace(headers=headers)
+        channel.callbacks[queue](channel, method, properties, body)
+
+    def handler(ch, method, properties, body):
+        assert ch is channel
+        handled.append(body)
+
+    lanes.consume_lanes(Connection(), channel, "url.new", handler, prefetch=5)
+
+    assert channel.prefetch == 5
+    assert handled == ["breaking", "retried", "old-0", "old-1", "old-2"]
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
+import common_utils
+
+
+def test_importing_common_utils_defers_heavy_dependencies():
+    code = (
+        "import sys, common_utils, common_utils.health, common_utils.lanes;"
+        "print(sorted(m for m in"
+        " ('sqlalchemy', 'pika', 'cryptography', 'pythonjsonlogger')"
+        " if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_decrypting_env_vars_does_not_load_sqlalchemy():
+    code = (
+        "import sys, common_utils.crypto;"
+        "print('sqlalchemy' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_exports_load_on_first_access():
+    from common_utils.db import session_scope
+
+    assert common_utils.session_scope is session_scope
+    assert "decrypt_env_var" in dir(common_utils)
+    with pytest.raises(AttributeError):
+        common_utils.missing
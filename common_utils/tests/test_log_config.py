@@ -0,0 +1,85 @@
+import io
+import json
+import logging
+import queue
+import sys
+
+import pytest
+
+import common_utils.logging as log_config
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    original = root.handlers[:]
+    yield root
+    log_config._stop_listener()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in original:
+        root.addHandler(handler)
+
+
+def _capture(monkeypatch):
+    # configure_logging only runs on a root logger without handlers, and
+    # pytest attaches its own while a test runs.
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    stream = io.StringIO()
+    monkeypatch.setattr(sys, "stderr", stream)
+    return stream
+
+
+def test_async_logging_writes_json_from_listener(monkeypatch, root_logger):
+    stream = _capture(monkeypatch)
+    monkeypatch.setenv("LOG_LEVELS", "noisy.lib=ERROR")
+
+    logger = log_config.configure_logging()
+    assert isinstance(logger.handlers[0], log_config._QueueHandler)
+    logger.info("Processed %s", "article", extra={"url": "http://example.com"})
+    logging.getLogger("noisy.lib").info("hidden")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("Failed")
+    log_config._stop_listener()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert lines[0] == {
+        "message": "Processed article",
+        "url": "http://example.com",
+    }
+    assert lines[1]["message"] == "Failed"
+    assert "ValueError: boom" in lines[1]["exc_info"]
+    assert len(lines) == 2
+
+
+def test_sampling_keeps_fraction_of_chosen_messages(monkeypatch, root_logger):
+    stream = _capture(monkeypatch)
+    monkeypatch.setenv("LOG_ASYNC", "false")
+    monkeypatch.setenv("LOG_SAMPLE_RATES", "Published new URL=0.25")
+
+    logger = log_config.configure_logging()
+    for _ in range(8):
+        logger.info("Published new URL")
+    logger.warning("Published new URL")
+    logger.info("Other")
+
+    messages = [
+        json.loads(line)["message"] for line in stream.getvalue().splitlines()
+    ]
+    assert messages.count("Published new URL") == 3
+    assert "Other" in messages
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = log_config._QueueHandler(queue.Queue(1))
+    before = log_config.DROPPED._default().value
+    record = logging.makeLogRecord({"msg": "x"})
+
+    handler.enqueue(record)
+    handler.enqueue(record)
+
+    assert log_config.DROPPED._default().value == before + 1
@@ -0,0 +1,89 @@
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+from common_utils.metrics import (
+    InstrumentedChannel,
+    Registry,
+    start_metrics_server,
+)
+
+
+def test_render_counters_gauges_and_histograms():
+    registry = Registry()
+    sends = registry.counter("sends_total", "Sends.", ("outcome",))
+    depth = registry.gauge("depth", "Queue depth.")
+    latency = registry.histogram(
+        "latency_seconds", "Latency.", buckets=(0.1, 1.0)
+    )
+
+    sends.labels("ok").inc()
+    sends.labels(outcome="ok").inc(2)
+    depth.set(5)
+    depth.dec()
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(3)
+
+    text = registry.render()
+    assert "# TYPE sends_total counter" in text
+    assert 'sends_total{outcome="ok"} 3' in text
+    assert "depth 4" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_sum 3.55" in text
+    assert "latency_seconds_count 3" in text
+
+
+def test_registry_rejects_kind_mismatch_and_missing_labels():
+    registry = Registry()
+    counter = registry.counter("things_total", "Things.", ("kind",))
+    assert registry.counter("things_total", "Things.", ("kind",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("things_total", "Things.")
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_instrumented_channel_counts_messages():
+    from common_utils import metrics
+
+    class Channel:
+        def __init__(self):
+            self.published = []
+
+        def basic_publish(self, exchange, routing_key, body, properties=None):
+            self.published.append(routing_key)
+
+        def basic_consume(self, queue, on_message_callback):
+            self.callback = on_message_callback
+
+    raw = Channel()
+    channel = InstrumentedChannel(raw)
+    consumed = metrics.MESSAGES_CONSUMED.labels("metrics.in", "ok")
+    published = metrics.MESSAGES_PUBLISHED.labels("metrics.out")
+    before = consumed.value, published.value
+
+    def callback(ch, method, properties, body):
+        ch.basic_publish(exchange="", routing_key="metrics.out", body=body)
+
+    channel.basic_consume(queue="metrics.in", on_message_callback=callback)
+    raw.callback(raw, SimpleNamespace(delivery_tag=1), None, b"x")
+
+    assert raw.published == ["metrics.out"]
+    assert (consumed.value, published.value) == (before[0] + 1, before[1] + 1)
+
+
+def test_exporter_serves_metrics():
+    server = start_metrics_server(port=0, addr="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            body = response.read().decode()
+        assert response.status == 200
+        assert "# TYPE db_session_seconds histogram" in body
+    finally:
+        server.shutdown()
+        server.server_close()
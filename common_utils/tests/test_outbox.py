@@ -0,0 +1,142 @@
+import types
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from common_utils import outbox
+
+
+class ConfirmingChannel:
+    def __init__(self, reject=(), close_on=()):
+        self.confirming = False
+        self.declared = []
+        self.published = []
+        self.reject = set(reject)
+        self.close_on = set(close_on)
+        self.is_closed = False
+
+    def confirm_delivery(self):
+        self.confirming = True
+
+    def queue_declare(self, queue, durable):
+        self.declared.append(queue)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        if body in self.reject:
+            raise RuntimeError("nacked")
+        if body in self.close_on:
+            # Like a channel error, e.g. publishing to a missing exchange.
+            self.is_closed = True
+            raise RuntimeError("channel closed by broker")
+        self.published.append((routing_key, body, properties.headers))
+
+
+@pytest.fixture
+def session_scope():
+    engine = create_engine("sqlite:///:memory:")
+    outbox.init_db(engine)
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def scope():
+        session = Session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    return scope
+
+
+def remaining(session_scope):
+    with session_scope() as db:
+        events = db.query(outbox.OutboxEvent).order_by(outbox.OutboxEvent.id)
+        return [event.body for event in events]
+
+
+def test_events_are_only_written_with_their_transaction(session_scope):
+    with session_scope() as db:
+        outbox.enqueue(db, "q", b"kept", headers={"traceparent": "x"})
+    with pytest.raises(ValueError):
+        with session_scope() as db:
+            outbox.enqueue(db, "q", b"rolled back")
+            raise ValueError("write failed")
+
+    assert remaining(session_scope) == [b"kept"]
+
+
+def test_relay_publishes_in_order_with_confirms_and_deletes(session_scope):
+    with session_scope() as db:
+        for i in range(5):
+            outbox.enqueue(
+                db, "article.processed", f"m{i}".encode(), headers={"n": i}
+            )
+    channel = ConfirmingChannel()
+    relay = outbox.OutboxRelay(channel, session_scope, batch_size=2)
+
+    assert relay.publish_pending() == 5
+
+    assert channel.confirming
+    assert channel.declared == ["article.processed"]
+    bodies = [body for _, body, _ in channel.published]
+    assert bodies == [b"m0", b"m1", b"m2", b"m3", b"m4"]
+    assert channel.published[3][2] == {"n": 3}
+    assert remaining(session_scope) == []
+
+
+def test_relay_keeps_events_the_broker_rejected(session_scope):
+    with session_scope() as db:
+        for body in (b"a", b"b", b"c"):
+            outbox.enqueue(db, "q", body)
+    channel = ConfirmingChannel(reject={b"b"})
+    relay = outbox.OutboxRelay(channel, session_scope)
+
+    assert relay.publish_pending() == 1
+    assert remaining(session_scope) == [b"b", b"c"]
+
+    channel.reject.clear()
+    assert relay.publish_pending() == 2
+    assert [body for _, body, _ in channel.published] == [b"a", b"b", b"c"]
+
+
+def test_wake_schedules_one_immediate_run(session_scope):
+    scheduled = []
+    conn = types.SimpleNamespace(
+        call_later=lambda delay, cb: scheduled.append((delay, cb))
+    )
+    relay = outbox.OutboxRelay(ConfirmingChannel(), session_scope, interval=5)
+    relay.attach(conn)
+
+    relay.wake()
+    relay.wake()
+
+    assert [delay for delay, _ in scheduled] == [5, 0]
+    scheduled[1][1]()
+    relay.wake()
+    assert [delay for delay, _ in scheduled] == [5, 0, 0]
+
+
+def test_relay_reopens_a_channel_closed_by_the_broker(session_scope):
+    with session_scope() as db:
+        for body in (b"a", b"b"):
+            outbox.enqueue(db, "q", body)
+    broken = ConfirmingChannel(close_on={b"b"})
+    fresh = ConfirmingChannel()
+    conn = type("Conn", (), {
+        "call_later": lambda self, delay, cb: None,
+        "channel": lambda self: fresh,
+    })()
+    relay = outbox.OutboxRelay(broken, session_scope).attach(conn)
+
+    assert relay.publish_pending() == 1
+    assert relay.publish_pending() == 1
+
+    assert fresh.confirming
+    assert [body for _, body, _ in fresh.published] == [b"b"]
+    assert remaining(session_scope) == []
@@ -0,0 +1,85 @@
+import json
+import signal
+import threading
+import time
+
+from common_utils import profiling
+from common_utils.profiling import (
+    Profiler,
+    SamplingProfiler,
+    stage_timings,
+    timed,
+)
+
+
+@timed("busy")
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+    return "done"
+
+
+def test_timed_only_records_while_enabled(monkeypatch):
+    monkeypatch.setattr(profiling, "_timings", {})
+    assert busy(0) == "done"
+    assert stage_timings() == {}
+
+    monkeypatch.setattr(profiling, "_timers_enabled", True)
+    busy(0.01)
+    busy(0.01)
+
+    timings = stage_timings()["busy"]
+    assert timings["calls"] == 2
+    assert timings["total_seconds"] >= 0.02
+    assert timings["max_seconds"] >= 0.01
+
+
+def test_sampling_profiler_collects_collapsed_stacks():
+    sampler = SamplingProfiler(interval=0.001)
+    sampler.start()
+    busy(0.1)
+    sampler.stop()
+
+    lines = sampler.collapsed().splitlines()
+    assert lines
+    assert any("busy (test_profiling.py" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profiler_writes_results_when_stopped(tmp_path):
+    profiler = Profiler("test", directory=str(tmp_path), interval=0.001)
+
+    profiler.toggle()
+    assert profiler.active
+    kept = [bytearray(1024) for _ in range(200)]
+    busy(0.05)
+    profiler.toggle()
+
+    assert not profiler.active
+    assert not profiling._timers_enabled
+    files = sorted(p.name.split(".", 1)[1] for p in tmp_path.iterdir())
+    assert files == ["cpu.folded", "memory.txt", "timers.json"]
+    timers = json.loads(next(tmp_path.glob("*.timers.json")).read_text())
+    assert timers["busy"]["calls"] == 1
+    memory = next(tmp_path.glob("*.memory.txt")).read_text()
+    assert "test_profiling.py" in memory
+    assert kept
+
+
+def test_configure_profiling_off_the_main_thread_skips_the_signal(monkeypatch):
+    installed = []
+    monkeypatch.setattr(
+        profiling.signal, "signal", lambda *args: installed.append(args)
+    )
+    profilers = []
+    worker = threading.Thread(
+        target=lambda: profilers.append(profiling.configure_profiling("test"))
+    )
+    worker.start()
+    worker.join()
+
+    assert installed == []
+    assert isinstance(profilers[0], Profiler)
+    profiling.configure_profiling("test")
+    assert [signum for signum, _ in installed] == [signal.SIGUSR1]
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from common_utils.send_scheduler import (
+    PRIORITY_ADMIN,
+    PRIORITY_PUBLISH,
+    SendScheduler,
+)
+
+
+class RetryAfter(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+
+
+async def test_per_chat_limit_does_not_block_other_chats():
+    scheduler = SendScheduler(chat_rate=5)
+    scheduler.start(asyncio.get_running_loop())
+    sent = []
+    loop = asyncio.get_running_loop()
+
+    def send(chat_id, text):
+        sent.append((chat_id, text, loop.time()))
+
+    await asyncio.gather(
+        scheduler.send(send, 1, text="a1"),
+        scheduler.send(send, 1, text="a2"),
+        scheduler.send(send, 2, text="b1"),
+    )
+
+    assert [(c, t) for c, t, _ in sent] == [(1, "a1"), (2, "b1"), (1, "a2")]
+    # The second message to chat 1 waited for its bucket to refill.
+    assert sent[2][2] - sent[0][2] >= 0.15
+    scheduler.stop()
+
+
+async def test_admin_lane_goes_first():
+    scheduler = SendScheduler()
+    scheduler.start(asyncio.get_running_loop())
+    sent = []
+
+    def send(chat_id, text):
+        sent.append(text)
+
+    publishes = [
+        scheduler.send(send, i, PRIORITY_PUBLISH, text="publish")
+        for i in range(3)
+    ]
+    admin = scheduler.send(send, 99, PRIORITY_ADMIN, text="admin")
+    tasks = [asyncio.ensure_future(c) for c in publishes + [admin]]
+    await asyncio.sleep(0)
+    assert scheduler.queue_depth() == {PRIORITY_ADMIN: 1, PRIORITY_PUBLISH: 3}
+    await asyncio.gather(*tasks)
+
+    assert sent[0] == "admin"
+    assert scheduler.queue_depth() == {}
+    scheduler.stop()
+
+
+async def test_each_bot_has_its_own_global_limit():
+    scheduler = SendScheduler(global_rate=2, chat_rate=100)
+    scheduler.start(asyncio.get_running_loop())
+    loop = asyncio.get_running_loop()
+    sent = []
+
+    class Bot:
+        def __init__(self, token):
+            self.token = token
+
+        def send_message(self, chat_id, text):
+            sent.append((self.token, loop.time()))
+
+    started = loop.time()
+    await asyncio.gather(*(
+        scheduler.send(Bot(token).send_message, chat_id, text="x")
+        for token in ("a", "b")
+        for chat_id in (1, 2)
+    ))
+
+    assert sorted(token for token, _ in sent) == ["a", "a", "b", "b"]
+    # Four sends within two bots' bursts; a shared bucket would hold two.
+    assert max(at for _, at in sent) - started < 0.25
+    scheduler.stop()
+
+
+async def test_retry_after_is_honored_then_gives_up():
+    scheduler = SendScheduler(max_retries=1)
+    scheduler.start(asyncio.get_running_loop())
+    attempts = []
+
+    def flaky(chat_id, text):
+        attempts.append(text)
+        if len(attempts) == 1:
+            raise RetryAfter(0.1)
+        return "ok"
+
+    assert await scheduler.send(flaky, 1, text="x") == "ok"
+    assert attempts == ["x", "x"]
+
+    def always_limited(chat_id, text):
+        raise RetryAfter(0.01)
+
+    with pytest.raises(RetryAfter):
+        await scheduler.send(always_limited, 2, text="y")
+    scheduler.stop()
+
+
+def test_submit_from_sync_code():
+    scheduler = SendScheduler()
+    scheduler.start()
+    future = scheduler.submit(
+        lambda chat_id, text: f"{chat_id}:{text}", 7, text="hi"
+    )
+    assert future.result(timeout=2) == "7:hi"
+    scheduler.stop()
+
+
+def test_stop_cancels_held_jobs_and_joins_the_thread():
+    scheduler = SendScheduler(chat_rate=0.01)
+    scheduler.start()
+    loop, thread = scheduler._loop, scheduler._thread
+    first = scheduler.submit(lambda chat_id, text: text, 7, text="now")
+    held = scheduler.submit(lambda chat_id, text: text, 7, text="in 100s")
+    assert first.result(timeout=2) == "now"
+
+    scheduler.stop()
+
+    assert held.cancelled()
+    assert not thread.is_alive()
+    assert loop.is_closed()
+    assert scheduler.queue_depth() == {}
+    scheduler.stop()
@@ -0,0 +1,35 @@
+from common_utils.telegram_payload import (
+    MESSAGE_LIMIT,
+    message_kwargs,
+    render_payload,
+    split_message,
+)
+
+
+def test_split_message_prefers_paragraph_breaks():
+    first = "a" * 3000
+    second = "b" * 3000
+    parts = split_message(f"{first}\n\n{second}")
+    assert parts == [first, second]
+
+
+def test_render_payload_short_text_is_one_part():
+    payload = render_payload("hello", "http://example.com")
+    assert payload == {"parts": ["hello"], "parse_mode": None}
+    assert message_kwargs(payload) == [{"text": "hello"}]
+
+
+def test_render_payload_falls_back_to_link_and_truncates():
+    payload = render_payload("", "http://example.com")
+    assert payload["parts"] == ["http://example.com"]
+
+    payload = render_payload("word " * 3000, "http://example.com", max_parts=1)
+    (part,) = payload["parts"]
+    assert len(part) <= MESSAGE_LIMIT
+    assert part.endswith("…\n\nhttp://example.com")
+
+
+def test_message_kwargs_includes_parse_mode():
+    payload = render_payload("<b>hi</b>", parse_mode="HTML")
+    expected = [{"text": "<b>hi</b>", "parse_mode": "HTML"}]
+    assert message_kwargs(payload) == expected
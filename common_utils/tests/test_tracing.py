@@ -0,0 +1,62 @@
+import json
+from types import SimpleNamespace
+
+from common_utils.tracing import (
+    FileExporter,
+    SpanContext,
+    Tracer,
+    _otlp_span,
+    extract,
+    inject,
+    parse_traceparent,
+)
+
+
+def test_traceparent_round_trip_and_validation():
+    context = SpanContext(
+        "0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331"
+    )
+    assert parse_traceparent(context.traceparent) == context
+    assert parse_traceparent(context.traceparent.encode()) == context
+    assert parse_traceparent("00-" + "0" * 32 + "-b7ad6b7169203331-01") is None
+    assert parse_traceparent("garbage") is None
+    assert extract(None) is None
+
+
+def test_spans_nest_and_propagate_through_headers(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer("test", FileExporter(str(path)))
+
+    with tracer.start_span("outer") as outer:
+        with tracer.start_span("inner") as inner:
+            headers = inject({"language": "en"})
+    assert headers["language"] == "en"
+    assert extract(headers) == inner.context
+    assert inner.parent_span_id == outer.context.span_id
+    assert inject() == {}
+
+    # Another service continues the trace from the headers.
+    with tracer.start_span("remote", parent=extract(headers)) as remote:
+        pass
+    assert remote.context.trace_id == outer.context.trace_id
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [s["name"] for s in spans] == ["inner", "outer", "remote"]
+    assert spans[2]["parent_span_id"] == inner.context.span_id
+
+
+def test_errors_are_recorded_and_exported_as_otlp():
+    exported = []
+    tracer = Tracer("test", exporter=SimpleNamespace(export=exported.append))
+
+    try:
+        with tracer.start_span("fails", attributes={"attempt": 1}):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    data = _otlp_span(exported[0])
+    assert data["status"] == {"code": 2, "message": "ValueError: boom"}
+    attempt = {"key": "attempt", "value": {"intValue": "1"}}
+    assert data["attributes"] == [attempt]
+    assert "parentSpanId" not in data
@@ -0,0 +1,350 @@
+"""Lightweight distributed tracing with W3C ``traceparent`` propagation.
+
+Spans follow the OpenTelemetry data model closely enough to be read by any
+OTLP collector, without pulling the SDK into every image. The current span
+is tracked in a context variable; :func:`inject` and :func:`extract` move
+its context through AMQP headers.
+
+``TRACING_EXPORTER`` selects where finished spans go: ``file`` appends one
+JSON object per span to ``TRACING_FILE``, ``otlp`` posts batches to
+``OTEL_EXPORTER_OTLP_ENDPOINT`` using OTLP/HTTP JSON, and ``none`` (the
+default) only propagates context.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+EXPORTER_ENV_VAR = "TRACING_EXPORTER"
+FILE_ENV_VAR = "TRACING_FILE"
+ENDPOINT_ENV_VAR = "OTEL_EXPORTER_OTLP_ENDPOINT"
+SERVICE_ENV_VAR = "OTEL_SERVICE_NAME"
+
+HEADER = "traceparent"
+
+_TRACEPARENT_RE = re.compile(
+    r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+    @property
+    def traceparent(self) -> str:
+        flags = "01" if self.sampled else "00"
+        return f"00-{self.trace_id}-{self.span_id}-{flags}"
+
+
+def parse_traceparent(value) -> Optional[SpanContext]:
+    """Parse a ``traceparent`` header, returning ``None`` if it is invalid."""
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "replace")
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    def __init__(
+        self,
+        name: str,
+        service: str,
+        parent: Optional[SpanContext] = None,
+        attributes: Optional[Dict] = None,
+        links: Optional[List[SpanContext]] = None,
+        start_ns: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.service = service
+        self.parent_span_id = parent.span_id if parent else None
+        self.context = SpanContext(
+            parent.trace_id if parent else secrets.token_hex(16),
+            secrets.token_hex(8),
+            parent.sampled if parent else True,
+        )
+        self.attributes = dict(attributes or {})
+        self.links = list(links or [])
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "service": self.service,
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "links": [
+                {"trace_id": link.trace_id, "span_id": link.span_id}
+                for link in self.links
+            ],
+            "error": self.error,
+        }
+
+
+class FileExporter:
+    """Append finished spans to a file as JSON lines."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> Dict:
+    data = {
+        "traceId": span.context.trace_id,
+        "spanId": span.context.span_id,
+        "name": span.name,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [
+            {"key": k, "value": _otlp_value(v)}
+            for k, v in span.attributes.items()
+        ],
+        "links": [
+            {"traceId": link.trace_id, "spanId": link.span_id}
+            for link in span.links
+        ],
+        # STATUS_CODE_ERROR is 2, UNSET is 0.
+        "status": (
+            {"code": 2, "message": span.error} if span.error else {"code": 0}
+        ),
+    }
+    if span.parent_span_id:
+        data["parentSpanId"] = span.parent_span_id
+    return data
+
+
+class OtlpExporter:
+    """Batch spans to an OTLP/HTTP collector from a background thread."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        batch_size: int = 256,
+        interval: float = 2.0,
+        timeout: float = 5.0,
+        max_queue: int = 10000,
+    ) -> None:
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue)
+        self._thread = threading.Thread(
+            target=self._run, name="otlp-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            # Tracing must never slow down the pipeline.
+            pass
+
+    def _post(self, spans: List[Span]) -> None:
+        by_service: Dict[str, List[Dict]] = {}
+        for span in spans:
+            by_service.setdefault(span.service, []).append(_otlp_span(span))
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": service},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "robopost"}, "spans": items}
+                    ],
+                }
+                for service, items in by_service.items()
+            ]
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except Exception:
+            logger.warning(
+                "Failed to export spans",
+                extra={"spans": len(spans)},
+                exc_info=True,
+            )
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                self._post(batch)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(self.timeout)
+
+
+class Tracer:
+    """Creates spans for one service and hands finished ones to an exporter."""
+
+    def __init__(self, service: str, exporter=None) -> None:
+        self.service = service
+        self.exporter = exporter
+
+    @classmethod
+    def from_env(cls, service: str) -> "Tracer":
+        service = os.getenv(SERVICE_ENV_VAR, service)
+        kind = os.getenv(EXPORTER_ENV_VAR, "none").lower()
+        exporter = None
+        if kind == "file":
+            exporter = FileExporter(os.getenv(FILE_ENV_VAR, "traces.jsonl"))
+        elif kind == "otlp":
+            exporter = OtlpExporter(
+                os.getenv(ENDPOINT_ENV_VAR, "http://localhost:4318")
+            )
+        return cls(service, exporter)
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[SpanContext] = None,
+        attributes: Optional[Dict] = None,
+        links: Optional[List[SpanContext]] = None,
+        start_ns: Optional[int] = None,
+    ) -> Iterator[Span]:
+        """Run the block inside a new span.
+
+        The parent defaults to the current span; pass a context from
+        :func:`extract` to continue a trace from another service.
+        """
+        if parent is None:
+            current = _current.get()
+            parent = current.context if current else None
+        span = Span(name, self.service, parent, attributes, links, start_ns)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_error(exc)
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            if self.exporter is not None and span.context.sampled:
+                try:
+                    self.exporter.export(span)
+                except Exception:
+                    logger.warning("Failed to export span", exc_info=True)
+
+    def shutdown(self) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+_tracer = Tracer("robopost")
+
+
+def configure_tracing(service: str) -> Tracer:
+    """Install the process-wide tracer for ``service`` from the environment."""
+    global _tracer
+    _tracer = Tracer.from_env(service)
+    atexit.register(_tracer.shutdown)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def inject(
+    headers: Optional[Dict] = None, context: Optional[SpanContext] = None
+) -> Dict:
+    """Return ``headers`` with the ``traceparent`` of ``context``, or of the
+    current span."""
+    headers = dict(headers or {})
+    if context is None:
+        span = _current.get()
+        context = span.context if span else None
+    if context is not None:
+        headers[HEADER] = context.traceparent
+    return headers
+
+
+def extract(headers: Optional[Dict]) -> Optional[SpanContext]:
+    """Read the trace context from AMQP ``headers``."""
+    return parse_traceparent((headers or {}).get(HEADER))
@@ -1,6 +1,55 @@
 import sys
+from contextlib import contextmanager
 from pathlib import Path
 
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
 ROOT = Path(__file__).resolve().parent
 if str(ROOT) not in sys.path:
-    sys.path.insert(0, str(ROOT))
\ No newline at end of file
+    sys.path.insert(0, str(ROOT))
+
+
+class SqliteDatabase:
+    """An in-memory SQLite database standing in for the services' MySQL.
+
+    ``session_scope`` behaves like ``common_utils.session_scope``, so tests
+    monkeypatch it onto the module under test.
+    """
+
+    def __init__(self, url: str = "sqlite:///:memory:") -> None:
+        self.engine = create_engine(url)
+        self.Session = sessionmaker(bind=self.engine)
+
+    def create_all(self, *metadatas) -> "SqliteDatabase":
+        for metadata in metadatas:
+            metadata.create_all(bind=self.engine)
+        return self
+
+    @contextmanager
+    def session_scope(self):
+        session = self.Session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+@pytest.fixture
+def sqlite_db():
+    database = SqliteDatabase()
+    yield database
+    database.engine.dispose()
+
+
+@pytest.fixture
+def sqlite_file_db(tmp_path):
+    """Like ``sqlite_db``, but shared by every thread's connections."""
+    database = SqliteDatabase(f"sqlite:///{tmp_path / 'test.db'}")
+    yield database
+    database.engine.dispose()
@@ -3,65 +3,288 @@ from common_utils import (
     get_rabbitmq_connection,
     session_scope,
 )
+from common_utils import idempotency, lanes, outbox
+from common_utils.health import (
+    Health,
+    broker_check,
+    database_check,
+    watch_queues,
+)
+from common_utils.metrics import (
+    InstrumentedChannel,
+    counter,
+    histogram,
+    start_metrics_server,
+)
+from common_utils.profiling import configure_profiling, timed
+from common_utils.tracing import (
+    configure_tracing,
+    current_span,
+    extract,
+    get_tracer,
+    inject,
+)
 from services.core_engine.database import init_db
+from services.core_engine.extraction import ExtractionPool
+from services.core_engine.http_client import ArticleFetcher
+from services.core_engine.langid import detect_language, normalize_language
 from services.core_engine.models import Article
+from services.core_engine.politeness import (
+    NOT_BEFORE_HEADER,
+    DomainRateLimiter,
+    declare_defer_queues,
+    defer_url,
+)
+from services.core_engine.summarization import ChunkedSummarizer
 
+import importlib
+import json
 import os
-import trafilatura
-from google.cloud import translate_v2 as translate
-from vertexai import init
-from vertexai.preview.language_models import TextGenerationModel
-
-init(
-    project=os.getenv("GOOGLE_PROJECT_ID"),
-    location=os.getenv("GOOGLE_LOCATION", "us-central1"),
+import time
+from contextlib import contextmanager
+
+from sqlalchemy.exc import IntegrityError
+
+# trafilatura, the Google Translate client and Vertex AI take seconds to
+# import between them, so they are loaded on first use rather than with
+# this module (see ``load_summarizer`` and friends).
+trafilatura = None
+translate = None
+summarizer = None
+
+TARGET_LANGUAGE = "en"
+QUEUE_INPUT = "url.new"
+QUEUE_PROCESSED = "article.processed"
+# Name of this consumer in the processed-message ledger.
+LEDGER_CONSUMER = "core_engine"
+
+STAGE_SECONDS = histogram(
+    "process_url_stage_seconds",
+    "Time spent in each process_url stage.",
+    ("stage",),
+)
+ARTICLES = counter(
+    "articles_processed_total", "URLs run through process_url.", ("outcome",)
 )
-summarizer = TextGenerationModel.from_pretrained("text-bison")
 
 
+def _trafilatura():
+    return trafilatura or importlib.import_module("trafilatura")
+
+
+def translation_client():
+    """A Google Translate client, importing the library on first use."""
+    global translate
+    if translate is None:
+        from google.cloud import translate_v2
+
+        translate = translate_v2
+    return translate.Client()
 
-def process_url(url, translator, summarizer, logger):
-    """Fetch, translate, summarize and persist an article."""
-    downloaded = trafilatura.fetch_url(url)
+
+def load_summarizer():
+    """The Vertex AI summarization model, initialized on first use."""
+    global summarizer
+    if summarizer is None:
+        from vertexai import init
+        from vertexai.preview.language_models import TextGenerationModel
+
+        init(
+            project=os.getenv("GOOGLE_PROJECT_ID"),
+            location=os.getenv("GOOGLE_LOCATION", "us-central1"),
+        )
+        summarizer = TextGenerationModel.from_pretrained("text-bison")
+    return summarizer
+
+
+@contextmanager
+def _stage(name):
+    """Time one ``process_url`` stage as a metric and a child span."""
+    span = get_tracer().start_span(f"core.{name}")
+    with span, STAGE_SECONDS.labels(name).time():
+        yield
+
+
+@timed("process_url")
+def process_url(
+    url,
+    translator,
+    summarizer,
+    logger,
+    fetch=None,
+    extract=None,
+    language_hint=None,
+    priority=lanes.NORMAL,
+):
+    """Fetch, translate, summarize and persist an article.
+
+    ``fetch`` and ``extract`` default to ``trafilatura.fetch_url`` and
+    ``trafilatura.extract``; the consumer passes the pooled
+    :class:`ArticleFetcher` and :class:`ExtractionPool` instead. A
+    ``language_hint`` from the source skips language detection, and content
+    already in the target language is not sent to the translator. The
+    current span's trace context is stored on the article so approval and
+    publishing can continue the same trace, and ``priority`` so the approved
+    article goes to the same lane of ``article.approved``. The URL is
+    recorded in the processed-message ledger, and the ``article.processed``
+    message added to the outbox, in the article's transaction.
+    """
+    span = current_span()
+    with _stage("fetch"):
+        downloaded = (fetch or _trafilatura().fetch_url)(url)
     if not downloaded:
+        ARTICLES.labels("fetch_failed").inc()
         logger.warning("Failed to download URL", extra={"url": url})
         return
-    content = trafilatura.extract(downloaded)
+    with _stage("extract"):
+        content = (extract or _trafilatura().extract)(downloaded)
     if not content:
+        ARTICLES.labels("no_content").inc()
         logger.warning("No content extracted", extra={"url": url})
         return
-    translated = translator.translate(content, target_language="en")["translatedText"]
-    summary_obj = summarizer.predict(translated)
+    with _stage("detect_language"):
+        language = (
+            normalize_language(language_hint) or detect_language(content)
+        )
+    if language == TARGET_LANGUAGE:
+        translated = content
+    else:
+        with _stage("translate"):
+            translated = translator.translate(
+                content, target_language=TARGET_LANGUAGE
+            )["translatedText"]
+    with _stage("summarize"):
+        summary_obj = summarizer.predict(translated)
     summary_text = getattr(summary_obj, "text", str(summary_obj))
-    with session_scope() as db:
-        article = Article(
-            source_url=url,
-            content=content,
-            translated_content=translated,
-            summary=summary_text,
+    try:
+        with _stage("store"), session_scope() as db:
+            article = Article(
+                source_url=url,
+                content=content,
+                translated_content=translated,
+                summary=summary_text,
+                language=language,
+                priority=priority,
+                traceparent=span.context.traceparent if span else None,
+            )
+            db.add(article)
+            # Committed with the article, so a redelivery finds it done.
+            idempotency.record_processed(
+                db, LEDGER_CONSUMER, idempotency.message_key(url)
+            )
+            db.flush()
+            message = {
+                "id": article.id,
+                "summary": summary_text,
+                "source_url": url,
+            }
+            # article.processed goes out through the outbox, so it is sent
+            # if and only if the article is committed.
+            outbox.enqueue(
+                db,
+                QUEUE_PROCESSED,
+                json.dumps(message).encode(),
+                headers=inject({lanes.HEADER: priority}),
+                content_type="application/json",
+            )
+    except IntegrityError:
+        # Another worker stored the same URL first; ours was rolled back.
+        ARTICLES.labels("duplicate").inc()
+        logger.info(
+            "Skipping URL stored by another worker", extra={"url": url}
         )
-        db.add(article)
-    logger.info("Processed article", extra={"url": url})
+        return
+    ARTICLES.labels("stored").inc()
+    logger.info(
+        "Processed article",
+        extra={
+            "url": url,
+            "tokens": getattr(summary_obj, "tokens", None),
+            "chunks": getattr(summary_obj, "chunks", 1),
+        },
+    )
+    return message
 
 
 def main():
     logger = configure_logging()
     logger.info("Core engine starting")
+    start_metrics_server()
+    tracer = configure_tracing("core_engine")
+    configure_profiling("core_engine")
     init_db()
-    translator = translate.Client()
     conn = get_rabbitmq_connection()
-    channel = conn.channel()
-    channel.queue_declare(queue="url.new", durable=True)
+    channel = InstrumentedChannel(conn.channel())
+    lanes.declare_lanes(channel, QUEUE_INPUT)
+    channel.queue_declare(queue=QUEUE_PROCESSED, durable=True)
+    declare_defer_queues(channel)
+    health = Health.from_env().register()
+    health.add_check("database", database_check)
+    health.add_check("broker", broker_check(conn))
+    watch_queues(conn, lanes.lane_queues(QUEUE_INPUT), health)
+    idempotency.prune_periodically(conn, session_scope)
+    relay = outbox.OutboxRelay.from_env(conn.channel(), session_scope)
+    relay.attach(conn)
+    limiter = DomainRateLimiter.from_env()
+    fetcher = ArticleFetcher.from_env()
+    extractor = ExtractionPool.from_env()
+    # Loaded once the health and metrics endpoints are already serving.
+    translator = translation_client()
+    chunked_summarizer = ChunkedSummarizer.from_env(load_summarizer())
 
     def callback(ch, method, properties, body):
         url = body.decode()
-        process_url(url, translator, summarizer, logger)
+        headers = getattr(properties, "headers", None) or {}
+        priority = lanes.lane_for_headers(headers)
+        with session_scope() as db:
+            done = idempotency.already_processed(
+                db, LEDGER_CONSUMER, idempotency.message_key(url)
+            )
+        if done:
+            # Redelivered after the article was stored but before the ack.
+            ARTICLES.labels("duplicate").inc()
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            logger.info("Skipping already processed URL", extra={"url": url})
+            return
+        delay = limiter.delay_for(url, headers.get(NOT_BEFORE_HEADER))
+        if delay > 0:
+            # Hand the URL back to the broker rather than sleeping so this
+            # worker can keep fetching from other domains.
+            defer_url(ch, url, delay, properties)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            logger.info(
+                "Deferred throttled URL", extra={"url": url, "delay": delay}
+            )
+            return
+        with health.track(), tracer.start_span(
+            "core.process_url",
+            parent=extract(headers),
+            attributes={"url": url, "lane": priority},
+        ) as span:
+            sent_at = getattr(properties, "timestamp", None)
+            if sent_at:
+                waited = max(0, int(time.time()) - sent_at)
+                span.set_attribute("queue.wait_seconds", waited)
+            message = process_url(
+                url,
+                translator,
+                chunked_summarizer,
+                logger,
+                fetch=fetcher.fetch,
+                extract=extractor.extract,
+                language_hint=headers.get("language"),
+                priority=priority,
+            )
+            if message:
+                relay.wake()
         ch.basic_ack(delivery_tag=method.delivery_tag)
 
-    channel.basic_consume(queue="url.new", on_message_callback=callback)
     try:
-        channel.start_consuming()
+        # Weighted across the lanes of url.new so a backfill cannot starve
+        # breaking news.
+        lanes.consume_lanes(conn, channel, QUEUE_INPUT, callback)
     finally:
+        extractor.shutdown()
         channel.close()
         conn.close()
 
@@ -0,0 +1,292 @@
+"""Move old articles out of the ``articles`` table into Parquet files.
+
+The table keeps only recent articles, so its indexes stay small and
+queries on current data stay fast. Each month of articles that are done
+with (``PUBLISHED`` or ``REJECTED``) and older than ``ARCHIVE_AFTER_DAYS``
+is written to a zstd-compressed Parquet file under ``ARCHIVE_DIR``,
+recorded in ``manifest.json`` with its id range, and then deleted from the
+table. :func:`get_article` reads an id from the table and falls back to
+the archive::
+
+    python -m services.core_engine.archive --older-than-days 180
+
+This is a hot/cold split rather than MySQL ``PARTITION BY RANGE``: MySQL
+requires the partitioning column in every unique key, which would mean
+replacing the ``id`` primary key that everything looks articles up by.
+
+Rows are deleted only after their file and the manifest are on disk. A
+run interrupted in between archives the same rows again next time, to the
+same file name, so nothing is lost or duplicated.
+"""
+import argparse
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import delete, func, select
+
+from common_utils import configure_logging, session_scope
+from common_utils.metrics import counter
+from services.core_engine import status
+from services.core_engine.models import Article
+
+
+DIR_ENV_VAR = "ARCHIVE_DIR"
+AFTER_ENV_VAR = "ARCHIVE_AFTER_DAYS"
+
+MANIFEST = "manifest.json"
+FINAL_STATES = (status.PUBLISHED, status.REJECTED)
+COLUMNS = [column.name for column in Article.__table__.columns]
+
+ARCHIVED = counter(
+    "articles_archived_total", "Articles moved from the table to the archive."
+)
+ARCHIVE_READS = counter(
+    "article_archive_reads_total", "Article lookups served from the archive."
+)
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start: datetime) -> datetime:
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _pyarrow():
+    """``(pyarrow, pyarrow.parquet)``, or ``None`` without pyarrow.
+
+    Imported on first use rather than with this module, which the
+    management API loads at start-up.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet as parquet
+    except ImportError:  # pragma: no cover
+        return None
+    return pyarrow, parquet
+
+
+def _schema(pyarrow):
+    types = {
+        "id": pyarrow.int64(),
+        "version": pyarrow.int64(),
+        "created_at": pyarrow.timestamp("us"),
+    }
+    return pyarrow.schema(
+        [(name, types.get(name, pyarrow.string())) for name in COLUMNS]
+    )
+
+
+def _temp_path(path: str) -> str:
+    # Unique per call, so concurrent runs never write to the same file.
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+class Archive:
+    """Parquet files of archived articles in ``directory``, by month."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @classmethod
+    def from_env(cls) -> "Archive":
+        return cls(os.getenv(DIR_ENV_VAR, "/data/archive"))
+
+    def manifest(self) -> List[Dict]:
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)["files"]
+
+    def _record(self, entry: Dict) -> None:
+        files = [e for e in self.manifest() if e["file"] != entry["file"]]
+        files.append(entry)
+        files.sort(key=lambda e: e["min_id"])
+        path = os.path.join(self.directory, MANIFEST)
+        tmp = _temp_path(path)
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"files": files}, fh, indent=1)
+        os.replace(tmp, path)
+
+    def write(self, month: datetime, batches: Iterator[Sequence]) -> List[int]:
+        """Write ``batches`` of article rows for ``month`` to a new file.
+
+        Returns the ids written, by which time the file and its manifest
+        entry are in place.
+        """
+        modules = _pyarrow()
+        if modules is None:
+            raise RuntimeError("Archiving articles requires pyarrow")
+        pyarrow, parquet = modules
+        os.makedirs(self.directory, exist_ok=True)
+        ids: List[int] = []
+        schema = _schema(pyarrow)
+        tmp = _temp_path(os.path.join(self.directory, f".{month:%Y-%m}"))
+        writer = None
+        written = False
+        try:
+            for rows in batches:
+                if writer is None:
+                    writer = parquet.ParquetWriter(
+                        tmp, schema, compression="zstd"
+                    )
+                columns = {
+                    name: [getattr(row, name) for row in rows]
+                    for name in COLUMNS
+                }
+                writer.write_table(pyarrow.table(columns, schema=schema))
+                ids.extend(row.id for row in rows)
+            written = bool(ids)
+        finally:
+            if writer is not None:
+                writer.close()
+            if not written and os.path.exists(tmp):
+                os.remove(tmp)
+        if not ids:
+            return ids
+        name = f"articles-{month:%Y-%m}-{ids[0]}.parquet"
+        os.replace(tmp, os.path.join(self.directory, name))
+        self._record(
+            {
+                "file": name,
+                "month": f"{month:%Y-%m}",
+                "min_id": ids[0],
+                "max_id": ids[-1],
+                "rows": len(ids),
+            }
+        )
+        return ids
+
+    def get(self, article_id: int) -> Optional[Dict]:
+        """Column values of an archived article, or ``None``."""
+        modules = _pyarrow()
+        if modules is None:
+            return None
+        parquet = modules[1]
+        for entry in self.manifest():
+            if not entry["min_id"] <= article_id <= entry["max_id"]:
+                continue
+            rows = parquet.read_table(
+                os.path.join(self.directory, entry["file"]),
+                filters=[("id", "=", article_id)],
+            ).to_pylist()
+            if rows:
+                return rows[0]
+        return None
+
+
+def get_article(
+    db, article_id: int, archive: Optional[Archive] = None
+) -> Optional[Article]:
+    """The article with ``article_id``, from the table or else the archive.
+
+    Archived articles come back as detached ``Article`` objects; changing
+    them has no effect.
+    """
+    article = db.get(Article, article_id)
+    if article is not None or archive is None:
+        return article
+    row = archive.get(article_id)
+    if row is None:
+        return None
+    ARCHIVE_READS.inc()
+    return Article(**row)
+
+
+def stream_month(db, start: datetime, batch_size: int) -> Iterator[Sequence]:
+    """Yield the finished articles created in ``start``'s month, by id."""
+    query = (
+        select(*(getattr(Article, name) for name in COLUMNS))
+        .where(
+            Article.created_at >= start,
+            Article.created_at < next_month(start),
+            Article.status.in_(FINAL_STATES),
+        )
+        .order_by(Article.id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    yield from db.execute(query).partitions()
+
+
+def archive_month(
+    archive: Archive, start: datetime, batch_size: int = 1000
+) -> int:
+    """Archive and delete one month's finished articles; return how many."""
+    with session_scope() as reader:
+        ids = archive.write(start, stream_month(reader, start, batch_size))
+    # One transaction, so an interrupted run leaves the month whole.
+    with session_scope() as db:
+        for low in range(0, len(ids), batch_size):
+            chunk = ids[low:low + batch_size]
+            db.execute(delete(Article).where(Article.id.in_(chunk)))
+    ARCHIVED.inc(len(ids))
+    logger.info(
+        "Archived articles",
+        extra={"month": f"{start:%Y-%m}", "articles": len(ids)},
+    )
+    return len(ids)
+
+
+def archive_older_than(
+    archive: Archive,
+    older_than: timedelta,
+    batch_size: int = 1000,
+    now: Optional[datetime] = None,
+) -> int:
+    """Archive every whole month that ended more than ``older_than`` ago."""
+    cutoff = month_start((now or datetime.utcnow()) - older_than)
+    with session_scope() as db:
+        oldest = db.execute(
+            select(func.min(Article.created_at)).where(
+                Article.status.in_(FINAL_STATES), Article.created_at < cutoff
+            )
+        ).scalar()
+    done = 0
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        done += archive_month(archive, month, batch_size)
+        month = next_month(month)
+    return done
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--older-than-days",
+        type=float,
+        default=float(os.getenv(AFTER_ENV_VAR, "180")),
+        help=(
+            f"archive months older than this (default ${AFTER_ENV_VAR} "
+            "or 180)"
+        ),
+    )
+    parser.add_argument(
+        "--dir",
+        default=None,
+        help=f"archive directory (default ${DIR_ENV_VAR})",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    log = configure_logging()
+    archive = Archive(args.dir) if args.dir else Archive.from_env()
+    done = archive_older_than(
+        archive, timedelta(days=args.older_than_days), args.batch_size
+    )
+    log.info(
+        "Archive finished",
+        extra={"articles": done, "directory": archive.directory},
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,333 @@
+"""Re-run processing stages over stored articles.
+
+Changing the summarizer prompt or model, or the translation target, does
+not require crawling again: the article's extracted ``content`` (and its
+``translated_content``) is already in the database. This tool walks the
+``articles`` table by primary key a batch at a time, re-runs only the
+requested stages on each batch and writes the results back with one bulk
+``UPDATE`` per batch.
+
+Progress is recorded in a checkpoint file after every batch, so an
+interrupted run continues where it stopped::
+
+    python -m services.core_engine.backfill --stages summarize \\
+        --checkpoint /data/resummarize.json
+
+Extraction is not a stage, as the downloaded HTML is not kept.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import func, select, update
+
+from common_utils import configure_logging, session_scope
+from common_utils.metrics import counter
+from services.core_engine.langid import detect_language
+from services.core_engine.models import Article
+
+STAGES = ("language", "translate", "summarize")
+TARGET_LANGUAGE = "en"
+
+TRANSLATE_SEGMENTS_ENV_VAR = "BACKFILL_TRANSLATE_SEGMENTS"
+TRANSLATE_CHARS_ENV_VAR = "BACKFILL_TRANSLATE_CHARS"
+
+UPDATED = counter(
+    "backfill_articles_total",
+    "Articles rewritten by the backfill.",
+    ("stage",),
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """The last article id a backfill has written, kept in a JSON file."""
+
+    def __init__(self, path: Optional[str], stages: Sequence[str]) -> None:
+        self.path = path
+        self.stages = sorted(stages)
+
+    def load(self) -> Optional[int]:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding="utf-8") as fh:
+            state = json.load(fh)
+        if state.get("stages") != self.stages:
+            logger.warning(
+                "Checkpoint is for other stages; starting over",
+                extra={"checkpoint": self.path, "stages": state.get("stages")},
+            )
+            return None
+        return state["last_id"]
+
+    def save(self, last_id: int) -> None:
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"stages": self.stages, "last_id": last_id}, fh)
+        # Atomic, so a crash mid-write leaves the previous checkpoint intact.
+        os.replace(tmp, self.path)
+
+
+def read_batch(db, after_id: int, last_id: int, batch_size: int) -> List:
+    """The next ``batch_size`` articles after ``after_id``, up to ``last_id``.
+
+    Each batch is fetched in full with a keyset query, so no cursor stays
+    open on the server between batches.
+    """
+    query = (
+        select(
+            Article.id,
+            Article.content,
+            Article.translated_content,
+            Article.language,
+        )
+        .where(Article.id > after_id, Article.id <= last_id)
+        .order_by(Article.id)
+        .limit(batch_size)
+    )
+    return db.execute(query).all()
+
+
+def request_batches(
+    texts: Sequence[str], max_segments: int, max_chars: int
+) -> Iterator[List[str]]:
+    """Split ``texts`` into consecutive groups for one translate call each.
+
+    A group holds at most ``max_segments`` texts and ``max_chars``
+    characters in total; a text longer than ``max_chars`` is sent alone.
+    """
+    group: List[str] = []
+    size = 0
+    for text in texts:
+        if group and (
+            len(group) == max_segments or size + len(text) > max_chars
+        ):
+            yield group
+            group, size = [], 0
+        group.append(text)
+        size += len(text)
+    if group:
+        yield group
+
+
+class Backfill:
+    """Re-run ``stages`` for stored articles and write the results back.
+
+    ``translator`` is a Google Translate client, whose ``translate`` accepts
+    a list of texts, and ``summarizer`` anything with ``predict(text)``
+    such as :class:`ChunkedSummarizer`. Summaries of a batch are requested
+    ``concurrency`` at a time. Translations of a batch are split into calls
+    of at most ``translate_segments`` texts and ``translate_chars``
+    characters, within the Translation API's per-request limits.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[str],
+        translator=None,
+        summarizer=None,
+        batch_size: int = 100,
+        concurrency: int = 4,
+        checkpoint: Optional[Checkpoint] = None,
+        sleep: Callable[[float], None] = time.sleep,
+        pause: float = 0.0,
+        translate_segments: int = 128,
+        translate_chars: int = 30000,
+    ) -> None:
+        unknown = set(stages) - set(STAGES)
+        if not stages:
+            raise ValueError("No stages to run")
+        if unknown:
+            raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+        # Always run in pipeline order, whatever order they were given in.
+        self.stages = [stage for stage in STAGES if stage in stages]
+        self.translator = translator
+        self.summarizer = summarizer
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint or Checkpoint(None, self.stages)
+        self._sleep = sleep
+        self.pause = pause
+        self.translate_segments = translate_segments
+        self.translate_chars = translate_chars
+
+    def _translate(self, texts: List[str]) -> List[str]:
+        translated = []
+        groups = request_batches(
+            texts, self.translate_segments, self.translate_chars
+        )
+        for group in groups:
+            results = self.translator.translate(
+                group, target_language=TARGET_LANGUAGE
+            )
+            translated.extend(result["translatedText"] for result in results)
+        return translated
+
+    def _summarize(
+        self, texts: List[str], executor: ThreadPoolExecutor
+    ) -> List[str]:
+        results = executor.map(self.summarizer.predict, texts)
+        return [getattr(result, "text", str(result)) for result in results]
+
+    def process_batch(
+        self, rows: Sequence, executor: ThreadPoolExecutor
+    ) -> List[Dict]:
+        """New column values for ``rows``, as ``update`` parameter dicts."""
+        values = [{"id": row.id} for row in rows]
+        languages = [row.language for row in rows]
+        translated = [row.translated_content or row.content for row in rows]
+        if "language" in self.stages:
+            languages = [detect_language(row.content) for row in rows]
+            for value, language in zip(values, languages):
+                value["language"] = language
+        if "translate" in self.stages:
+            translated = [row.content for row in rows]
+            todo = [
+                i for i, language in enumerate(languages)
+                if language != TARGET_LANGUAGE
+            ]
+            if todo:
+                texts = self._translate([rows[i].content for i in todo])
+                for i, text in zip(todo, texts):
+                    translated[i] = text
+            for value, text in zip(values, translated):
+                value["translated_content"] = text
+        if "summarize" in self.stages:
+            summaries = self._summarize(translated, executor)
+            for value, summary in zip(values, summaries):
+                value["summary"] = summary
+        return values
+
+    def run(
+        self, start_id: Optional[int] = None, end_id: Optional[int] = None
+    ) -> int:
+        """Process articles from ``start_id`` (or checkpoint) to ``end_id``.
+
+        Returns the number of articles updated.
+        """
+        resume = self.checkpoint.load()
+        with session_scope() as db:
+            low, high = db.execute(
+                select(func.min(Article.id), func.max(Article.id))
+            ).one()
+        if low is None:
+            return 0
+        after = max(low - 1, (start_id or low) - 1, resume or 0)
+        last = min(high, end_id or high)
+        done = 0
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="backfill"
+        ) as executor:
+            while after < last:
+                # The reader is closed before the slow model calls, so no
+                # connection sits idle long enough for MySQL to drop it.
+                with session_scope() as reader:
+                    rows = read_batch(reader, after, last, self.batch_size)
+                if not rows:
+                    break
+                values = self.process_batch(rows, executor)
+                with session_scope() as writer:
+                    writer.execute(update(Article), values)
+                after = rows[-1].id
+                self.checkpoint.save(after)
+                done += len(values)
+                for stage in self.stages:
+                    UPDATED.labels(stage).inc(len(values))
+                logger.info(
+                    "Backfilled batch",
+                    extra={"last_id": after, "articles": done},
+                )
+                if self.pause:
+                    # Leave room for the live pipeline on shared quotas.
+                    self._sleep(self.pause)
+        return done
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--stages",
+        default="summarize",
+        help=(
+            f"comma-separated stages to re-run: {', '.join(STAGES)} "
+            "(default summarize)"
+        ),
+    )
+    parser.add_argument("--start-id", type=int, help="first article id")
+    parser.add_argument("--end-id", type=int, help="last article id")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="summaries in flight"
+    )
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=0.0,
+        help="seconds to wait between batches",
+    )
+    parser.add_argument(
+        "--checkpoint", help="file recording progress, for resuming"
+    )
+    parser.add_argument(
+        "--translate-segments",
+        type=int,
+        default=int(os.getenv(TRANSLATE_SEGMENTS_ENV_VAR, "128")),
+        help=(
+            "texts per translate call "
+            f"(default ${TRANSLATE_SEGMENTS_ENV_VAR} or 128)"
+        ),
+    )
+    parser.add_argument(
+        "--translate-chars",
+        type=int,
+        default=int(os.getenv(TRANSLATE_CHARS_ENV_VAR, "30000")),
+        help=(
+            "characters per translate call "
+            f"(default ${TRANSLATE_CHARS_ENV_VAR} or 30000)"
+        ),
+    )
+    args = parser.parse_args(argv)
+
+    log = configure_logging()
+    stages = [
+        stage.strip() for stage in args.stages.split(",") if stage.strip()
+    ]
+    translator = summarizer = None
+    if "translate" in stages or "summarize" in stages:
+        # The model clients are only needed, and only imported, for these
+        # stages.
+        from services.core_engine import app as core_app
+        from services.core_engine.summarization import ChunkedSummarizer
+
+        if "translate" in stages:
+            translator = core_app.translation_client()
+        if "summarize" in stages:
+            summarizer = ChunkedSummarizer.from_env(core_app.load_summarizer())
+    backfill = Backfill(
+        stages,
+        translator=translator,
+        summarizer=summarizer,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint=Checkpoint(args.checkpoint, stages),
+        pause=args.pause,
+        translate_segments=args.translate_segments,
+        translate_chars=args.translate_chars,
+    )
+    done = backfill.run(args.start_id, args.end_id)
+    log.info(
+        "Backfill finished",
+        extra={"articles": done, "stages": backfill.stages},
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,11 +1,28 @@
+"""Schema set-up for core_engine.
+
+``init_db`` runs at every start-up and only does what is cheap: creating
+missing tables and adding missing columns. Indexes added to the models
+after their tables existed are built by a one-off migration, run once per
+release before the new services start, because building an index on a
+large ``articles`` table takes a long time::
+
+    python -m services.core_engine.database
+"""
+import argparse
+import logging
 import time
-from typing import Optional
+from typing import Optional, Sequence
 
+from sqlalchemy import inspect, text
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
 
-from common_utils import get_engine
+from common_utils import configure_logging, get_engine, idempotency, outbox
 from .models import Base
 
+logger = logging.getLogger(__name__)
+
 
 def _get_engine_with_retry(
     retries: int = 5, delay: float = 1.0, backoff: float = 2.0
@@ -32,11 +49,94 @@ def init_db(
     delay: float = 1.0,
     backoff: float = 2.0,
 ) -> None:
-    """Create database tables.
+    """Create database tables, including the processed-message ledger and
+    the outbox.
 
     Retries obtaining a database engine a few times to tolerate transient
     connection failures during service start-up.
     """
     if engine is None:
         engine = _get_engine_with_retry(retries=retries, delay=delay, backoff=backoff)
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    ensure_columns(engine)
+    idempotency.init_db(engine)
+    outbox.init_db(engine)
+
+
+def ensure_columns(engine: Engine) -> None:
+    """Add columns added to the models after their tables were created.
+
+    ``create_all`` skips existing tables, so a new column would otherwise be
+    missing from every existing database and each query naming it would
+    fail. New columns must be nullable or have a ``server_default`` for the
+    rows already there. A replica starting at the same time may add the
+    column first, which is not an error.
+    """
+    for table in Base.metadata.sorted_tables:
+        if not inspect(engine).has_table(table.name):
+            continue
+        existing = {
+            column["name"]
+            for column in inspect(engine).get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                    )
+            except DBAPIError:
+                columns = inspect(engine).get_columns(table.name)
+                if column.name not in {c["name"] for c in columns}:
+                    raise
+
+
+def ensure_indexes(engine: Engine) -> None:
+    """Create indexes added to the models after their tables were created.
+
+    ``create_all`` skips existing tables, so without this an index added to
+    a model would only exist in new databases. Run by the migration, not at
+    start-up; a concurrent run creating the same index first is not an
+    error.
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            logger.info(
+                "Creating index",
+                extra={"table": table.name, "index": index.name},
+            )
+            try:
+                index.create(bind=engine)
+            except DBAPIError:
+                indexes = inspect(engine).get_indexes(table.name)
+                if index.name not in {i["name"] for i in indexes}:
+                    raise
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Migrate the core_engine schema."
+    )
+    parser.parse_args(argv)
+
+    log = configure_logging()
+    engine = _get_engine_with_retry()
+    init_db(engine)
+    ensure_indexes(engine)
+    log.info("Migration finished")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
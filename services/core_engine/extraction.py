@@ -0,0 +1,135 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Sequence
+
+WORKERS_ENV_VAR = "EXTRACTION_WORKERS"
+MAX_TASKS_ENV_VAR = "EXTRACTION_MAX_TASKS_PER_CHILD"
+TIMEOUT_ENV_VAR = "EXTRACTION_TIMEOUT_SECONDS"
+CONTEXT_ENV_VAR = "EXTRACTION_MP_CONTEXT"
+
+# Extra time the parent waits past the in-worker alarm before it assumes the
+# worker is stuck in C code and kills the pool.
+KILL_GRACE_SECONDS = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionTimeout(Exception):
+    """Raised inside a worker when a document exceeds its time budget."""
+
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout()
+
+
+def _init_worker(preload: Sequence[str]) -> None:
+    # Import once per worker so each task only pays for the extraction.
+    for module in preload:
+        importlib.import_module(module)
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def _noop() -> None:
+    return None
+
+
+def trafilatura_extract(html: bytes) -> Optional[str]:
+    import trafilatura
+
+    return trafilatura.extract(html)
+
+
+def _run(func: Callable[[bytes], Optional[str]], html: bytes, timeout: float):
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(html)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ExtractionPool:
+    """Run CPU-bound HTML extraction in a warm process pool.
+
+    Workers import trafilatura up front and are replaced after
+    ``max_tasks_per_child`` documents to cap memory creep. Raw bytes go in
+    and only the extracted text comes back. A document that runs past
+    ``timeout`` yields ``None``; if its worker does not respond to the alarm
+    the whole pool is killed and recreated.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_tasks_per_child: int = 200,
+        timeout: float = 30.0,
+        mp_context: str = "forkserver",
+        func: Callable[[bytes], Optional[str]] = trafilatura_extract,
+        preload: Sequence[str] = ("trafilatura",),
+    ) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.max_tasks_per_child = max_tasks_per_child
+        self.timeout = timeout
+        self.func = func
+        self.preload = tuple(preload)
+        self._context = multiprocessing.get_context(mp_context)
+        if mp_context == "forkserver":
+            self._context.set_forkserver_preload(list(self.preload))
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+
+    @classmethod
+    def from_env(cls) -> "ExtractionPool":
+        workers = os.getenv(WORKERS_ENV_VAR)
+        return cls(
+            workers=int(workers) if workers else None,
+            max_tasks_per_child=int(os.getenv(MAX_TASKS_ENV_VAR, "200")),
+            timeout=float(os.getenv(TIMEOUT_ENV_VAR, "30")),
+            mp_context=os.getenv(CONTEXT_ENV_VAR, "forkserver"),
+        )
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(self.preload,),
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+        # Start every worker now so the first articles don't pay the import.
+        for future in [executor.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is not broken:
+                return
+            # ProcessPoolExecutor has no public way to kill a busy worker.
+            for process in list(getattr(broken, "_processes", {}).values()):
+                process.kill()
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+
+    def extract(self, html: bytes) -> Optional[str]:
+        """Return the main text of ``html`` or ``None``."""
+        executor = self._executor
+        try:
+            future = executor.submit(_run, self.func, html, self.timeout)
+            return future.result(timeout=self.timeout + KILL_GRACE_SECONDS)
+        except ExtractionTimeout:
+            logger.warning("Extraction timed out")
+            return None
+        except (FutureTimeout, BrokenProcessPool):
+            logger.warning("Extraction worker stuck or dead, restarting pool")
+            self._restart(executor)
+            return None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,196 @@
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util import Retry, Timeout, make_headers
+
+MAX_BYTES_ENV_VAR = "FETCH_MAX_BYTES"
+TIMEOUT_ENV_VAR = "FETCH_TIMEOUT_SECONDS"
+POOL_SIZE_ENV_VAR = "FETCH_POOL_SIZE"
+DNS_TTL_ENV_VAR = "FETCH_DNS_TTL_SECONDS"
+USER_AGENT_ENV_VAR = "FETCH_USER_AGENT"
+
+DEFAULT_USER_AGENT = "robopost"
+CHUNK_SIZE = 64 * 1024
+
+
+class DnsCache:
+    """Small TTL cache in front of ``socket.getaddrinfo``."""
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        resolver: Callable = socket.getaddrinfo,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self._resolver = resolver
+        self._clock = clock
+        self._entries: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> str:
+        """Return a cached address for ``host``, or ``host`` itself."""
+        key = (host, port)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[1] > now:
+            return entry[0]
+        try:
+            infos = self._resolver(host, port, 0, socket.SOCK_STREAM)
+        except OSError:
+            # Let urllib3 resolve again and raise its own NameResolutionError.
+            return host
+        address = infos[0][4][0]
+        with self._lock:
+            self._entries[key] = (address, now + self.ttl)
+        return address
+
+
+class _CachedDnsMixin:
+    dns_cache: Optional[DnsCache] = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        if self.dns_cache is not None:
+            self._dns_host = self.dns_cache.resolve(host, self.port)
+        try:
+            return super()._new_conn()
+        finally:
+            # ``host`` is derived from ``_dns_host`` and is needed for SNI and
+            # certificate checks, so only the socket connect sees the address.
+            self._dns_host = host
+
+
+def _pool_classes(dns_cache: DnsCache):
+    http_conn = type(
+        "CachedDnsHTTPConnection",
+        (_CachedDnsMixin, HTTPConnection),
+        {"dns_cache": dns_cache},
+    )
+    https_conn = type(
+        "CachedDnsHTTPSConnection",
+        (_CachedDnsMixin, HTTPSConnection),
+        {"dns_cache": dns_cache},
+    )
+    return {
+        "http": type(
+            "CachedDnsHTTPConnectionPool",
+            (HTTPConnectionPool,),
+            {"ConnectionCls": http_conn},
+        ),
+        "https": type(
+            "CachedDnsHTTPSConnectionPool",
+            (HTTPSConnectionPool,),
+            {"ConnectionCls": https_conn},
+        ),
+    }
+
+
+class ArticleFetcher:
+    """Shared HTTP client for downloading article pages.
+
+    Keeps a keep-alive pool per host, advertises gzip/deflate (and brotli
+    when the ``brotli`` package is installed), caches DNS lookups and stops
+    reading once a response exceeds ``max_bytes`` or ``timeout`` seconds.
+    The deadline holds even against a server that sends a few bytes at a
+    time: a timer shuts the socket down when it passes, which ends any
+    read in progress. Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 5 * 1024 * 1024,
+        timeout: float = 15.0,
+        pool_size: int = 4,
+        num_pools: int = 100,
+        dns_ttl: float = 300.0,
+        user_agent: str = DEFAULT_USER_AGENT,
+        pool_manager: Optional[urllib3.PoolManager] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        if pool_manager is None:
+            headers = make_headers(accept_encoding=True, user_agent=user_agent)
+            pool_manager = urllib3.PoolManager(
+                num_pools=num_pools,
+                maxsize=pool_size,
+                headers=headers,
+                retries=Retry(total=2, redirect=5, backoff_factor=0.2),
+                timeout=Timeout(connect=min(timeout, 5.0), read=timeout),
+            )
+            pool_manager.pool_classes_by_scheme = _pool_classes(
+                DnsCache(ttl=dns_ttl)
+            )
+        self._pool = pool_manager
+
+    @classmethod
+    def from_env(cls) -> "ArticleFetcher":
+        return cls(
+            max_bytes=int(os.getenv(MAX_BYTES_ENV_VAR, str(5 * 1024 * 1024))),
+            timeout=float(os.getenv(TIMEOUT_ENV_VAR, "15")),
+            pool_size=int(os.getenv(POOL_SIZE_ENV_VAR, "4")),
+            dns_ttl=float(os.getenv(DNS_TTL_ENV_VAR, "300")),
+            user_agent=os.getenv(USER_AGENT_ENV_VAR, DEFAULT_USER_AGENT),
+        )
+
+    def fetch(self, url: str) -> Optional[bytes]:
+        """Download ``url`` and return the decoded body.
+
+        Returns ``None`` on network errors, non-200 responses, or when the
+        body is larger than ``max_bytes`` or takes longer than ``timeout``.
+        """
+        try:
+            response = self._pool.request(
+                "GET", url, preload_content=False, decode_content=True
+            )
+        except urllib3.exceptions.HTTPError:
+            return None
+        try:
+            if response.status != 200:
+                response.close()
+                return None
+            length = response.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                response.close()
+                return None
+            expired = threading.Event()
+            timer = threading.Timer(
+                self.timeout, _expire, args=(response, expired)
+            )
+            timer.daemon = True
+            timer.start()
+            try:
+                chunks = []
+                size = 0
+                for chunk in response.stream(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes or expired.is_set():
+                        response.close()
+                        return None
+                    chunks.append(chunk)
+            finally:
+                timer.cancel()
+            # A body cut short by the timer can look complete.
+            return None if expired.is_set() else b"".join(chunks)
+        except (urllib3.exceptions.HTTPError, OSError):
+            return None
+        finally:
+            response.release_conn()
+
+
+def _expire(response, expired: threading.Event) -> None:
+    """Abort a read that ran past the fetch deadline."""
+    expired.set()
+    sock = getattr(response.connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
@@ -0,0 +1,183 @@
+"""Offline language identification for article text.
+
+Non-Latin scripts are recognised from their Unicode ranges. Latin-script
+text is classified with character trigram profiles (Cavnar & Trenkle
+out-of-place distance) built from the short samples below, which is enough
+to tell the common news languages apart without a network call.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+SAMPLE_CHARS = 2000
+PROFILE_SIZE = 300
+# Minimum share of letters a script needs before it decides the language.
+SCRIPT_THRESHOLD = 0.4
+# How much closer the best profile must be than the runner-up.
+MIN_MARGIN = 0.03
+
+_SAMPLES = {
+    "en": (
+        "The government said on Monday that it would not change the policy, "
+        "but officials from both parties have been working on a new plan. It "
+        "is the first time that the country has seen such a large number of "
+        "people in the streets, and there was no sign that they would stop. "
+        "According to the report, which was published by the ministry, the "
+        "economy will grow more slowly this year than expected. We have to "
+        "make sure that what happened here does not happen again, he told "
+        "reporters after the meeting with the president of the company."
+    ),
+    "fr": (
+        "Le gouvernement a annoncé lundi qu'il ne changerait pas sa "
+        "politique, mais les responsables des deux partis travaillent sur un "
+        "nouveau plan. C'est la première fois que le pays voit un si grand "
+        "nombre de personnes dans les rues, et rien n'indique qu'elles vont "
+        "s'arrêter. Selon le rapport publié par le ministère, l'économie va "
+        "croître plus lentement cette année que prévu. Nous devons nous "
+        "assurer que ce qui s'est passé ici ne se reproduise pas, a-t-il "
+        "déclaré aux journalistes après la réunion avec le président de la "
+        "société."
+    ),
+    "de": (
+        "Die Regierung erklärte am Montag, dass sie die Politik nicht ändern "
+        "werde, aber Vertreter beider Parteien arbeiten an einem neuen Plan. "
+        "Es ist das erste Mal, dass das Land so viele Menschen auf den "
+        "Straßen gesehen hat, und es gab kein Zeichen, dass sie aufhören "
+        "würden. Nach dem Bericht, der vom Ministerium veröffentlicht wurde, "
+        "wird die Wirtschaft in diesem Jahr langsamer wachsen als erwartet. "
+        "Wir müssen sicherstellen, dass sich das nicht wiederholt, sagte er "
+        "nach dem Treffen mit dem Vorsitzenden des Unternehmens."
+    ),
+    "es": (
+        "El gobierno dijo el lunes que no cambiaría la política, pero los "
+        "funcionarios de ambos partidos están trabajando en un nuevo plan. Es "
+        "la primera vez que el país ve un número tan grande de personas en "
+        "las calles, y no hay señales de que vayan a detenerse. Según el "
+        "informe publicado por el ministerio, la economía crecerá más "
+        "lentamente este año de lo esperado. Tenemos que asegurarnos de que "
+        "lo que pasó aquí no vuelva a ocurrir, dijo a los periodistas después "
+        "de la reunión con el presidente de la empresa."
+    ),
+    "it": (
+        "Il governo ha detto lunedì che non cambierà la politica, ma i "
+        "funzionari di entrambi i partiti stanno lavorando a un nuovo piano. "
+        "È la prima volta che il paese vede un numero così grande di persone "
+        "nelle strade, e non c'è alcun segno che si fermeranno. Secondo il "
+        "rapporto pubblicato dal ministero, l'economia crescerà più "
+        "lentamente quest'anno del previsto. Dobbiamo assicurarci che quello "
+        "che è successo qui non accada di nuovo, ha detto ai giornalisti dopo "
+        "l'incontro con il presidente della società."
+    ),
+    "pt": (
+        "O governo disse na segunda-feira que não mudaria a política, mas os "
+        "responsáveis dos dois partidos estão a trabalhar num novo plano. É a "
+        "primeira vez que o país vê um número tão grande de pessoas nas ruas, "
+        "e não há sinal de que vão parar. De acordo com o relatório publicado "
+        "pelo ministério, a economia vai crescer mais devagar este ano do que "
+        "o esperado. Temos de garantir que o que aconteceu aqui não volte a "
+        "acontecer, disse aos jornalistas depois da reunião com o presidente "
+        "da empresa."
+    ),
+    "nl": (
+        "De regering zei maandag dat zij het beleid niet zou veranderen, maar "
+        "vertegenwoordigers van beide partijen werken aan een nieuw plan. Het "
+        "is de eerste keer dat het land zoveel mensen op straat heeft gezien, "
+        "en er is geen teken dat zij zullen stoppen. Volgens het rapport dat "
+        "door het ministerie werd gepubliceerd, zal de economie dit jaar "
+        "langzamer groeien dan verwacht. We moeten ervoor zorgen dat wat hier "
+        "is gebeurd niet opnieuw gebeurt, zei hij tegen verslaggevers na de "
+        "vergadering met de voorzitter van het bedrijf."
+    ),
+    "tr": (
+        "Hükümet pazartesi günü politikayı değiştirmeyeceğini söyledi, ancak "
+        "her iki partinin yetkilileri yeni bir plan üzerinde çalışıyor. "
+        "Ülkenin sokaklarda bu kadar çok insan gördüğü ilk sefer bu ve "
+        "duracaklarına dair hiçbir işaret yok. Bakanlık tarafından yayınlanan "
+        "rapora göre ekonomi bu yıl beklenenden daha yavaş büyüyecek. Burada "
+        "olanların bir daha olmamasını sağlamalıyız, dedi şirketin başkanıyla "
+        "yapılan toplantıdan sonra gazetecilere."
+    ),
+}
+
+_SCRIPTS = (
+    (
+        "arabic",
+        re.compile("[\u0600-\u06ff\u0750-\u077f\ufb50-\ufdff\ufe70-\ufeff]"),
+    ),
+    ("ru", re.compile("[\u0400-\u04ff]")),
+    ("he", re.compile("[\u0590-\u05ff]")),
+    ("el", re.compile("[\u0370-\u03ff]")),
+    ("cjk", re.compile("[\u3040-\u30ff\u4e00-\u9fff]")),
+    ("ko", re.compile("[\uac00-\ud7af]")),
+    ("hi", re.compile("[\u0900-\u097f]")),
+)
+# Letters used in Persian but not in Arabic.
+_PERSIAN_RE = re.compile("[\u067e\u0686\u0698\u06af\u06cc\u06a9]")
+_KANA_RE = re.compile("[\u3040-\u30ff]")
+_LETTER_RE = re.compile(r"[^\W\d_]", re.UNICODE)
+_NON_LETTER_RE = re.compile(r"[\W\d_]+", re.UNICODE)
+
+
+def _trigrams(text: str) -> Counter:
+    counts: Counter = Counter()
+    for word in _NON_LETTER_RE.split(text.lower()):
+        if not word:
+            continue
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            counts[padded[i:i + 3]] += 1
+    return counts
+
+
+def _profile(text: str) -> Dict[str, int]:
+    ranked: List[str] = [
+        gram for gram, _ in _trigrams(text).most_common(PROFILE_SIZE)
+    ]
+    return {gram: rank for rank, gram in enumerate(ranked)}
+
+
+_PROFILES = {lang: _profile(sample) for lang, sample in _SAMPLES.items()}
+
+
+def _script_language(text: str) -> Optional[str]:
+    letters = len(_LETTER_RE.findall(text))
+    if not letters:
+        return None
+    for name, pattern in _SCRIPTS:
+        if len(pattern.findall(text)) / letters >= SCRIPT_THRESHOLD:
+            if name == "arabic":
+                return "fa" if _PERSIAN_RE.search(text) else "ar"
+            if name == "cjk":
+                return "ja" if _KANA_RE.search(text) else "zh"
+            return name
+    return None
+
+
+def detect_language(text: str) -> Optional[str]:
+    """Return an ISO 639-1 code for ``text`` or ``None`` when unsure."""
+    sample = text[:SAMPLE_CHARS]
+    script = _script_language(sample)
+    if script:
+        return script
+    ranked = [gram for gram, _ in _trigrams(sample).most_common(PROFILE_SIZE)]
+    if len(ranked) < 20:
+        return None
+    worst = PROFILE_SIZE * len(ranked)
+    scores = []
+    for lang, profile in _PROFILES.items():
+        distance = sum(
+            abs(profile.get(gram, PROFILE_SIZE) - rank)
+            for rank, gram in enumerate(ranked)
+        )
+        scores.append((distance / worst, lang))
+    scores.sort()
+    if scores[1][0] - scores[0][0] < MIN_MARGIN:
+        return None
+    return scores[0][1]
+
+
+def normalize_language(code: Optional[str]) -> Optional[str]:
+    """Reduce tags such as ``en-US`` to their primary subtag."""
+    if not code:
+        return None
+    return code.strip().lower().replace("_", "-").split("-")[0] or None
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Index, Integer, String, Text, DateTime, func
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -12,5 +12,26 @@ class Article(Base):
     content = Column(Text, nullable=False)
     translated_content = Column(Text)
     summary = Column(Text)
+    language = Column(String(8))
+    # Lane the article travels in: "high", "normal" or "low".
+    priority = Column(
+        String(8), default="normal", server_default="normal", nullable=False
+    )
+    # W3C trace context of the span that stored the article.
+    traceparent = Column(String(55))
+    # Changed only through services.core_engine.status.
     status = Column(String(50), default="PENDING_APPROVAL", nullable=False)
-    created_at = Column(DateTime, server_default=func.now(), nullable=False)
\ No newline at end of file
+    version = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_articles_status_id", "status", "id"),
+        Index("ix_articles_created_at", "created_at"),
+        # Backs the management API's article search; a plain index elsewhere.
+        Index(
+            "ft_articles_text",
+            "summary",
+            "translated_content",
+            mysql_prefix="FULLTEXT",
+        ),
+    )
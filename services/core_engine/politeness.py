@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import pika
+
+from common_utils.ratelimit import TokenBucket
+
+RATE_ENV_VAR = "FETCH_DOMAIN_RATE"
+BURST_ENV_VAR = "FETCH_DOMAIN_BURST"
+ROBOTS_ENV_VAR = "FETCH_RESPECT_ROBOTS"
+USER_AGENT_ENV_VAR = "FETCH_USER_AGENT"
+
+DEFAULT_USER_AGENT = "robopost"
+# Wall-clock time a deferred URL's reserved fetch slot comes due.
+NOT_BEFORE_HEADER = "x-not-before"
+ROBOTS_TTL_SECONDS = 3600
+ROBOTS_TIMEOUT_SECONDS = 5
+
+QUEUE_INPUT = "url.new"
+# Fixed-TTL holding queues. A deferred URL goes to the smallest bucket that
+# covers its wait and is dead-lettered back onto ``url.new`` when it expires.
+DEFER_BUCKETS = (1, 5, 30, 120)
+
+
+RobotsLoader = Callable[[str, str], Optional[RobotFileParser]]
+
+
+def _in_thread(fn: Callable[[], None]) -> None:
+    threading.Thread(target=fn, name="robots", daemon=True).start()
+
+
+def _domain(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def _load_robots(domain: str, user_agent: str) -> Optional[RobotFileParser]:
+    parser = RobotFileParser()
+    request = urllib.request.Request(
+        f"https://{domain}/robots.txt", headers={"User-Agent": user_agent}
+    )
+    try:
+        with urllib.request.urlopen(
+            request, timeout=ROBOTS_TIMEOUT_SECONDS
+        ) as resp:
+            parser.parse(resp.read().decode("utf-8", "replace").splitlines())
+    except Exception:
+        return None
+    return parser
+
+
+class DomainRateLimiter:
+    """Token-bucket limiter keyed by the URL's host.
+
+    Each domain gets its own bucket. When ``respect_robots`` is set, a
+    ``Crawl-delay`` in the domain's robots.txt lowers that domain's rate;
+    robots.txt is fetched through ``run_in_background`` (a thread by
+    default) so the consumer is never blocked on it, and the domain runs at
+    the default rate until it arrives. The limiter is shared by all worker
+    threads of a process; deferral goes through the broker so throttled URLs
+    never tie up a worker.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 3.0,
+        respect_robots: bool = True,
+        user_agent: str = DEFAULT_USER_AGENT,
+        robots_loader: RobotsLoader = _load_robots,
+        clock: Callable[[], float] = time.monotonic,
+        run_in_background: Callable[[Callable[[], None]], None] = _in_thread,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.respect_robots = respect_robots
+        self.user_agent = user_agent
+        self._robots_loader = robots_loader
+        self._clock = clock
+        self._run_in_background = run_in_background
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._robots_checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "DomainRateLimiter":
+        return cls(
+            rate=float(os.getenv(RATE_ENV_VAR, "1.0")),
+            burst=float(os.getenv(BURST_ENV_VAR, "3")),
+            respect_robots=os.getenv(ROBOTS_ENV_VAR, "true").lower() == "true",
+            user_agent=os.getenv(USER_AGENT_ENV_VAR, DEFAULT_USER_AGENT),
+        )
+
+    def _bucket(self, domain: str) -> Tuple[TokenBucket, bool]:
+        with self._lock:
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst, clock=self._clock)
+                self._buckets[domain] = bucket
+            checked = self._robots_checked.get(domain)
+            stale = self.respect_robots and (
+                checked is None or self._clock() - checked > ROBOTS_TTL_SECONDS
+            )
+            if stale:
+                self._robots_checked[domain] = self._clock()
+            return bucket, stale
+
+    def _apply_crawl_delay(self, domain: str, bucket: TokenBucket) -> None:
+        parser = self._robots_loader(domain, self.user_agent)
+        delay = parser.crawl_delay(self.user_agent) if parser else None
+        if delay:
+            bucket.set_rate(min(self.rate, 1.0 / float(delay)), capacity=1.0)
+        else:
+            bucket.set_rate(self.rate, capacity=self.burst)
+
+    def delay_for(self, url: str, not_before: Optional[float] = None) -> float:
+        """Reserve a fetch slot for ``url``.
+
+        Returns ``0.0`` if the URL may be fetched now, otherwise the number of
+        seconds until its reserved slot. A URL that already holds a slot
+        (``not_before``, from :data:`NOT_BEFORE_HEADER`) waits for it without
+        taking another, so each deferred URL is counted once.
+        """
+        if not_before is not None:
+            return max(0.0, float(not_before) - time.time())
+        domain = _domain(url)
+        if not domain:
+            return 0.0
+        bucket, refresh_robots = self._bucket(domain)
+        if refresh_robots:
+            self._run_in_background(
+                lambda: self._apply_crawl_delay(domain, bucket)
+            )
+        return bucket.reserve()
+
+
+def _defer_queue(seconds: int) -> str:
+    return f"{QUEUE_INPUT}.deferred.{seconds}s"
+
+
+def declare_defer_queues(channel) -> None:
+    """Declare the holding queues used by :func:`defer_url`."""
+    for seconds in DEFER_BUCKETS:
+        channel.queue_declare(
+            queue=_defer_queue(seconds),
+            durable=True,
+            arguments={
+                "x-message-ttl": seconds * 1000,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": QUEUE_INPUT,
+            },
+        )
+
+
+def defer_url(channel, url: str, delay: float, properties=None) -> None:
+    """Park ``url`` in a holding queue until ``delay`` seconds have passed.
+
+    The time its slot comes due travels in :data:`NOT_BEFORE_HEADER`; waits
+    longer than the largest bucket go round again until then.
+    """
+    seconds = next((b for b in DEFER_BUCKETS if b >= delay), DEFER_BUCKETS[-1])
+    headers = dict(getattr(properties, "headers", None) or {})
+    headers.setdefault(NOT_BEFORE_HEADER, time.time() + delay)
+    timestamp = getattr(properties, "timestamp", None)
+    channel.basic_publish(
+        exchange="",
+        routing_key=_defer_queue(seconds),
+        body=url.encode(),
+        properties=pika.BasicProperties(
+            delivery_mode=2, headers=headers, timestamp=timestamp
+        ),
+    )
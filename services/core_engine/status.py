@@ -0,0 +1,97 @@
+"""Article lifecycle: PENDING_APPROVAL -> APPROVED -> PUBLISHED, or REJECTED.
+
+Every transition is one conditional ``UPDATE`` that only matches rows in
+an allowed source state (and, optionally, at an expected ``version``), so
+concurrent or repeated attempts need no row locks: exactly one of them
+changes the row and the others see a row count of zero. That makes
+duplicate button clicks and message redeliveries harmless.
+"""
+from typing import Iterable, List, Optional, Sequence
+
+from sqlalchemy import select, update
+
+from services.core_engine.models import Article
+
+PENDING_APPROVAL = "PENDING_APPROVAL"
+APPROVED = "APPROVED"
+REJECTED = "REJECTED"
+PUBLISHED = "PUBLISHED"
+
+# Allowed moves. APPROVED -> PENDING_APPROVAL undoes an approval that
+# could not be forwarded.
+TRANSITIONS = {
+    PENDING_APPROVAL: (APPROVED, REJECTED),
+    APPROVED: (PUBLISHED, PENDING_APPROVAL),
+    REJECTED: (),
+    PUBLISHED: (),
+}
+
+
+def sources_for(target: str) -> List[str]:
+    """States an article may move to ``target`` from."""
+    sources = [
+        state for state, targets in TRANSITIONS.items() if target in targets
+    ]
+    if not sources:
+        raise ValueError(f"No transition leads to {target}")
+    return sources
+
+
+def transition(
+    db,
+    article_id: int,
+    target: str,
+    expected_version: Optional[int] = None,
+    sources: Optional[Sequence[str]] = None,
+) -> bool:
+    """Move one article to ``target`` and return whether it moved.
+
+    With ``expected_version`` the update also fails if the row changed
+    since it was read. ``sources`` replaces the states allowed by
+    ``TRANSITIONS``, for the publisher's moves outside the admin workflow:
+    releasing an article no destination accepted and publishing legacy
+    approvals.
+    """
+    allowed = sources_for(target) if sources is None else list(sources)
+    conditions = [Article.id == article_id, Article.status.in_(allowed)]
+    if expected_version is not None:
+        conditions.append(Article.version == expected_version)
+    result = db.execute(
+        update(Article)
+        .where(*conditions)
+        .values(status=target, version=Article.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def transition_many(
+    db,
+    article_ids: Iterable[int],
+    target: str,
+    sources: Optional[Sequence[str]] = None,
+) -> List[int]:
+    """Move each article to ``target`` and return the ids that moved."""
+    return [
+        article_id
+        for article_id in article_ids
+        if transition(db, article_id, target, sources=sources)
+    ]
+
+
+def pending(db, limit: int = 50, after_id: int = 0) -> List[Article]:
+    """Articles awaiting approval, oldest first, ``limit`` at a time.
+
+    Pages continue after the last id seen, which the ``(status, id)`` index
+    serves without scanning earlier rows.
+    """
+    return (
+        db.execute(
+            select(Article)
+            .where(Article.status == PENDING_APPROVAL, Article.id > after_id)
+            .order_by(Article.id)
+            .limit(limit)
+        )
+        .scalars()
+        .all()
+    )
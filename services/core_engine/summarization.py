@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+TOKEN_BUDGET_ENV_VAR = "SUMMARY_CHUNK_TOKENS"
+CONCURRENCY_ENV_VAR = "SUMMARY_CONCURRENCY"
+
+# Rough average for English text; good enough to stay under the model limit.
+CHARS_PER_TOKEN = 4
+MAX_REDUCE_ROUNDS = 3
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n|\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?؟。])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _pack(pieces: List[str], budget: int, sep: str) -> List[str]:
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for piece in pieces:
+        cost = estimate_tokens(piece)
+        if current and size + cost > budget:
+            chunks.append(sep.join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += cost
+    if current:
+        chunks.append(sep.join(current))
+    return chunks
+
+
+def split_text(text: str, budget: int) -> List[str]:
+    """Split ``text`` into chunks of at most ``budget`` estimated tokens.
+
+    Paragraph boundaries are preferred, then sentence boundaries; a single
+    sentence longer than the budget is cut at a character offset.
+    """
+    if estimate_tokens(text) <= budget:
+        return [text]
+    pieces: List[str] = []
+    paragraphs = (p.strip() for p in _PARAGRAPH_RE.split(text))
+    for paragraph in filter(None, paragraphs):
+        if estimate_tokens(paragraph) <= budget:
+            pieces.append(paragraph)
+            continue
+        sentences = []
+        for sentence in _SENTENCE_RE.split(paragraph):
+            step = budget * CHARS_PER_TOKEN
+            sentences.extend(
+                sentence[i:i + step] for i in range(0, len(sentence), step)
+            )
+        pieces.extend(_pack(sentences, budget, " "))
+    return _pack(pieces, budget, "\n\n")
+
+
+class SummaryResult(NamedTuple):
+    text: str
+    tokens: int
+    chunks: int
+
+
+class ChunkedSummarizer:
+    """Map-reduce wrapper around a text generation model.
+
+    Exposes the same ``predict(text)`` call as the wrapped model. Text that
+    fits in ``token_budget`` goes to the model in one call; longer text is
+    split, the chunks are summarized concurrently and the partial summaries
+    are summarized again until they fit.
+    """
+
+    def __init__(
+        self, model, token_budget: int = 6000, concurrency: int = 4
+    ) -> None:
+        self.model = model
+        self.token_budget = token_budget
+        self.concurrency = concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, model) -> "ChunkedSummarizer":
+        return cls(
+            model,
+            token_budget=int(os.getenv(TOKEN_BUDGET_ENV_VAR, "6000")),
+            concurrency=int(os.getenv(CONCURRENCY_ENV_VAR, "4")),
+        )
+
+    def _predict(self, text: str) -> str:
+        result = self.model.predict(text)
+        return getattr(result, "text", str(result))
+
+    def _map(self, chunks: List[str]) -> List[str]:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency,
+                    thread_name_prefix="summarize",
+                )
+        return list(self._executor.map(self._predict, chunks))
+
+    def predict(self, text: str) -> SummaryResult:
+        tokens = estimate_tokens(text)
+        chunks = split_text(text, self.token_budget)
+        if len(chunks) == 1:
+            return SummaryResult(self._predict(text), tokens, 1)
+        combined = "\n\n".join(self._map(chunks))
+        for _ in range(MAX_REDUCE_ROUNDS):
+            parts = split_text(combined, self.token_budget)
+            if len(parts) == 1:
+                break
+            combined = "\n\n".join(self._map(parts))
+        return SummaryResult(self._predict(combined), tokens, len(chunks))
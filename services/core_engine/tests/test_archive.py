@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from services.core_engine import archive
+from services.core_engine.models import Article, Base
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def Session(monkeypatch, sqlite_db):
+    sqlite_db.create_all(Base.metadata)
+    Session = sqlite_db.Session
+    monkeypatch.setattr(archive, "session_scope", sqlite_db.session_scope)
+    rows = [
+        (1, "PUBLISHED", datetime(2026, 1, 5)),
+        (2, "REJECTED", datetime(2026, 1, 20)),
+        (3, "PENDING_APPROVAL", datetime(2026, 1, 21)),
+        (4, "PUBLISHED", datetime(2026, 2, 3)),
+        (5, "PUBLISHED", datetime(2026, 6, 1)),
+    ]
+    with Session() as session:
+        session.add_all(
+            Article(
+                id=i,
+                source_url=f"http://e.com/{i}",
+                content=f"content {i}",
+                summary=f"summary {i}",
+                status=state,
+                created_at=created,
+            )
+            for i, state, created in rows
+        )
+        session.commit()
+    return Session
+
+
+def test_archive_moves_finished_months_and_reads_fall_back(Session, tmp_path):
+    store = archive.Archive(str(tmp_path))
+
+    done = archive.archive_older_than(
+        store, timedelta(days=90), batch_size=1, now=datetime(2026, 6, 15)
+    )
+
+    assert done == 3
+    with Session() as session:
+        # Unfinished and recent articles stay in the table.
+        query = select(Article.id).order_by(Article.id)
+        assert session.execute(query).scalars().all() == [3, 5]
+    manifest = store.manifest()
+    summary = [
+        (e["month"], e["min_id"], e["max_id"], e["rows"]) for e in manifest
+    ]
+    assert summary == [
+        ("2026-01", 1, 2, 2),
+        ("2026-02", 4, 4, 1),
+    ]
+    assert all(e["file"].endswith(".parquet") for e in manifest)
+
+    with Session() as session:
+        archived = archive.get_article(session, 2, store)
+        assert archived.summary == "summary 2"
+        assert archived.status == "REJECTED"
+        assert archived.created_at == datetime(2026, 1, 20)
+        assert archive.get_article(session, 5, store).content == "content 5"
+        assert archive.get_article(session, 99, store) is None
+        assert archive.get_article(session, 2) is None
+
+
+def test_archive_rerun_rewrites_the_same_file(Session, tmp_path):
+    store = archive.Archive(str(tmp_path))
+    with Session() as reader:
+        january = datetime(2026, 1, 1)
+        store.write(january, archive.stream_month(reader, january, 10))
+
+    # As if the delete never happened: the next run writes the same file.
+    assert archive.archive_month(store, datetime(2026, 1, 1)) == 2
+    assert len(store.manifest()) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "articles-2026-01-1.parquet",
+        "manifest.json",
+    ]
+
+
+def test_concurrent_runs_do_not_share_a_temp_file(Session, tmp_path):
+    store = archive.Archive(str(tmp_path))
+    month = datetime(2026, 1, 1)
+    with Session() as reader:
+        first, second = list(archive.stream_month(reader, month, 1))
+
+    def interleaved():
+        yield first
+        # Another run writes the same month meanwhile.
+        store.write(month, [second])
+
+    assert store.write(month, interleaved()) == [1]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "articles-2026-01-1.parquet",
+        "articles-2026-01-2.parquet",
+        "manifest.json",
+    ]
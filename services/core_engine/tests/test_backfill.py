@@ -0,0 +1,167 @@
+import json
+import types
+from contextlib import contextmanager
+
+import pytest
+
+from services.core_engine import backfill
+from services.core_engine.models import Article, Base
+
+
+@pytest.fixture
+def Session(monkeypatch, sqlite_db):
+    sqlite_db.create_all(Base.metadata)
+    Session = sqlite_db.Session
+    monkeypatch.setattr(backfill, "session_scope", sqlite_db.session_scope)
+    with Session() as session:
+        session.add_all(
+            Article(
+                id=i,
+                source_url=f"http://e.com/{i}",
+                content=f"content {i}",
+                translated_content=f"old translation {i}",
+                summary="old",
+                language="en" if i % 2 else "fr",
+            )
+            for i in range(1, 8)
+        )
+        session.commit()
+    return Session
+
+
+def test_backfill_resummarizes_in_batches_and_checkpoints(Session, tmp_path):
+    summarized = []
+
+    def predict(text):
+        summarized.append(text)
+        return types.SimpleNamespace(text=f"new {text}")
+
+    path = str(tmp_path / "checkpoint.json")
+    job = backfill.Backfill(
+        ["summarize"],
+        summarizer=types.SimpleNamespace(predict=predict),
+        batch_size=2,
+        checkpoint=backfill.Checkpoint(path, ["summarize"]),
+    )
+
+    assert job.run(end_id=5) == 5
+
+    with Session() as session:
+        summaries = dict(session.query(Article.id, Article.summary))
+    assert summaries == {
+        1: "new old translation 1",
+        2: "new old translation 2",
+        3: "new old translation 3",
+        4: "new old translation 4",
+        5: "new old translation 5",
+        6: "old",
+        7: "old",
+    }
+    with open(path) as fh:
+        assert json.load(fh) == {"stages": ["summarize"], "last_id": 5}
+
+    # A second run resumes after the checkpoint.
+    summarized.clear()
+    assert job.run() == 2
+    assert summarized == ["old translation 6", "old translation 7"]
+
+
+def test_backfill_translates_only_foreign_articles_in_one_call(Session):
+    calls = []
+
+    def translate(texts, target_language):
+        calls.append(list(texts))
+        return [{"translatedText": text.upper()} for text in texts]
+
+    job = backfill.Backfill(
+        ["summarize", "translate"],
+        translator=types.SimpleNamespace(translate=translate),
+        summarizer=types.SimpleNamespace(predict=lambda text: f"sum {text}"),
+        batch_size=10,
+    )
+
+    assert job.run(start_id=2, end_id=4) == 3
+
+    assert calls == [["content 2", "content 4"]]
+    with Session() as session:
+        rows = {
+            row.id: (row.translated_content, row.summary)
+            for row in session.query(Article).filter(Article.id.between(1, 4))
+        }
+    assert rows == {
+        1: ("old translation 1", "old"),
+        2: ("CONTENT 2", "sum CONTENT 2"),
+        3: ("content 3", "sum content 3"),
+        4: ("CONTENT 4", "sum CONTENT 4"),
+    }
+
+
+def test_backfill_splits_translate_calls_by_segments_and_characters(Session):
+    calls = []
+
+    def translate(texts, target_language):
+        calls.append(list(texts))
+        return [{"translatedText": text.upper()} for text in texts]
+
+    with Session() as session:
+        session.get(Article, 6).content = "x" * 30
+        session.commit()
+    job = backfill.Backfill(
+        ["translate"],
+        translator=types.SimpleNamespace(translate=translate),
+        translate_segments=2,
+        translate_chars=20,
+    )
+
+    assert job.run() == 7
+
+    # Articles 2, 4 and 6 are French; 6 is over the character limit alone.
+    assert calls == [["content 2", "content 4"], ["x" * 30]]
+    batches = backfill.request_batches
+    assert list(batches(["a", "b", "c"], 2, 100)) == [["a", "b"], ["c"]]
+    assert list(batches(["aaa", "bb", "c"], 5, 4)) == [["aaa"], ["bb", "c"]]
+
+
+def test_backfill_holds_no_connection_while_processing(
+    Session, sqlite_db, monkeypatch
+):
+    open_sessions = []
+
+    @contextmanager
+    def tracked_session_scope():
+        open_sessions.append(1)
+        try:
+            with sqlite_db.session_scope() as session:
+                yield session
+        finally:
+            open_sessions.pop()
+
+    monkeypatch.setattr(backfill, "session_scope", tracked_session_scope)
+    held = []
+
+    def predict(text):
+        # The model calls are slow; no reader may stay open across them.
+        held.append(len(open_sessions))
+        return f"new {text}"
+
+    job = backfill.Backfill(
+        ["summarize"],
+        summarizer=types.SimpleNamespace(predict=predict),
+        batch_size=3,
+    )
+
+    assert job.run() == 7
+    assert held == [0] * 7
+
+
+def test_checkpoint_for_other_stages_is_ignored(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    backfill.Checkpoint(path, ["translate"]).save(10)
+
+    assert backfill.Checkpoint(path, ["translate"]).load() == 10
+    assert backfill.Checkpoint(path, ["summarize"]).load() is None
+
+
+def test_unknown_stage_is_rejected():
+    with pytest.raises(ValueError):
+        backfill.Backfill(["extract"])
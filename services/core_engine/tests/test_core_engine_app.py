@@ -1,14 +1,10 @@
 import sys
 import types
-from contextlib import contextmanager
-
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from common_utils import configure_logging
 
 
-def test_process_url_persists_article(monkeypatch):
+def test_process_url_persists_article(monkeypatch, sqlite_db):
     translate_stub = types.SimpleNamespace(
         Client=lambda: types.SimpleNamespace(
             translate=lambda text, target_language: {"translatedText": "translated"}
@@ -47,20 +43,8 @@ def test_process_url_persists_article(monkeypatch):
     import services.core_engine.app as core_app
     from services.core_engine.models import Article
 
-    engine = create_engine("sqlite:///:memory:")
-    core_app.init_db(engine)
-    Session = sessionmaker(bind=engine)
-
-    @contextmanager
-    def fake_session_scope():
-        session = Session()
-        try:
-            yield session
-            session.commit()
-        finally:
-            session.close()
-
-    monkeypatch.setattr(core_app, "session_scope", fake_session_scope)
+    core_app.init_db(sqlite_db.engine)
+    monkeypatch.setattr(core_app, "session_scope", sqlite_db.session_scope)
 
     translator = translate_stub.Client()
     summarizer = text_gen_module.TextGenerationModel.from_pretrained("text-bison")
@@ -68,7 +52,7 @@ def test_process_url_persists_article(monkeypatch):
 
     core_app.process_url("http://example.com", translator, summarizer, logger)
 
-    with fake_session_scope() as session:
+    with sqlite_db.session_scope() as session:
         articles = session.query(Article).all()
         assert len(articles) == 1
         article = articles[0]
@@ -77,4 +61,15 @@ def test_process_url_persists_article(monkeypatch):
         assert article.translated_content == "translated"
         assert article.summary == "summary"
         assert article.status == "PENDING_APPROVAL"
-        
\ No newline at end of file
+        
+    # The same URL stored again, e.g. by a worker that raced this one, is
+    # rolled back by the processed-message ledger.
+    from common_utils.idempotency import ProcessedMessage
+
+    again = core_app.process_url(
+        "http://example.com", translator, summarizer, logger
+    )
+    assert again is None
+    with sqlite_db.session_scope() as session:
+        assert session.query(Article).count() == 1
+        assert session.query(ProcessedMessage).count() == 1
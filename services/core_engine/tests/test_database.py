@@ -1,8 +1,11 @@
 import pytest
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine.reflection import Inspector
 from sqlalchemy.exc import ArgumentError
+from sqlalchemy.orm import Session
 
-from services.core_engine.database import init_db
+from services.core_engine.database import ensure_indexes, init_db
+from services.core_engine.models import Article
 from common_utils import db
 
 
@@ -23,3 +26,84 @@ def test_init_db_invalid_db_url(monkeypatch):
 
     with pytest.raises(ArgumentError, match="Could not parse SQLAlchemy URL"):
         init_db(retries=1)
+
+
+def test_init_db_adds_columns_missing_from_an_existing_table():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        # The articles table as the first release created it.
+        conn.execute(
+            text(
+                "CREATE TABLE articles (id INTEGER PRIMARY KEY,"
+                " source_url VARCHAR(500) NOT NULL, content TEXT NOT NULL,"
+                " translated_content TEXT, summary TEXT,"
+                " status VARCHAR(50) NOT NULL, created_at DATETIME NOT NULL)"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO articles"
+                " (source_url, content, status, created_at) VALUES"
+                " ('http://e.com', 'body', 'PENDING_APPROVAL', '2024-01-01')"
+            )
+        )
+
+    init_db(engine=engine)
+    init_db(engine=engine)
+
+    columns = {
+        column["name"] for column in inspect(engine).get_columns("articles")
+    }
+    assert {"language", "priority", "traceparent", "version"} <= columns
+    # Indexes are left to the migration.
+    indexes = {
+        index["name"] for index in inspect(engine).get_indexes("articles")
+    }
+    assert "ix_articles_status_id" not in indexes
+    ensure_indexes(engine)
+    ensure_indexes(engine)
+    indexes = {
+        index["name"] for index in inspect(engine).get_indexes("articles")
+    }
+    assert "ix_articles_status_id" in indexes
+    with Session(engine) as session:
+        article = session.query(Article).one()
+        assert article.language is None
+        assert article.traceparent is None
+        assert article.priority == "normal"
+        assert article.version == 0
+
+
+def test_ensure_indexes_tolerates_an_index_created_concurrently(monkeypatch):
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE articles "
+                "(id INTEGER PRIMARY KEY, status VARCHAR(50))"
+            )
+        )
+    init_db(engine=engine)
+    real_get_indexes = Inspector.get_indexes
+    raced = []
+
+    def stale_get_indexes(self, table_name, **kw):
+        # The first look misses the index another replica is about to create.
+        if table_name == "articles" and not raced:
+            raced.append(table_name)
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "CREATE INDEX ix_articles_status_id "
+                        "ON articles (status, id)"
+                    )
+                )
+            return []
+        return real_get_indexes(self, table_name, **kw)
+
+    monkeypatch.setattr(Inspector, "get_indexes", stale_get_indexes)
+    ensure_indexes(engine)
+
+    found = real_get_indexes(inspect(engine), "articles")
+    indexes = {index["name"] for index in found}
+    assert {"ix_articles_status_id", "ix_articles_created_at"} <= indexes
@@ -0,0 +1,32 @@
+import time
+
+from services.core_engine.extraction import ExtractionPool
+
+
+def decode(html):
+    return html.decode()
+
+
+def slow(html):
+    time.sleep(5)
+    return "never"
+
+
+def test_extract_runs_in_worker_process():
+    pool = ExtractionPool(
+        workers=1, timeout=5, mp_context="spawn", func=decode, preload=()
+    )
+    try:
+        assert pool.extract(b"<p>hello</p>") == "<p>hello</p>"
+    finally:
+        pool.shutdown()
+
+
+def test_extract_times_out_pathological_documents():
+    pool = ExtractionPool(
+        workers=1, timeout=0.2, mp_context="spawn", func=slow, preload=()
+    )
+    try:
+        assert pool.extract(b"<p>slow</p>") is None
+    finally:
+        pool.shutdown()
@@ -0,0 +1,81 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+from services.core_engine.http_client import ArticleFetcher, DnsCache
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/drip":
+            self.send_response(200)
+            self.send_header("Content-Length", "1000")
+            self.end_headers()
+            try:
+                for _ in range(1000):
+                    self.wfile.write(b"x")
+                    self.wfile.flush()
+                    time.sleep(0.01)
+            except OSError:
+                pass
+            return
+        body = b"x" * (2048 if self.path == "/big" else 16)
+        status = 404 if self.path == "/missing" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_returns_body_and_enforces_limits(server):
+    fetcher = ArticleFetcher(max_bytes=1024, timeout=5)
+    assert fetcher.fetch(f"{server}/ok") == b"x" * 16
+    assert fetcher.fetch(f"{server}/big") is None
+    assert fetcher.fetch(f"{server}/missing") is None
+    # Subsequent requests reuse the same per-host pool.
+    assert fetcher.fetch(f"{server}/ok") == b"x" * 16
+    assert len(fetcher._pool.pools) == 1
+
+
+def test_fetch_deadline_holds_against_a_slow_drip(server):
+    fetcher = ArticleFetcher(timeout=0.3)
+    started = time.monotonic()
+    assert fetcher.fetch(f"{server}/drip") is None
+    # Each byte arrives well within the socket timeout; only the total
+    # deadline stops the read, long before the body would be complete.
+    assert time.monotonic() - started < 2
+    assert fetcher.fetch(f"{server}/ok") == b"x" * 16
+
+
+def test_dns_cache_reuses_lookups():
+    calls = []
+
+    def resolver(host, port, family, type_):
+        calls.append(host)
+        return [(None, None, None, None, ("10.0.0.1", port))]
+
+    now = [0.0]
+    cache = DnsCache(ttl=60, resolver=resolver, clock=lambda: now[0])
+    assert cache.resolve("example.com", 80) == "10.0.0.1"
+    assert cache.resolve("example.com", 80) == "10.0.0.1"
+    assert calls == ["example.com"]
+    now[0] = 61
+    cache.resolve("example.com", 80)
+    assert calls == ["example.com", "example.com"]
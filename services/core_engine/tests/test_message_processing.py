@@ -1,61 +1,77 @@
+import json
 import sys
 import types
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from common_utils import configure_logging, metrics
 
-from common_utils import configure_logging
 
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
 
-def test_message_callback_processes_and_acks(monkeypatch):
+
+def test_message_callback_processes_and_acks(monkeypatch, sqlite_db):
     import services.core_engine.app as core_app
     from services.core_engine.models import Article
 
     translator = types.SimpleNamespace(translate=lambda text, target_language: {"translatedText": "translated"})
-    summarizer = types.SimpleNamespace(predict=lambda text: types.SimpleNamespace(text="summary"))
+    summarizer = types.SimpleNamespace(
+        predict=lambda text: types.SimpleNamespace(text="summary")
+    )
     trafilatura_stub = types.SimpleNamespace(fetch_url=lambda url: "html", extract=lambda html: "content")
     monkeypatch.setitem(sys.modules, "trafilatura", trafilatura_stub)
     monkeypatch.setattr(core_app, "trafilatura", trafilatura_stub)
     monkeypatch.setattr(core_app, "summarizer", summarizer)
     monkeypatch.setattr(core_app, "translate", types.SimpleNamespace(Client=lambda: translator))
-
-    engine = create_engine("sqlite:///:memory:")
-    core_app.init_db(engine)
+    monkeypatch.setenv("FETCH_RESPECT_ROBOTS", "false")
+    monkeypatch.setenv("METRICS_PORT", "0")
+    monkeypatch.setattr(
+        core_app,
+        "ExtractionPool",
+        types.SimpleNamespace(
+            from_env=lambda: types.SimpleNamespace(
+                extract=None, shutdown=lambda: None
+            )
+        ),
+    )
+
+    core_app.init_db(sqlite_db.engine)
     monkeypatch.setattr(core_app, "init_db", lambda: None)
-    Session = sessionmaker(bind=engine)
-
-    @contextmanager
-    def fake_session_scope():
-        session = Session()
-        try:
-            yield session
-            session.commit()
-        finally:
-            session.close()
-
-    monkeypatch.setattr(core_app, "session_scope", fake_session_scope)
+    Session = sqlite_db.Session
+    monkeypatch.setattr(core_app, "session_scope", sqlite_db.session_scope)
 
     calls = []
     real_process_url = core_app.process_url
 
-    def spy_process_url(url, translator_, summarizer_, logger_):
+    def spy_process_url(url, translator_, summarizer_, logger_, **kwargs):
         calls.append(url)
-        return real_process_url(url, translator_, summarizer_, logger_)
+        return real_process_url(
+            url, translator_, summarizer_, logger_, priority=kwargs["priority"]
+        )
 
     monkeypatch.setattr(core_app, "process_url", spy_process_url)
 
     class DummyChannel:
-        def queue_declare(self, queue, durable):
+        is_closed = False
+
+        def queue_declare(
+            self, queue, durable=False, arguments=None, passive=False
+        ):
+            return types.SimpleNamespace(
+                method=types.SimpleNamespace(message_count=3)
+            )
+
+        def basic_qos(self, prefetch_count):
+            pass
+
+        def confirm_delivery(self):
             pass
 
         def basic_consume(self, queue, on_message_callback):
-            self.callback = on_message_callback
+            self.callbacks[queue] = on_message_callback
 
-        def start_consuming(self):
-            body = b"http://example.com"
-            method = types.SimpleNamespace(delivery_tag=1)
-            self.callback(self, method, None, body)
+        def basic_publish(self, exchange, routing_key, body, properties=None):
+            self.published = (routing_key, json.loads(body))
+            self.published_headers = properties.headers
 
         def basic_ack(self, delivery_tag):
             with Session() as session:
@@ -66,11 +82,37 @@ def test_message_callback_processes_and_acks(monkeypatch):
             pass
 
     channel = DummyChannel()
+    channel.callbacks = {}
 
     class DummyConnection:
+        is_open = True
+
+        def __init__(self):
+            self.due = []
+
         def channel(self):
             return channel
 
+        def process_data_events(self, time_limit):
+            while self.due:
+                self.due.pop(0)()
+            if self.is_open and not getattr(channel, "ack_called", False):
+                body = b"http://example.com"
+                method = types.SimpleNamespace(delivery_tag=1)
+                headers = {"traceparent": TRACEPARENT, "priority": "high"}
+                properties = types.SimpleNamespace(
+                    headers=headers, timestamp=None
+                )
+                callback = channel.callbacks["url.new.high"]
+                callback(channel, method, properties, body)
+            else:
+                self.is_open = False
+
+        def call_later(self, delay, callback):
+            # Only immediate callbacks run; periodic ones would never end.
+            if delay == 0:
+                self.due.append(callback)
+
         def close(self):
             pass
 
@@ -81,8 +123,33 @@ def test_message_callback_processes_and_acks(monkeypatch):
 
     core_app.main()
 
+    status, _, body = metrics.ROUTES["/lag"]()
+    assert status == 200
+    assert json.loads(body)["queues"] == {
+        "url.new": 3,
+        "url.new.high": 3,
+        "url.new.low": 3,
+    }
+
     assert calls == ["http://example.com"]
     assert getattr(channel, "ack_called", False)
+    assert channel.published == (
+        "article.processed",
+        {"id": 1, "summary": "summary", "source_url": "http://example.com"},
+    )
+    # The crawler's trace continues through the article and the next queue.
+    trace_id = TRACEPARENT.split("-")[1]
+    assert channel.published_headers["traceparent"].split("-")[1] == trace_id
+    assert channel.published_headers["priority"] == "high"
+    # Sent through the outbox, which the relay emptied.
+    from common_utils.outbox import OutboxEvent
+
+    with Session() as session:
+        assert session.query(OutboxEvent).count() == 0
+    with Session() as session:
+        article = session.query(Article).one()
+        assert article.traceparent.split("-")[1] == trace_id
+        assert article.priority == "high"
 
 
 def test_process_url_logs_warning_when_fetch_none(monkeypatch):
@@ -92,7 +159,9 @@ def test_process_url_logs_warning_when_fetch_none(monkeypatch):
     monkeypatch.setattr(core_app, "trafilatura", trafilatura_stub)
 
     translator = types.SimpleNamespace(translate=lambda text, target_language: {"translatedText": "translated"})
-    summarizer = types.SimpleNamespace(predict=lambda text: types.SimpleNamespace(text="summary"))
+    summarizer = types.SimpleNamespace(
+        predict=lambda text: types.SimpleNamespace(text="summary")
+    )
 
     warnings = []
     logger = types.SimpleNamespace(warning=lambda msg, extra=None: warnings.append((msg, extra)))
@@ -106,3 +175,68 @@ def test_process_url_logs_warning_when_fetch_none(monkeypatch):
     core_app.process_url("http://example.com", translator, summarizer, logger)
 
     assert warnings and warnings[0][0] == "Failed to download URL"
+
+
+def test_process_url_skips_translation_for_target_language(
+    monkeypatch, sqlite_db
+):
+    import services.core_engine.app as core_app
+    from services.core_engine.models import Article
+
+    english = (
+        "The council voted on Tuesday to approve the new budget, which the "
+        "mayor said would pay for more teachers and repairs to the city's "
+        "roads."
+    )
+    french = (
+        "Le conseil a voté mardi pour approuver le nouveau budget de la ville."
+    )
+    pages = {"http://en.example": english, "http://fr.example": french}
+    translated = []
+
+    def translate(text, target_language):
+        translated.append(text)
+        return {"translatedText": "translated"}
+
+    translator = types.SimpleNamespace(translate=translate)
+    summarizer = types.SimpleNamespace(
+        predict=lambda text: types.SimpleNamespace(text="summary")
+    )
+
+    core_app.init_db(sqlite_db.engine)
+    Session = sqlite_db.Session
+    monkeypatch.setattr(core_app, "session_scope", sqlite_db.session_scope)
+    logger = configure_logging()
+    for url in pages:
+        core_app.process_url(
+            url,
+            translator,
+            summarizer,
+            logger,
+            fetch=pages.get,
+            extract=lambda html: html,
+        )
+    core_app.process_url(
+        "http://hinted.example",
+        translator,
+        summarizer,
+        logger,
+        fetch=lambda url: "short",
+        extract=lambda html: html,
+        language_hint="en-US",
+    )
+
+    assert translated == [french]
+    with Session() as session:
+        languages = {a.source_url: a.language for a in session.query(Article)}
+        english_article = (
+            session.query(Article)
+            .filter_by(source_url="http://en.example")
+            .one()
+        )
+        assert english_article.translated_content == english
+    assert languages == {
+        "http://en.example": "en",
+        "http://fr.example": "fr",
+        "http://hinted.example": "en",
+    }
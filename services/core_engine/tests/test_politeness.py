@@ -0,0 +1,98 @@
+import types
+from urllib.robotparser import RobotFileParser
+
+from common_utils.ratelimit import TokenBucket
+from services.core_engine import politeness
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_reports_wait_time():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=1, clock=clock)
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == 0.5
+    clock.now = 0.5
+    assert bucket.try_acquire() == 0.0
+
+
+def test_token_bucket_reservations_get_successive_slots():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=1, clock=clock)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.5, 1.0, 1.5]
+    clock.now = 1.0
+    assert bucket.reserve() == 1.0
+
+
+def test_limiter_is_per_domain():
+    clock = FakeClock()
+    limiter = politeness.DomainRateLimiter(
+        rate=1, burst=1, respect_robots=False, clock=clock
+    )
+    assert limiter.delay_for("http://a.example/1") == 0.0
+    assert limiter.delay_for("http://a.example/2") > 0
+    assert limiter.delay_for("http://b.example/1") == 0.0
+
+
+def test_limiter_honors_crawl_delay():
+    robots = RobotFileParser()
+    robots.parse(["User-agent: *", "Crawl-delay: 10"])
+    clock = FakeClock()
+    limiter = politeness.DomainRateLimiter(
+        rate=5,
+        burst=5,
+        robots_loader=lambda domain, ua: robots,
+        clock=clock,
+        run_in_background=lambda fn: fn(),
+    )
+    assert limiter.delay_for("http://slow.example/a") == 0.0
+    assert limiter.delay_for("http://slow.example/b") == 10.0
+
+
+def test_limiter_fetches_robots_in_background_and_honors_reservations(
+    monkeypatch,
+):
+    pending = []
+    clock = FakeClock()
+    limiter = politeness.DomainRateLimiter(
+        rate=1, burst=1, clock=clock, run_in_background=pending.append
+    )
+    # robots.txt has not been fetched yet; the consumer is not kept waiting.
+    delays = [limiter.delay_for(f"http://a.example/{i}") for i in range(3)]
+    assert delays == [0.0, 1.0, 2.0]
+    assert len(pending) == 1
+
+    monkeypatch.setattr(politeness.time, "time", lambda: 100.0)
+    assert limiter.delay_for("http://a.example/1", not_before=102.5) == 2.5
+    assert limiter.delay_for("http://a.example/1", not_before=99.0) == 0.0
+    # Neither took another slot.
+    assert limiter.delay_for("http://a.example/4") == 3.0
+
+
+def test_defer_url_picks_smallest_covering_bucket():
+    published = []
+    channel = types.SimpleNamespace(
+        basic_publish=lambda **kwargs: published.append(kwargs)
+    )
+    properties = types.SimpleNamespace(headers={"language": "en"})
+    politeness.defer_url(channel, "http://a.example/1", 3.2, properties)
+    politeness.defer_url(channel, "http://a.example/2", 999, None)
+
+    assert published[0]["routing_key"] == "url.new.deferred.5s"
+    assert published[0]["body"] == b"http://a.example/1"
+    headers = published[0]["properties"].headers
+    assert headers["language"] == "en"
+    assert headers[politeness.NOT_BEFORE_HEADER] > 0
+    assert published[1]["routing_key"] == "url.new.deferred.120s"
+    # Re-deferring keeps the slot already reserved.
+    again = types.SimpleNamespace(headers=headers)
+    politeness.defer_url(channel, "http://a.example/1", 1, again)
+    not_before = politeness.NOT_BEFORE_HEADER
+    resent = published[2]["properties"].headers
+    assert resent[not_before] == headers[not_before]
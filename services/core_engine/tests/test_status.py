@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.core_engine import status
+from services.core_engine.models import Article, Base
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        Article(source_url=f"http://e.com/{i}", content="c") for i in range(4)
+    )
+    session.commit()
+    yield session
+    session.close()
+
+
+def states(db):
+    return dict(db.query(Article.id, Article.status))
+
+
+def test_transitions_follow_the_lifecycle(db):
+    assert status.transition(db, 1, status.APPROVED)
+    assert not status.transition(db, 1, status.APPROVED)
+    assert not status.transition(db, 1, status.REJECTED)
+    assert not status.transition(db, 2, status.PUBLISHED)
+    assert status.transition(db, 1, status.PUBLISHED)
+    assert not status.transition(db, 1, status.PUBLISHED)
+    assert status.transition(db, 2, status.REJECTED)
+    db.commit()
+
+    assert states(db) == {
+        1: status.PUBLISHED,
+        2: status.REJECTED,
+        3: status.PENDING_APPROVAL,
+        4: status.PENDING_APPROVAL,
+    }
+    assert db.get(Article, 1).version == 2
+
+
+def test_transition_checks_expected_version(db):
+    assert not status.transition(db, 3, status.APPROVED, expected_version=1)
+    assert status.transition(db, 3, status.APPROVED, expected_version=0)
+    assert status.transition_many(db, [3, 4], status.APPROVED) == [4]
+
+
+def test_pending_pages_by_id(db):
+    status.transition(db, 2, status.REJECTED)
+
+    first = status.pending(db, limit=2)
+    assert [article.id for article in first] == [1, 3]
+    rest = status.pending(db, limit=2, after_id=3)
+    assert [article.id for article in rest] == [4]
+
+
+def test_unknown_target_is_rejected(db):
+    with pytest.raises(ValueError):
+        status.transition(db, 1, status.PENDING_APPROVAL + "X")
+
+
+def test_transition_accepts_explicit_sources(db):
+    assert status.transition(db, 1, status.APPROVED)
+    assert status.transition(db, 1, status.PUBLISHED)
+    # Not an admin move, so only with explicit sources.
+    assert not status.transition(db, 1, status.APPROVED)
+    assert status.transition(
+        db, 1, status.APPROVED, sources=[status.PUBLISHED]
+    )
+    assert status.transition_many(
+        db,
+        [2, 3],
+        status.PUBLISHED,
+        sources=[status.APPROVED, status.PENDING_APPROVAL],
+    ) == [2, 3]
+    db.commit()
+
+    assert states(db)[1] == status.APPROVED
+    assert states(db)[2] == status.PUBLISHED
@@ -0,0 +1,54 @@
+import threading
+import types
+
+from services.core_engine.summarization import (
+    ChunkedSummarizer,
+    estimate_tokens,
+    split_text,
+)
+
+
+def test_split_text_respects_budget_and_boundaries():
+    paragraphs = ["Sentence one. Sentence two." * 5 for _ in range(6)]
+    text = "\n\n".join(paragraphs)
+    chunks = split_text(text, budget=50)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 50 for c in chunks)
+    squashed = "".join(chunks).replace("\n", "").replace(" ", "")
+    assert squashed == text.replace("\n", "").replace(" ", "")
+
+
+def test_short_text_is_a_single_call():
+    calls = []
+    model = types.SimpleNamespace(
+        predict=lambda text: (
+            calls.append(text) or types.SimpleNamespace(text="short")
+        )
+    )
+    result = ChunkedSummarizer(model, token_budget=100).predict("tiny article")
+    assert result.text == "short"
+    assert result.chunks == 1
+    assert calls == ["tiny article"]
+
+
+def test_long_text_is_mapped_then_reduced():
+    calls = []
+    lock = threading.Lock()
+
+    def predict(text):
+        with lock:
+            calls.append(text)
+        return types.SimpleNamespace(text="s")
+
+    summarizer = ChunkedSummarizer(
+        types.SimpleNamespace(predict=predict), token_budget=20, concurrency=2
+    )
+    text = "\n\n".join("word " * 60 for _ in range(4))
+    result = summarizer.predict(text)
+
+    assert result.text == "s"
+    assert result.chunks == len(split_text(text, 20))
+    assert result.tokens == estimate_tokens(text)
+    # One call per chunk plus the final reduce.
+    assert len(calls) == result.chunks + 1
+    assert calls[-1] == "\n\n".join(["s"] * result.chunks)
@@ -0,0 +1,87 @@
+"""Keep ``destinations.credentials`` encrypted with the newest key.
+
+After a new key is prepended to ``FERNET_KEYS``, re-encrypt the stored
+credentials before dropping the old key::
+
+    python -m services.management_api.credentials
+
+Rows are read and rewritten ``--batch-size`` at a time, each batch in its
+own transaction, and rows already under the newest key are left alone, so
+the command can be stopped and rerun. Credentials stored before encryption
+was introduced are encrypted by the same pass.
+"""
+import argparse
+import logging
+from typing import Optional, Sequence
+
+from sqlalchemy import Text, bindparam, select, type_coerce
+
+from common_utils import configure_logging, get_engine, session_scope
+from common_utils.crypto import FieldCipher, field_cipher, is_plaintext_json
+
+from .database import ensure_text_column
+from .models import Destination
+
+logger = logging.getLogger(__name__)
+
+_table = Destination.__table__
+# The stored token, bypassing EncryptedJSON in both directions.
+_stored = type_coerce(_table.c.credentials, Text)
+_rewrite = (
+    _table.update()
+    .where(_table.c.id == bindparam("row_id"))
+    .values(credentials=bindparam("token", type_=Text))
+)
+
+
+def reencrypt_credentials(
+    cipher: Optional[FieldCipher] = None,
+    batch_size: int = 100,
+) -> int:
+    """Rewrite credentials not under the newest key; return how many."""
+    cipher = cipher or field_cipher()
+    last_id = 0
+    done = 0
+    while True:
+        with session_scope() as db:
+            rows = db.execute(
+                select(_table.c.id, _stored)
+                .where(_table.c.id > last_id)
+                .order_by(_table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return done
+            updates = []
+            for row_id, token in rows:
+                if token is None or cipher.is_current(token):
+                    continue
+                if is_plaintext_json(token):
+                    new = cipher.encrypt(token.encode())
+                else:
+                    new = cipher.rotate(token)
+                updates.append({"row_id": row_id, "token": new})
+            if updates:
+                db.execute(_rewrite, updates)
+        last_id = rows[-1][0]
+        done += len(updates)
+        logger.info(
+            "Re-encrypted credentials",
+            extra={"last_id": last_id, "rows": done},
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    log = configure_logging()
+    ensure_text_column(get_engine())
+    done = reencrypt_credentials(batch_size=args.batch_size)
+    log.info("Credentials re-encrypted", extra={"rows": done})
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
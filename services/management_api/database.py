@@ -1,5 +1,6 @@
 from typing import Generator
 
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import declarative_base
 
 from common_utils import get_engine, get_session
@@ -11,6 +12,29 @@ def init_db() -> None:
     """Create database tables."""
     engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    ensure_text_column(engine)
+
+
+def ensure_text_column(engine) -> None:
+    """Turn a MySQL ``JSON`` credentials column into ``TEXT``.
+
+    Fernet tokens are not valid JSON; existing plaintext values survive the
+    conversion and are read as before until they are re-encrypted.
+    """
+    if engine.dialect.name != "mysql":
+        return
+    inspector = inspect(engine)
+    if not inspector.has_table("destinations"):
+        return
+    columns = {c["name"]: c for c in inspector.get_columns("destinations")}
+    if columns["credentials"]["type"].__class__.__name__.upper() == "JSON":
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "ALTER TABLE destinations "
+                    "MODIFY credentials TEXT NOT NULL"
+                )
+            )
 
 
 def get_db() -> Generator:
@@ -1,7 +1,9 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+
+from common_utils.metrics import CONTENT_TYPE, REGISTRY
 
 from .database import init_db
-from .routers import destinations, sources
+from .routers import articles, destinations, sources
 
 app = FastAPI()
 
@@ -13,3 +15,9 @@ def on_startup() -> None:
 
 app.include_router(sources.router)
 app.include_router(destinations.router)
+app.include_router(articles.router)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
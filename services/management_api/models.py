@@ -1,4 +1,6 @@
-from sqlalchemy import JSON, Column, DateTime, Integer, String, func
+from sqlalchemy import Column, DateTime, Integer, String, func
+
+from common_utils.crypto_types import EncryptedJSON
 
 from .database import Base
 
@@ -16,5 +18,6 @@ class Destination(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, unique=True)
-    credentials = Column(JSON, nullable=False)
+    # Fernet-encrypted; see services.management_api.credentials.
+    credentials = Column(EncryptedJSON, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
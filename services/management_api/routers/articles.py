@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from services.core_engine.archive import Archive, get_article
+
+from .. import schemas, search
+from ..database import get_db
+
+router = APIRouter(prefix="/articles", tags=["articles"])
+
+
+def get_archive() -> Archive:
+    return Archive.from_env()
+
+
+@router.get("/search", response_model=schemas.ArticleSearchPage)
+def search_articles(
+    q: str = Query(..., min_length=1),
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=search.MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        hits, next_cursor = search.search_articles(
+            db, q, status, source, since, until, limit, cursor
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    items = [
+        schemas.ArticleHit(
+            id=article.id,
+            source_url=article.source_url,
+            summary=article.summary,
+            status=article.status,
+            language=article.language,
+            created_at=article.created_at,
+            score=score,
+        )
+        for article, score in hits
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/{article_id}", response_model=schemas.ArticleDetail)
+def read_article(
+    article_id: int,
+    db: Session = Depends(get_db),
+    archive: Archive = Depends(get_archive),
+):
+    article = get_article(db, article_id, archive)
+    if article is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    return schemas.ArticleDetail(
+        id=article.id,
+        source_url=article.source_url,
+        content=article.content,
+        translated_content=article.translated_content,
+        summary=article.summary,
+        language=article.language,
+        status=article.status,
+        created_at=article.created_at,
+        archived=article not in db,
+    )
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -35,3 +35,30 @@ class Destination(DestinationBase):
 
     class Config:
         orm_mode = True
+
+
+class ArticleHit(BaseModel):
+    id: int
+    source_url: str
+    summary: Optional[str]
+    status: str
+    language: Optional[str]
+    created_at: datetime
+    score: float
+
+
+class ArticleDetail(BaseModel):
+    id: int
+    source_url: str
+    content: str
+    translated_content: Optional[str]
+    summary: Optional[str]
+    language: Optional[str]
+    status: str
+    created_at: datetime
+    archived: bool
+
+
+class ArticleSearchPage(BaseModel):
+    items: List[ArticleHit]
+    next_cursor: Optional[str]
@@ -0,0 +1,117 @@
+"""Ranked article search over the ``ft_articles_text`` FULLTEXT index.
+
+On MySQL, results are ranked by ``MATCH(summary, translated_content)
+AGAINST(... IN NATURAL LANGUAGE MODE)``. Other databases (SQLite in tests
+and local runs) fall back to a ``LIKE`` filter with every score equal to
+zero, so only the newest-first tiebreak orders them.
+
+Pagination is keyset-based: the cursor carries the last hit's score and id,
+and the next page continues strictly after it. Deep pages cost the same as
+the first, unlike ``OFFSET``.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, literal, or_, select
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from services.core_engine.models import Article
+
+MAX_LIMIT = 100
+
+
+def encode_cursor(score: float, article_id: int) -> str:
+    raw = json.dumps([score, article_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Inverse of :func:`encode_cursor`; raises ``ValueError`` if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, article_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(score), int(article_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _escape_like(text: str) -> str:
+    """``text`` with LIKE wildcards escaped, for use with ``escape="\\"``."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _relevance(db: Session, query: str):
+    """``MATCH ... AGAINST`` for ``query``; ``None`` without FULLTEXT."""
+    if db.get_bind().dialect.name != "mysql":
+        return None
+    return match(
+        Article.summary, Article.translated_content, against=query
+    ).in_natural_language_mode()
+
+
+def search_articles(
+    db: Session,
+    query: str,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Tuple[Article, float]], Optional[str]]:
+    """Return ``(article, score)`` hits, best first, and the next cursor.
+
+    ``source`` is a host name matched against ``source_url``; ``since`` and
+    ``until`` bound ``created_at`` (inclusive, exclusive).
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    score = _relevance(db, query)
+    if score is None:
+        pattern = f"%{_escape_like(query)}%"
+        matches = or_(
+            Article.summary.like(pattern, escape="\\"),
+            Article.translated_content.like(pattern, escape="\\"),
+        )
+        score = literal(0.0)
+    else:
+        matches = score > 0
+
+    conditions = [matches]
+    if status:
+        conditions.append(Article.status == status)
+    if source:
+        host = _escape_like(source)
+        conditions.append(
+            or_(
+                Article.source_url.like(f"http://{host}/%", escape="\\"),
+                Article.source_url.like(f"https://{host}/%", escape="\\"),
+            )
+        )
+    if since:
+        conditions.append(Article.created_at >= since)
+    if until:
+        conditions.append(Article.created_at < until)
+    if cursor:
+        last_score, last_id = decode_cursor(cursor)
+        conditions.append(
+            or_(
+                score < last_score,
+                and_(score == last_score, Article.id < last_id),
+            )
+        )
+
+    rows = db.execute(
+        select(Article, score.label("score"))
+        .where(*conditions)
+        .order_by(score.desc(), Article.id.desc())
+        .limit(limit + 1)
+    ).all()
+    hits = [(article, float(hit_score)) for article, hit_score in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last_article, last_score = hits[-1]
+        next_cursor = encode_cursor(last_score, last_article.id)
+    return hits, next_cursor
@@ -1,3 +1,5 @@
+import types
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -8,6 +10,10 @@ from sqlalchemy.exc import IntegrityError
 from services.management_api import main
 from services.management_api.database import Base, get_db
 from services.management_api import models
+from services.core_engine import models as core_models
+from cryptography.fernet import Fernet
+
+KEY = Fernet.generate_key().decode()
 
 # Disable database initialization during tests
 main.init_db = lambda: None
@@ -33,18 +39,25 @@ def override_get_db():
 app.dependency_overrides[get_db] = override_get_db
 
 
+@pytest.fixture(autouse=True)
+def fernet_keys(monkeypatch):
+    monkeypatch.setenv("FERNET_KEYS", KEY)
+
+
 @pytest.fixture
 def client():
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    for metadata in (Base.metadata, core_models.Base.metadata):
+        metadata.drop_all(bind=engine)
+        metadata.create_all(bind=engine)
     with TestClient(app) as c:
         yield c
 
 
 @pytest.fixture
 def db_session():
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    for metadata in (Base.metadata, core_models.Base.metadata):
+        metadata.drop_all(bind=engine)
+        metadata.create_all(bind=engine)
     session = TestingSessionLocal()
     try:
         yield session
@@ -111,4 +124,133 @@ def test_destination_model_defaults_and_constraints(db_session):
     db_session.add(models.Destination(name="dest2", credentials=None))
     with pytest.raises(IntegrityError):
         db_session.commit()
-    db_session.rollback()
\ No newline at end of file
+    db_session.rollback()
+
+
+def test_search_articles_filters_and_pages(client):
+    from datetime import datetime
+
+    with TestingSessionLocal() as session:
+        for i, (host, status, day) in enumerate(
+            [
+                ("a.com", "PENDING_APPROVAL", 1),
+                ("b.com", "PUBLISHED", 2),
+                ("a.com", "PUBLISHED", 3),
+                ("a.com", "PUBLISHED", 4),
+            ],
+            start=1,
+        ):
+            summary = f"Earthquake report {i}"
+            if i == 3:
+                summary = "Election night"
+            session.add(
+                core_models.Article(
+                    id=i,
+                    source_url=f"https://{host}/{i}",
+                    content="body",
+                    summary=summary,
+                    status=status,
+                    created_at=datetime(2024, 5, day),
+                )
+            )
+        session.commit()
+
+    response = client.get(
+        "/articles/search", params={"q": "quake", "limit": 2}
+    )
+    assert response.status_code == 200
+    page = response.json()
+    assert [hit["id"] for hit in page["items"]] == [4, 2]
+
+    response = client.get(
+        "/articles/search",
+        params={"q": "quake", "limit": 2, "cursor": page["next_cursor"]},
+    )
+    assert [hit["id"] for hit in response.json()["items"]] == [1]
+    assert response.json()["next_cursor"] is None
+
+    response = client.get(
+        "/articles/search",
+        params={
+            "q": "quake",
+            "status": "PUBLISHED",
+            "source": "a.com",
+            "since": "2024-05-02",
+        },
+    )
+    assert [hit["id"] for hit in response.json()["items"]] == [4]
+
+    response = client.get(
+        "/articles/search", params={"q": "x", "cursor": "nope"}
+    )
+    assert response.status_code == 400
+
+
+def test_search_treats_like_wildcards_literally(client):
+    with TestingSessionLocal() as session:
+        for i, (host, summary) in enumerate(
+            [
+                ("a_b.com", "Turnout 100% in 2024"),
+                ("axb.com", "Turnout 1000 in 2024"),
+            ],
+            start=11,
+        ):
+            session.add(
+                core_models.Article(
+                    id=i,
+                    source_url=f"https://{host}/{i}",
+                    content="body",
+                    summary=summary,
+                    status="PUBLISHED",
+                )
+            )
+        session.commit()
+
+    response = client.get("/articles/search", params={"q": "100%"})
+    assert [hit["id"] for hit in response.json()["items"]] == [11]
+    response = client.get(
+        "/articles/search", params={"q": "Turnout", "source": "a_b.com"}
+    )
+    assert [hit["id"] for hit in response.json()["items"]] == [11]
+
+
+def test_read_article_falls_back_to_archive(client, tmp_path):
+    from datetime import datetime
+
+    from services.core_engine.archive import Archive
+    from services.management_api.routers import articles
+
+    pytest.importorskip("pyarrow")
+    row = types.SimpleNamespace(
+        id=1,
+        source_url="https://a.com/1",
+        content="old body",
+        translated_content=None,
+        summary="old summary",
+        language="en",
+        priority="normal",
+        traceparent=None,
+        status="PUBLISHED",
+        version=2,
+        created_at=datetime(2023, 1, 2),
+    )
+    store = Archive(str(tmp_path))
+    store.write(datetime(2023, 1, 1), iter([[row]]))
+    app.dependency_overrides[articles.get_archive] = lambda: store
+    with TestingSessionLocal() as session:
+        session.add(
+            core_models.Article(
+                id=2, source_url="https://a.com/2", content="new body"
+            )
+        )
+        session.commit()
+    try:
+        live = client.get("/articles/2").json()
+        old = client.get("/articles/1").json()
+        missing = client.get("/articles/3")
+    finally:
+        del app.dependency_overrides[articles.get_archive]
+
+    assert (live["content"], live["archived"]) == ("new body", False)
+    assert (old["summary"], old["archived"]) == ("old summary", True)
+    assert missing.status_code == 404
@@ -0,0 +1,42 @@
+from cryptography.fernet import Fernet
+from sqlalchemy import insert, text
+
+from common_utils.crypto import FieldCipher
+from services.management_api import credentials
+from services.management_api.database import Base
+from services.management_api.models import Destination
+
+
+def test_reencrypt_credentials_rotates_in_batches(monkeypatch, sqlite_db):
+    old, new = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+    sqlite_db.create_all(Base.metadata)
+    monkeypatch.setattr(credentials, "session_scope", sqlite_db.session_scope)
+    monkeypatch.setenv("FERNET_KEYS", old)
+    with sqlite_db.engine.begin() as conn:
+        conn.execute(
+            insert(Destination),
+            [
+                {"name": f"d{i}", "credentials": {"bot_token": f"t{i}"}}
+                for i in range(1, 4)
+            ],
+        )
+        # Written before credentials were encrypted.
+        conn.execute(
+            text(
+                "INSERT INTO destinations (name, credentials) "
+                """VALUES ('d4', '{"bot_token": "t4"}')"""
+            )
+        )
+
+    cipher = FieldCipher([new, old])
+    assert credentials.reencrypt_credentials(cipher, batch_size=3) == 4
+    assert credentials.reencrypt_credentials(cipher, batch_size=3) == 0
+
+    monkeypatch.setenv("FERNET_KEYS", new)
+    with sqlite_db.session_scope() as db:
+        query = text("SELECT credentials FROM destinations")
+        stored = db.execute(query).scalars().all()
+        rows = db.query(Destination).order_by(Destination.id).all()
+        tokens = [row.credentials["bot_token"] for row in rows]
+        assert tokens == ["t1", "t2", "t3", "t4"]
+    assert all(cipher.is_current(token) for token in stored)
@@ -1,64 +1,450 @@
+import functools
+import json
 import os
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
 from telegram import Bot
 from common_utils import configure_logging, get_rabbitmq_connection, session_scope
+from common_utils import lanes
+from common_utils.health import (
+    Health,
+    broker_check,
+    database_check,
+    watch_queues,
+)
+from common_utils.metrics import InstrumentedChannel, start_metrics_server
+from common_utils.profiling import configure_profiling, timed
+from common_utils.send_scheduler import PRIORITY_PUBLISH, SendScheduler
+from common_utils.tracing import configure_tracing, extract
+from common_utils.telegram_payload import (
+    message_kwargs,
+    render_article,
+    render_digest,
+)
+from services.core_engine import status
 from services.core_engine.models import Article
+from services.publisher_service.digest import DigestBuffer
+from services.publisher_service.destinations import (
+    BotPool,
+    DestinationCache,
+    DestinationHealth,
+    Target,
+)
 
 QUEUE_APPROVED = "article.approved"
+RETRY_ENV_VAR = "PUBLISH_RETRY_SECONDS"
+SEND_TIMEOUT_ENV_VAR = "PUBLISH_SEND_TIMEOUT_SECONDS"
+SEND_TIMEOUT = 60.0
+# How often the broker connection is serviced while waiting for sends.
+POLL = 0.1
+
+# A bare-id approval from before payloads were rendered at approval time
+# was sent while the article was still PENDING_APPROVAL.
+LEGACY_SOURCES = (status.APPROVED, status.PENDING_APPROVAL)
+
+
+def _wait(outcome: Future, deadline: float, pump) -> Optional[BaseException]:
+    """Wait until ``deadline`` for ``outcome`` and return its error.
+
+    ``pump`` is called between short waits so the broker connection keeps
+    handling heartbeats meanwhile. A send still pending at the deadline is
+    cancelled and reported as a ``TimeoutError``.
+    """
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            if pump is None:
+                return outcome.exception(timeout=max(0.0, remaining))
+            return outcome.exception(timeout=max(0.0, min(remaining, POLL)))
+        except FutureTimeout:
+            if remaining <= POLL or pump is None:
+                outcome.cancel()
+                return TimeoutError("send timed out")
+            pump()
+
+
+def _send_all(
+    payload: Dict,
+    targets: Iterable[Target],
+    bots: BotPool,
+    scheduler: SendScheduler,
+    health,
+    logger,
+    timeout: float,
+    pump,
+) -> int:
+    """Send ``payload`` to every available target, all targets in parallel.
+
+    Waits at most ``timeout`` seconds in all; a target not sent to by then
+    counts as failed. Returns how many targets received it.
+    """
+    messages = message_kwargs(payload)
+    sends = []
+    for target in targets:
+        if health is not None and not health.available(target.name):
+            logger.info(
+                "Skipping unhealthy destination",
+                extra={"destination": target.name},
+            )
+            continue
+        bot = bots.get(target.bot_token)
+        # Parts of one article go to a chat in order.
+        outcome = scheduler.submit_all(
+            bot.send_message, target.chat_id, messages, PRIORITY_PUBLISH
+        )
+        sends.append((target, outcome))
+
+    delivered = 0
+    deadline = time.monotonic() + timeout
+    for target, outcome in sends:
+        error = _wait(outcome, deadline, pump)
+        if error is None:
+            delivered += 1
+            if health is not None:
+                health.record_success(target.name)
+            continue
+        if health is not None:
+            health.record_failure(target.name)
+        logger.warning(
+            "Failed to publish to destination",
+            extra={"destination": target.name, "error": str(error)},
+        )
+    return delivered
+
+
+def parse_approved(body: bytes) -> Dict:
+    """Normalize an ``article.approved`` message.
+
+    Approvals are JSON with ``id`` (or ``ids`` for a batch approved in one
+    action), a pre-rendered ``payload`` and the ``summary``/``source_url``
+    used for digests. A bare id from older producers has no payload and
+    is marked ``legacy``.
+    """
+    text = body.decode()
+    if not text.lstrip().startswith("{"):
+        return {"ids": [int(text)], "payload": None, "legacy": True}
+    try:
+        message = json.loads(text)
+        ids = message["ids"] if "ids" in message else [message["id"]]
+        message["ids"] = [int(article_id) for article_id in ids]
+    except (KeyError, TypeError) as exc:
+        raise ValueError(str(exc)) from exc
+    message.setdefault("payload", None)
+    return message
+
+
+@timed("publish_digest")
+def publish_digest(
+    messages: List[Dict],
+    targets,
+    bots,
+    logger,
+    scheduler,
+    health=None,
+    timeout=SEND_TIMEOUT,
+    pump=None,
+) -> bool:
+    """Combine buffered approvals into as few messages as possible and send
+    them."""
+    payload = render_digest(
+        (m.get("summary") or m["payload"]["parts"][0], m.get("source_url"))
+        for m in messages
+    )
+    ids = [article_id for m in messages for article_id in m["ids"]]
+    return publish_payload(
+        ids, payload, targets, bots, logger, scheduler, health, timeout, pump
+    )
+
+
+@timed("publish_payload")
+def publish_payload(
+    article_id: Union[int, List[int]],
+    payload: Dict,
+    targets: Iterable[Target],
+    bots: BotPool,
+    logger,
+    scheduler: SendScheduler,
+    health: Optional[DestinationHealth] = None,
+    timeout: float = SEND_TIMEOUT,
+    pump: Optional[Callable[[], None]] = None,
+) -> bool:
+    """Send an already rendered payload to every target.
+
+    The sends go out in parallel through the ``scheduler``'s rate limits
+    and this call waits up to ``timeout`` seconds for all of them, calling
+    ``pump`` meanwhile. A failing destination is recorded in ``health``
+    and does not affect the others. ``article_id`` is a list when the
+    payload is a digest of several articles.
+
+    Returns whether at least one target received the payload.
+    """
+    delivered = _send_all(
+        payload, targets, bots, scheduler, health, logger, timeout, pump
+    )
+    if not delivered:
+        logger.warning(
+            "Article reached no destination", extra={"id": article_id}
+        )
+        return False
+    logger.info("Published article", extra={"id": article_id})
+    return True
+
 
+@timed("publish_article")
+def publish_article(
+    article_id: int,
+    targets: Iterable[Target],
+    bots: BotPool,
+    logger,
+    scheduler: SendScheduler,
+    health: Optional[DestinationHealth] = None,
+    legacy: bool = False,
+    timeout: float = SEND_TIMEOUT,
+    pump: Optional[Callable[[], None]] = None,
+) -> bool:
+    """Fetch article from DB, render it and publish it.
 
-def publish_article(article_id: int, bot: Bot, chat_id: str, logger) -> None:
-    """Fetch article from DB and send its text or link to Telegram."""
+    Only used for approvals that arrive without a payload. An article that
+    is not (or no longer) APPROVED is skipped, so a redelivered approval is
+    not published twice; a ``legacy`` approval also publishes an article
+    still PENDING_APPROVAL.
+
+    Returns ``False`` if the article reached no destination, in which case
+    it is APPROVED again and the approval should be retried.
+    """
+    sources = LEGACY_SOURCES if legacy else None
     with session_scope() as db:
         article = db.get(Article, article_id)
         if not article:
             logger.warning("Article not found", extra={"id": article_id})
-            return
-        text = (
-            article.translated_content
-            or article.content
-            or article.source_url
-            or ""
+            return True
+        if not status.transition(
+            db, article_id, status.PUBLISHED, sources=sources
+        ):
+            logger.info(
+                "Skipping article already published", extra={"id": article_id}
+            )
+            return True
+        payload = render_article(article)
+    if publish_payload(
+        article_id, payload, targets, bots, logger, scheduler, health,
+        timeout, pump,
+    ):
+        return True
+    release_claims([article_id], logger)
+    return False
+
+
+def claim_for_publishing(
+    article_ids: List[int], logger, legacy: bool = False
+) -> List[int]:
+    """Mark approved articles PUBLISHED and return the ids that were claimed.
+
+    Claiming before sending makes publishing at most once per article:
+    a redelivered approval, or the same article in two messages, finds it
+    already claimed. Claims on articles that then reach no destination
+    are undone with :func:`release_claims`.
+    """
+    sources = LEGACY_SOURCES if legacy else None
+    with session_scope() as db:
+        claimed = status.transition_many(
+            db, article_ids, status.PUBLISHED, sources=sources
         )
-        if len(text) > 4000:
-            text = article.source_url
-        bot.send_message(chat_id=chat_id, text=text)
-    logger.info("Published article", extra={"id": article_id})
+    skipped = sorted(set(article_ids) - set(claimed))
+    if skipped:
+        logger.info(
+            "Skipping articles already published", extra={"ids": skipped}
+        )
+    return claimed
+
+
+def release_claims(article_ids: List[int], logger) -> None:
+    """Move claimed articles that were not sent anywhere back to APPROVED."""
+    with session_scope() as db:
+        status.transition_many(
+            db, article_ids, status.APPROVED, sources=(status.PUBLISHED,)
+        )
+    logger.info("Released articles for retry", extra={"ids": article_ids})
 
 
 def main() -> None:
     logger = configure_logging()
     logger.info("Publisher service starting")
+    start_metrics_server()
+    tracer = configure_tracing("publisher_service")
+    configure_profiling("publisher_service")
 
+    # The env chat is only used when the destinations table has no
+    # Telegram destinations.
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     chat_id = os.getenv("TELEGRAM_PUBLISH_CHAT_ID")
-    if not token or not chat_id:
-        logger.error("TELEGRAM_BOT_TOKEN or TELEGRAM_PUBLISH_CHAT_ID not set")
-        return
+    fallback = Target("default", token, chat_id) if token and chat_id else None
 
-    bot = Bot(token=token)
+    destinations = DestinationCache.from_env(fallback=fallback)
+    bots = BotPool(lambda bot_token: Bot(token=bot_token))
+    destination_health = DestinationHealth.from_env()
+    retry_delay = float(os.getenv(RETRY_ENV_VAR, "30"))
+    send_timeout = float(os.getenv(SEND_TIMEOUT_ENV_VAR, str(SEND_TIMEOUT)))
+    scheduler = SendScheduler()
+    scheduler.start()
+
+    digest = DigestBuffer.from_env()
+    pending_tags: List[int] = []
 
     conn = get_rabbitmq_connection()
-    channel = conn.channel()
-    channel.queue_declare(queue=QUEUE_APPROVED, durable=True)
+    channel = InstrumentedChannel(conn.channel())
+    lanes.declare_lanes(channel, QUEUE_APPROVED)
+    health = Health.from_env().register()
+    health.add_check("database", database_check)
+    health.add_check("broker", broker_check(conn))
+    watch_queues(conn, lanes.lane_queues(QUEUE_APPROVED), health)
+
+    def pump():
+        # Keeps broker heartbeats going while a callback waits for sends.
+        conn.process_data_events(time_limit=0)
+
+    def targets_or_log():
+        targets = destinations.targets()
+        if not targets:
+            logger.error("No publish destinations configured")
+        return targets
+
+    def retry_later(tags):
+        # Redeliver after a pause rather than spinning on a failing chat.
+        def requeue():
+            for tag in tags:
+                channel.basic_nack(delivery_tag=tag, requeue=True)
+
+        conn.call_later(retry_delay, requeue)
+
+    def flush_digest(generation=None):
+        if generation is not None and generation != digest.generation:
+            return
+        messages = digest.drain()
+        tags = list(pending_tags)
+        pending_tags.clear()
+        claimed = claim_for_publishing([m["ids"][0] for m in messages], logger)
+        messages = [m for m in messages if m["ids"][0] in set(claimed)]
+        sent = True
+        if messages:
+            # A digest closes several traces at once, so it links to each.
+            links = [
+                m["trace_context"] for m in messages if m.get("trace_context")
+            ]
+            with tracer.start_span(
+                "publisher.publish_digest",
+                links=links,
+                attributes={"articles": len(messages)},
+            ):
+                sent = publish_digest(
+                    messages,
+                    targets_or_log(),
+                    bots,
+                    logger,
+                    scheduler,
+                    destination_health,
+                    send_timeout,
+                    pump,
+                )
+        if not sent:
+            release_claims(claimed, logger)
+            retry_later(tags)
+            return
+        for tag in tags:
+            channel.basic_ack(delivery_tag=tag)
 
     def callback(ch, method, properties, body):
+        health.beat()
         try:
-            article_id = int(body.decode())
+            message = parse_approved(body)
         except ValueError:
             logger.warning("Invalid message body", extra={"body": body})
             ch.basic_ack(delivery_tag=method.delivery_tag)
             return
-        publish_article(article_id, bot, chat_id, logger)
+        payload = message["payload"]
+        headers = getattr(properties, "headers", None)
+        message["trace_context"] = extract(headers)
+        # Breaking news is sent straight away rather than waiting for a digest.
+        urgent = lanes.lane_for_headers(headers) == lanes.HIGH
+        single = len(message["ids"]) == 1
+        batchable = payload is not None and single and not urgent
+        if digest is not None and batchable:
+            pending_tags.append(method.delivery_tag)
+            first = len(digest) == 0
+            if digest.add(message):
+                flush_digest()
+            elif first:
+                conn.call_later(
+                    digest.window,
+                    functools.partial(flush_digest, digest.generation),
+                )
+            return
+        with health.track(), tracer.start_span(
+            "publisher.publish",
+            parent=message["trace_context"],
+            attributes={"article.ids": ",".join(map(str, message["ids"]))},
+        ) as span:
+            sent_at = getattr(properties, "timestamp", None)
+            if sent_at:
+                waited = max(0, int(time.time()) - sent_at)
+                span.set_attribute("queue.wait_seconds", waited)
+            targets = targets_or_log()
+            sent = True
+            if payload is None:
+                sent = publish_article(
+                    message["ids"][0],
+                    targets,
+                    bots,
+                    logger,
+                    scheduler,
+                    destination_health,
+                    legacy=message.get("legacy", False),
+                    timeout=send_timeout,
+                    pump=pump,
+                )
+            else:
+                ids = message["ids"]
+                # The bot forwards each approval once, so a batch is either
+                # new or an entirely claimed redelivery.
+                claimed = claim_for_publishing(ids, logger)
+                if claimed:
+                    article_id = ids[0] if len(ids) == 1 else ids
+                    sent = publish_payload(
+                        article_id,
+                        payload,
+                        targets,
+                        bots,
+                        logger,
+                        scheduler,
+                        destination_health,
+                        send_timeout,
+                        pump,
+                    )
+                    if not sent:
+                        release_claims(claimed, logger)
+        if not sent:
+            retry_later([method.delivery_tag])
+            return
         ch.basic_ack(delivery_tag=method.delivery_tag)
 
-    channel.basic_consume(queue=QUEUE_APPROVED, on_message_callback=callback)
-
     try:
-        channel.start_consuming()
+        # Buffered digest messages stay unacked until their digest is sent,
+        # so each lane may hold up to a full digest.
+        lanes.consume_lanes(
+            conn,
+            channel,
+            QUEUE_APPROVED,
+            callback,
+            prefetch=digest.max_items if digest is not None else None,
+        )
     finally:
+        scheduler.stop()
         channel.close()
         conn.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from common_utils import session_scope
+from services.management_api.models import Destination
+
+REFRESH_ENV_VAR = "DESTINATIONS_REFRESH_SECONDS"
+FAILURE_THRESHOLD_ENV_VAR = "DESTINATION_FAILURE_THRESHOLD"
+COOLDOWN_ENV_VAR = "DESTINATION_COOLDOWN_SECONDS"
+
+logger = logging.getLogger(__name__)
+
+
+class Target(NamedTuple):
+    """A resolved place to publish to."""
+
+    name: str
+    bot_token: str
+    chat_id: str
+
+
+def target_from_destination(
+    name: str, credentials: Optional[dict]
+) -> Optional[Target]:
+    """Build a Telegram target from a destination's credentials.
+
+    Credentials look like
+    ``{"type": "telegram", "bot_token": ..., "chat_id": ...}``; ``type``
+    defaults to ``telegram``. Anything else is not ours to publish.
+    """
+    credentials = credentials or {}
+    if credentials.get("type", "telegram") != "telegram":
+        return None
+    token = credentials.get("bot_token")
+    chat_id = credentials.get("chat_id")
+    if not token or not chat_id:
+        return None
+    return Target(name, token, str(chat_id))
+
+
+class DestinationCache:
+    """In-memory copy of the ``destinations`` table.
+
+    Every ``refresh_seconds`` a single aggregate query checks whether rows
+    were added or removed; the full table is only reloaded when that
+    fingerprint changes or ``max_age`` has passed.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float = 30.0,
+        max_age: float = 600.0,
+        fallback: Optional[Target] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.max_age = max_age
+        self.fallback = fallback
+        self._clock = clock
+        self._targets: List[Target] = []
+        self._fingerprint: Optional[Tuple] = None
+        self._checked_at: Optional[float] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, fallback: Optional[Target] = None) -> "DestinationCache":
+        return cls(
+            refresh_seconds=float(os.getenv(REFRESH_ENV_VAR, "30")),
+            fallback=fallback,
+        )
+
+    def _load(self, db) -> List[Target]:
+        targets = []
+        for name, credentials in db.execute(
+            select(Destination.name, Destination.credentials)
+        ):
+            target = target_from_destination(name, credentials)
+            if target:
+                targets.append(target)
+        return targets
+
+    def targets(self) -> List[Target]:
+        """Return the current targets, refreshing from the DB when due."""
+        with self._lock:
+            now = self._clock()
+            if (
+                self._checked_at is not None
+                and now - self._checked_at < self.refresh_seconds
+            ):
+                return self._targets or self._fallback_list()
+            self._checked_at = now
+            with session_scope() as db:
+                fingerprint = tuple(
+                    db.execute(
+                        select(
+                            func.count(Destination.id),
+                            func.max(Destination.id),
+                        )
+                    ).one()
+                )
+                if (
+                    fingerprint != self._fingerprint
+                    or now - self._loaded_at > self.max_age
+                ):
+                    self._targets = self._load(db)
+                    self._fingerprint = fingerprint
+                    self._loaded_at = now
+            return self._targets or self._fallback_list()
+
+    def _fallback_list(self) -> List[Target]:
+        return [self.fallback] if self.fallback else []
+
+
+class BotPool:
+    """One client per bot token, shared by every destination using it."""
+
+    def __init__(self, factory: Callable[[str], object]) -> None:
+        self._factory = factory
+        self._bots: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            bot = self._bots.get(token)
+            if bot is None:
+                bot = self._bots[token] = self._factory(token)
+            return bot
+
+
+class DestinationHealth:
+    """Per-destination failure tracking.
+
+    After ``threshold`` consecutive failures a destination is skipped for
+    ``cooldown`` seconds, so a dead channel stops costing sends and retries.
+    """
+
+    def __init__(
+        self,
+        threshold: int = 3,
+        cooldown: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures: Dict[str, int] = {}
+        self._skip_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "DestinationHealth":
+        return cls(
+            threshold=int(os.getenv(FAILURE_THRESHOLD_ENV_VAR, "3")),
+            cooldown=float(os.getenv(COOLDOWN_ENV_VAR, "300")),
+        )
+
+    def available(self, name: str) -> bool:
+        with self._lock:
+            return self._skip_until.get(name, 0.0) <= self._clock()
+
+    def record_success(self, name: str) -> None:
+        with self._lock:
+            self._failures.pop(name, None)
+            self._skip_until.pop(name, None)
+
+    def record_failure(self, name: str) -> None:
+        with self._lock:
+            failures = self._failures.get(name, 0) + 1
+            self._failures[name] = failures
+            if failures >= self.threshold:
+                self._skip_until[name] = self._clock() + self.cooldown
+                logger.warning(
+                    "Destination disabled after repeated failures",
+                    extra={"destination": name, "failures": failures},
+                )
+
+    def failures(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._failures)
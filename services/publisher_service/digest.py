@@ -0,0 +1,64 @@
+import os
+import time
+from typing import Any, Callable, List, Optional
+
+MODE_ENV_VAR = "PUBLISH_MODE"
+WINDOW_ENV_VAR = "DIGEST_WINDOW_SECONDS"
+MAX_ITEMS_ENV_VAR = "DIGEST_MAX_ITEMS"
+
+
+class DigestBuffer:
+    """Collects approved articles until a digest is due.
+
+    A digest is due once ``max_items`` articles are waiting or ``window``
+    seconds have passed since the first one arrived. ``generation`` changes
+    on every drain so a timer armed for an earlier batch can tell it is
+    stale.
+    """
+
+    def __init__(
+        self,
+        window: float = 300.0,
+        max_items: int = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window = window
+        self.max_items = max_items
+        self._clock = clock
+        self._items: List[Any] = []
+        self._started: Optional[float] = None
+        self.generation = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["DigestBuffer"]:
+        """Return a buffer when ``PUBLISH_MODE=digest``, otherwise ``None``."""
+        if os.getenv(MODE_ENV_VAR, "immediate") != "digest":
+            return None
+        return cls(
+            window=float(os.getenv(WINDOW_ENV_VAR, "300")),
+            max_items=int(os.getenv(MAX_ITEMS_ENV_VAR, "10")),
+        )
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, item: Any) -> bool:
+        """Buffer ``item`` and return ``True`` if the digest is now due."""
+        if not self._items:
+            self._started = self._clock()
+        self._items.append(item)
+        return self.due()
+
+    def due(self) -> bool:
+        if not self._items:
+            return False
+        return (
+            len(self._items) >= self.max_items
+            or self._clock() - self._started >= self.window
+        )
+
+    def drain(self) -> List[Any]:
+        items, self._items = self._items, []
+        self._started = None
+        self.generation += 1
+        return items
@@ -1,5 +1,20 @@
+import asyncio
+import json
+import time
 import types
+
+import pytest
+
 import services.publisher_service.app as app
+from common_utils.send_scheduler import SendScheduler
+from services.core_engine import status
+from services.core_engine.models import Article, Base
+from services.publisher_service.destinations import (
+    BotPool,
+    DestinationHealth,
+    Target,
+)
+
 
 class DummyBot:
     def __init__(self):
@@ -9,10 +24,14 @@ class DummyBot:
         self.messages.append((chat_id, text))
 
 
-def make_session(article):
+def make_session(article, approved=True):
     class DummySession:
         def get(self, model, id):
             return article
+
+        def execute(self, statement):
+            # The APPROVED -> PUBLISHED transition.
+            return types.SimpleNamespace(rowcount=1 if approved else 0)
     class CM:
         def __enter__(self_inner):
             return DummySession()
@@ -21,7 +40,20 @@ def make_session(article):
     return CM()
 
 
-def test_publish_article_sends_translated(monkeypatch):
+@pytest.fixture
+def scheduler():
+    # Fast enough that the tests do not wait on Telegram's rate limits.
+    scheduler = SendScheduler(chat_rate=100.0, group_rate=100.0)
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+
+def single_target(bot):
+    return [Target("default", "token", "chat")], BotPool(lambda token: bot)
+
+
+def test_publish_article_sends_translated(monkeypatch, scheduler):
     article = types.SimpleNamespace(
         id=1,
         translated_content="translated",
@@ -29,13 +61,28 @@ def test_publish_article_sends_translated(monkeypatch):
         source_url="http://example.com",
     )
     bot = DummyBot()
+    targets, bots = single_target(bot)
     monkeypatch.setattr(app, "session_scope", lambda: make_session(article))
     logger = app.configure_logging()
-    app.publish_article(1, bot, "chat", logger)
+    app.publish_article(1, targets, bots, logger, scheduler)
     assert bot.messages == [("chat", "translated")]
 
 
-def test_publish_article_uses_url_when_text_long(monkeypatch):
+def test_publish_article_skips_article_not_approved(monkeypatch, scheduler):
+    article = types.SimpleNamespace(
+        id=1, translated_content="translated", content="content"
+    )
+    bot = DummyBot()
+    targets, bots = single_target(bot)
+    monkeypatch.setattr(
+        app, "session_scope", lambda: make_session(article, approved=False)
+    )
+    logger = app.configure_logging()
+    app.publish_article(1, targets, bots, logger, scheduler)
+    assert bot.messages == []
+
+
+def test_publish_article_splits_long_text(monkeypatch, scheduler):
     long_text = "x" * 5001
     article = types.SimpleNamespace(
         id=2,
@@ -44,7 +91,223 @@ def test_publish_article_uses_url_when_text_long(monkeypatch):
         source_url="http://example.com",
     )
     bot = DummyBot()
+    targets, bots = single_target(bot)
+    monkeypatch.setattr(app, "session_scope", lambda: make_session(article))
+    logger = app.configure_logging()
+    app.publish_article(2, targets, bots, logger, scheduler)
+    assert len(bot.messages) == 2
+    assert all(len(text) <= 4096 for _, text in bot.messages)
+    assert "".join(text for _, text in bot.messages) == long_text
+
+
+def test_publish_article_goes_through_scheduler(monkeypatch, scheduler):
+    article = types.SimpleNamespace(
+        id=3,
+        translated_content="translated",
+        content="content",
+        source_url="http://example.com",
+    )
+    bot = DummyBot()
+    targets, bots = single_target(bot)
     monkeypatch.setattr(app, "session_scope", lambda: make_session(article))
     logger = app.configure_logging()
-    app.publish_article(2, bot, "chat", logger)
-    assert bot.messages == [("chat", "http://example.com")]
\ No newline at end of file
+    app.publish_article(3, targets, bots, logger, scheduler)
+    assert bot.messages == [("chat", "translated")]
+
+
+def test_publish_article_fans_out_and_tracks_failures(monkeypatch, scheduler):
+    article = types.SimpleNamespace(
+        id=4,
+        translated_content="translated",
+        content="content",
+        source_url="http://example.com",
+    )
+
+    class DeadBot:
+        def send_message(self, chat_id, text):
+            raise RuntimeError("chat not found")
+
+    good_a, good_b, dead = DummyBot(), DummyBot(), DeadBot()
+    bots = BotPool({"a": good_a, "b": good_b, "dead": dead}.get)
+    targets = [
+        Target("one", "a", "@one"),
+        Target("two", "a", "@two"),
+        Target("three", "b", "@three"),
+        Target("gone", "dead", "@gone"),
+    ]
+    health = DestinationHealth(threshold=2)
+    monkeypatch.setattr(app, "session_scope", lambda: make_session(article))
+    logger = app.configure_logging()
+
+    for _ in range(3):
+        app.publish_article(4, targets, bots, logger, scheduler, health)
+
+    assert sorted(good_a.messages) == sorted(
+        [("@one", "translated"), ("@two", "translated")] * 3
+    )
+    assert good_b.messages == [("@three", "translated")] * 3
+    # Two failures disable the dead destination; the third run skips it.
+    assert health.failures() == {"gone": 2}
+    assert not health.available("gone")
+
+
+def test_publish_article_truncates_with_link_beyond_max_parts(
+    monkeypatch, scheduler
+):
+    long_text = "word " * 5000
+    article = types.SimpleNamespace(
+        id=5,
+        translated_content=long_text,
+        content=long_text,
+        source_url="http://example.com",
+    )
+    bot = DummyBot()
+    targets, bots = single_target(bot)
+    monkeypatch.setenv("PUBLISH_MAX_PARTS", "2")
+    monkeypatch.setattr(app, "session_scope", lambda: make_session(article))
+    logger = app.configure_logging()
+    app.publish_article(5, targets, bots, logger, scheduler)
+    assert len(bot.messages) == 2
+    assert bot.messages[-1][1].endswith("…\n\nhttp://example.com")
+    assert all(len(text) <= 4096 for _, text in bot.messages)
+
+
+def test_publish_payload_needs_no_database(monkeypatch, scheduler):
+    def no_db():
+        raise AssertionError("database used")
+
+    bot = DummyBot()
+    targets, bots = single_target(bot)
+    monkeypatch.setattr(app, "session_scope", no_db)
+    message = app.parse_approved(
+        b'{"id": 6, "payload": {"parts": ["one", "two"], "parse_mode": null}}'
+    )
+    app.publish_payload(
+        message["ids"][0],
+        message["payload"],
+        targets,
+        bots,
+        app.configure_logging(),
+        scheduler,
+    )
+    assert bot.messages == [("chat", "one"), ("chat", "two")]
+    assert app.parse_approved(b"7") == {
+        "ids": [7],
+        "payload": None,
+        "legacy": True,
+    }
+
+
+def test_publish_digest_combines_articles(scheduler):
+    bot = DummyBot()
+    targets, bots = single_target(bot)
+    messages = [
+        app.parse_approved(
+            json.dumps(
+                {
+                    "id": i,
+                    "summary": f"summary {i}",
+                    "source_url": f"http://e.com/{i}",
+                    "payload": {"parts": ["full text"], "parse_mode": None},
+                }
+            ).encode()
+        )
+        for i in range(3)
+    ]
+    app.publish_digest(
+        messages, targets, bots, app.configure_logging(), scheduler
+    )
+    digest = "\n\n".join(f"summary {i}\nhttp://e.com/{i}" for i in range(3))
+    assert bot.messages == [("chat", digest)]
+
+
+class DeadBot:
+    def send_message(self, chat_id, text):
+        raise RuntimeError("chat not found")
+
+
+def test_publish_payload_gives_up_on_a_stuck_send(scheduler):
+    class StuckBot:
+        async def send_message(self, chat_id, text):
+            await asyncio.sleep(10)
+
+    targets, bots = single_target(StuckBot())
+    pumped = []
+    started = time.monotonic()
+    sent = app.publish_payload(
+        1,
+        {"parts": ["text"]},
+        targets,
+        bots,
+        app.configure_logging(),
+        scheduler,
+        timeout=0.3,
+        pump=lambda: pumped.append(1),
+    )
+    assert not sent
+    assert time.monotonic() - started < 2
+    # The broker connection was serviced while waiting.
+    assert pumped
+
+
+def articles_in(sqlite_db, *states):
+    sqlite_db.create_all(Base.metadata)
+    with sqlite_db.session_scope() as db:
+        db.add_all(
+            Article(
+                source_url=f"http://e.com/{i}", content="content", status=state
+            )
+            for i, state in enumerate(states)
+        )
+    return sqlite_db.Session()
+
+
+def test_article_reaching_no_destination_is_approved_again(
+    monkeypatch, sqlite_db, scheduler
+):
+    db = articles_in(sqlite_db, status.APPROVED, status.APPROVED)
+    monkeypatch.setattr(app, "session_scope", sqlite_db.session_scope)
+    targets, bots = single_target(DeadBot())
+    logger = app.configure_logging()
+
+    assert not app.publish_article(1, targets, bots, logger, scheduler)
+    claimed = app.claim_for_publishing([2], logger)
+    assert not app.publish_payload(
+        2, {"parts": ["text"]}, targets, bots, logger, scheduler
+    )
+    app.release_claims(claimed, logger)
+
+    assert dict(db.query(Article.id, Article.status)) == {
+        1: status.APPROVED,
+        2: status.APPROVED,
+    }
+    # A retry once the destination is back publishes it.
+    bot = DummyBot()
+    targets, bots = single_target(bot)
+    assert app.publish_article(1, targets, bots, logger, scheduler)
+    assert bot.messages == [("chat", "content")]
+    assert db.get(Article, 1).status == status.PUBLISHED
+
+
+def test_legacy_approval_publishes_pending_article(
+    monkeypatch, sqlite_db, scheduler
+):
+    db = articles_in(
+        sqlite_db, status.PENDING_APPROVAL, status.PENDING_APPROVAL
+    )
+    monkeypatch.setattr(app, "session_scope", sqlite_db.session_scope)
+    bot = DummyBot()
+    targets, bots = single_target(bot)
+    logger = app.configure_logging()
+    message = app.parse_approved(b"1")
+
+    assert app.publish_article(
+        1, targets, bots, logger, scheduler, legacy=message["legacy"]
+    )
+    # Only bare-id approvals skip the APPROVED state.
+    assert app.publish_article(2, targets, bots, logger, scheduler)
+    assert bot.messages == [("chat", "content")]
+    assert dict(db.query(Article.id, Article.status)) == {
+        1: status.PUBLISHED,
+        2: status.PENDING_APPROVAL,
+    }
@@ -0,0 +1,47 @@
+from cryptography.fernet import Fernet
+
+from services.management_api.database import Base
+from services.management_api.models import Destination
+from services.publisher_service import destinations
+
+
+def test_destination_cache_reloads_only_on_change(monkeypatch, sqlite_db):
+    monkeypatch.setenv("FERNET_KEYS", Fernet.generate_key().decode())
+    sqlite_db.create_all(Base.metadata)
+    monkeypatch.setattr(destinations, "session_scope", sqlite_db.session_scope)
+    loads = []
+    real_load = destinations.DestinationCache._load
+
+    def counting_load(self, db):
+        loads.append(1)
+        return real_load(self, db)
+
+    monkeypatch.setattr(destinations.DestinationCache, "_load", counting_load)
+
+    now = [0.0]
+    fallback = destinations.Target("default", "env-token", "env-chat")
+    cache = destinations.DestinationCache(
+        refresh_seconds=10, fallback=fallback, clock=lambda: now[0]
+    )
+    assert cache.targets() == [fallback]
+
+    with sqlite_db.session_scope() as db:
+        db.add(
+            Destination(
+                name="news", credentials={"bot_token": "t1", "chat_id": -100}
+            )
+        )
+        db.add(
+            Destination(
+                name="other",
+                credentials={"type": "webhook", "url": "http://x"},
+            )
+        )
+
+    # Still within the refresh window: cached answer, no query.
+    assert cache.targets() == [fallback]
+    now[0] = 11
+    assert cache.targets() == [destinations.Target("news", "t1", "-100")]
+    now[0] = 22
+    cache.targets()
+    assert len(loads) == 2
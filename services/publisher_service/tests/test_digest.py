@@ -0,0 +1,26 @@
+from services.publisher_service.digest import DigestBuffer
+
+
+def test_digest_is_due_by_count_or_window():
+    now = [0.0]
+    buffer = DigestBuffer(window=60, max_items=3, clock=lambda: now[0])
+
+    assert buffer.add("a") is False
+    assert buffer.add("b") is False
+    assert buffer.add("c") is True
+    assert buffer.drain() == ["a", "b", "c"]
+    assert buffer.generation == 1
+
+    buffer.add("d")
+    now[0] = 59
+    assert buffer.due() is False
+    now[0] = 60
+    assert buffer.due() is True
+
+
+def test_digest_mode_is_opt_in(monkeypatch):
+    monkeypatch.delenv("PUBLISH_MODE", raising=False)
+    assert DigestBuffer.from_env() is None
+    monkeypatch.setenv("PUBLISH_MODE", "digest")
+    monkeypatch.setenv("DIGEST_MAX_ITEMS", "5")
+    assert DigestBuffer.from_env().max_items == 5
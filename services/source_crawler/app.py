@@ -1,59 +1,246 @@
+import calendar
 import os
 import time
-from typing import Iterable, Set
+from typing import Callable, Iterable, List, Optional, Sequence, Set
 
 import feedparser
 import pika
 import schedule
 
 from common_utils import configure_logging, get_rabbitmq_connection
+from common_utils import lanes
+from common_utils.health import (
+    Health,
+    broker_check,
+    database_check,
+    update_queue_depths,
+)
+from common_utils.metrics import (
+    InstrumentedChannel,
+    counter,
+    histogram,
+    start_metrics_server,
+)
+from common_utils.profiling import configure_profiling, timed
+from common_utils.tracing import configure_tracing, get_tracer, inject
+from services.source_crawler import sharding
 
 
 FEEDS_ENV_VAR = "RSS_FEEDS"
 INTERVAL_ENV_VAR = "CRAWLER_INTERVAL_SECONDS"
+PRIORITY_FEEDS_ENV_VAR = "CRAWLER_PRIORITY_FEEDS"
+PRIORITY_KEYWORDS_ENV_VAR = "CRAWLER_PRIORITY_KEYWORDS"
+BACKFILL_HOURS_ENV_VAR = "CRAWLER_BACKFILL_HOURS"
 
+FEED_FETCHES = counter(
+    "crawler_feed_fetches_total", "Feed fetches.", ("outcome",)
+)
+FEED_FETCH_SECONDS = histogram(
+    "crawler_feed_fetch_seconds", "Time to fetch and parse a feed."
+)
+NEW_URLS = counter(
+    "crawler_new_urls_total", "New article URLs published.", ("lane",)
+)
 
-def fetch_and_publish(conn, feeds: Iterable[str], seen: Set[str], logger):
-    """Fetch feeds and publish new links to RabbitMQ."""
-    channel = conn.channel()
-    channel.queue_declare(queue="url.new", durable=True)
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class Prioritizer:
+    """Choose the lane of a newly discovered entry.
+
+    Entries from ``priority_feeds`` or whose title or summary contains one
+    of ``keywords`` go to the high lane; entries published more than
+    ``backfill_hours`` ago, typically the archive of a newly added feed, go
+    to the low lane so they cannot hold up current news.
+    """
+
+    def __init__(
+        self,
+        priority_feeds: Iterable[str] = (),
+        keywords: Iterable[str] = (),
+        backfill_hours: float = 24.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.priority_feeds = set(priority_feeds)
+        self.keywords = [keyword.lower() for keyword in keywords]
+        self.backfill_hours = backfill_hours
+        self._clock = clock
+
+    @classmethod
+    def from_env(cls) -> "Prioritizer":
+        return cls(
+            priority_feeds=_split(os.getenv(PRIORITY_FEEDS_ENV_VAR, "")),
+            keywords=_split(os.getenv(PRIORITY_KEYWORDS_ENV_VAR, "")),
+            backfill_hours=float(os.getenv(BACKFILL_HOURS_ENV_VAR, "24")),
+        )
+
+    def __call__(self, feed_url: str, entry) -> str:
+        if feed_url in self.priority_feeds:
+            return lanes.HIGH
+        if self.keywords:
+            title, summary = entry.get("title", ""), entry.get("summary", "")
+            text = f"{title} {summary}".lower()
+            if any(keyword in text for keyword in self.keywords):
+                return lanes.HIGH
+        published = entry.get("published_parsed")
+        if published:
+            age = self._clock() - calendar.timegm(published)
+            if age > self.backfill_hours * 3600:
+                return lanes.LOW
+        return lanes.NORMAL
+
+
+@timed("fetch_and_publish")
+def fetch_and_publish(
+    conn,
+    feeds: Iterable[str],
+    seen: Set[str],
+    logger,
+    claim: Optional[Callable[[Sequence[str]], List[str]]] = None,
+    prioritize: Optional[Callable[[str, dict], str]] = None,
+):
+    """Fetch feeds and publish new links to RabbitMQ.
+
+    ``seen`` caches links this process has handled. Links not in it are
+    passed to ``claim``, when given, which returns the ones no other
+    replica has published yet. ``prioritize`` picks each link's lane of
+    ``url.new``; without it every link goes to the normal lane.
+    """
+    channel = InstrumentedChannel(conn.channel())
+    lanes.declare_lanes(channel, "url.new")
+    tracer = get_tracer()
     for feed_url in feeds:
+        fetch_started = time.time_ns()
         try:
-            parsed = feedparser.parse(feed_url)
+            with FEED_FETCH_SECONDS.time():
+                parsed = feedparser.parse(feed_url)
         except Exception as exc:  # pragma: no cover - feedparser exceptions
+            FEED_FETCHES.labels("error").inc()
             logger.exception("Error parsing feed %s: %s", feed_url, exc)
             continue
+        # feedparser reports network and parse errors through ``bozo``.
+        FEED_FETCHES.labels(
+            "error" if getattr(parsed, "bozo", False) else "ok"
+        ).inc()
+        # The feed's declared language lets core_engine skip detection.
+        language = getattr(parsed, "feed", {}).get("language")
+        headers = {"language": language} if language else {}
+        entries = {}
         for entry in parsed.entries:
             link = entry.get("link")
-            if link and link not in seen:
-                seen.add(link)
+            if link and link not in seen and link not in entries:
+                entries[link] = entry
+        links = list(entries)
+        if claim is not None and links:
+            links = claim(links)
+        seen.update(entries)
+        for link in links:
+            entry = entries[link]
+            lane = lanes.NORMAL
+            if prioritize is not None:
+                lane = prioritize(feed_url, entry)
+            NEW_URLS.labels(lane).inc()
+            # Each article gets its own trace, starting with the feed fetch
+            # that discovered it.
+            with tracer.start_span(
+                "crawler.discover",
+                attributes={"url": link, "feed.url": feed_url, "lane": lane},
+                start_ns=fetch_started,
+            ) as span:
+                published = entry.get("published_parsed")
+                if published:
+                    span.set_attribute(
+                        "entry.age_seconds",
+                        int(time.time()) - calendar.timegm(published),
+                    )
                 channel.basic_publish(
                     exchange="",
-                    routing_key="url.new",
+                    routing_key=lanes.lane_queue("url.new", lane),
                     body=link.encode(),
-                    properties=pika.BasicProperties(delivery_mode=2),
+                    properties=pika.BasicProperties(
+                        delivery_mode=2,
+                        headers=inject({**headers, lanes.HEADER: lane}),
+                        timestamp=int(time.time()),
+                    ),
                 )
-                logger.info("Published new URL", extra={"url": link})
+            logger.info(
+                "Published new URL",
+                extra={
+                    "url": link,
+                    "lane": lane,
+                    "trace_id": span.context.trace_id,
+                },
+            )
     channel.close()
 
 
 def main():
     logger = configure_logging()
     logger.info("Source crawler starting")
+    start_metrics_server()
+    configure_tracing("source_crawler")
+    configure_profiling("source_crawler")
 
     feeds_env = os.getenv(FEEDS_ENV_VAR, "").split(",")
     feeds = [f.strip() for f in feeds_env if f.strip()]
 
     conn = get_rabbitmq_connection()
     seen: Set[str] = set()
+    prioritize = Prioritizer.from_env()
+    health = Health.from_env().register()
+    health.add_check("broker", broker_check(conn))
+    probe = conn.channel()
 
     interval = int(os.getenv(INTERVAL_ENV_VAR, "60"))
-    schedule.every(interval).seconds.do(fetch_and_publish, conn, feeds, seen, logger)
+    if sharding.sharding_enabled():
+        sharding.init_db()
+        health.add_check("database", database_check)
+        # Heartbeats keep this replica in the ring, even during a crawl
+        # that outlasts the TTL.
+        membership = sharding.Membership.from_env().start()
+        sharder = sharding.FeedSharder(membership)
+        store = sharding.SeenStore.from_env()
+
+        def crawl():
+            fetch_and_publish(
+                conn,
+                sharder.assign(feeds),
+                seen,
+                logger,
+                claim=store.claim,
+                prioritize=prioritize,
+            )
+
+        schedule.every(1).days.do(store.prune)
+    else:
+        membership = None
 
-    fetch_and_publish(conn, feeds, seen, logger)
-    while True:  # pragma: no cover - infinite loop
-        schedule.run_pending()
-        time.sleep(1)
+        def crawl():
+            fetch_and_publish(conn, feeds, seen, logger, prioritize=prioritize)
+
+    schedule.every(interval).seconds.do(crawl)
+    # The backlog the crawler is feeding, for scaling core_engine.
+    schedule.every(15).seconds.do(
+        update_queue_depths, probe, lanes.lane_queues("url.new"), health
+    )
+
+    try:
+        crawl()
+        while True:  # pragma: no cover - infinite loop
+            health.beat()
+            schedule.run_pending()
+            time.sleep(1)
+    finally:
+        if membership is not None:
+            # Let the other replicas take over our feeds right away.
+            try:
+                membership.leave()
+            except Exception:
+                logger.warning(
+                    "Failed to leave crawler membership", exc_info=True
+                )
 
 
 if __name__ == "__main__":
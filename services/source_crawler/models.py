@@ -0,0 +1,23 @@
+from sqlalchemy import Column, DateTime, String
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
+
+
+class CrawlerMember(Base):
+    """A running crawler replica; rows with a stale heartbeat are ignored."""
+
+    __tablename__ = "crawler_members"
+
+    member_id = Column(String(128), primary_key=True)
+    heartbeat_at = Column(DateTime, nullable=False, index=True)
+
+
+class SeenUrl(Base):
+    """An article URL already published by some replica."""
+
+    __tablename__ = "crawler_seen_urls"
+
+    # sha1 of the URL, so long links fit a fixed-size key.
+    url_hash = Column(String(40), primary_key=True)
+    created_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,237 @@
+"""Spread feeds across crawler replicas.
+
+Replicas announce themselves with heartbeat rows in ``crawler_members``.
+Every crawl, a replica builds a consistent-hash ring over the live members
+and crawls only the feeds it owns, so adding or removing a replica only
+moves about ``1/N`` of the feeds. Published URLs are claimed in
+``crawler_seen_urls``, which stops a feed that changed hands from being
+published again by its new owner.
+"""
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from common_utils import get_engine, session_scope
+from services.source_crawler.models import Base, CrawlerMember, SeenUrl
+
+ENABLED_ENV_VAR = "CRAWLER_SHARDING"
+MEMBER_ENV_VAR = "CRAWLER_MEMBER_ID"
+TTL_ENV_VAR = "CRAWLER_MEMBER_TTL_SECONDS"
+RETENTION_ENV_VAR = "CRAWLER_SEEN_RETENTION_DAYS"
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(url.encode()).hexdigest()
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+class HashRing:
+    """Consistent-hash ring with ``vnodes`` points per member."""
+
+    def __init__(self, members: Iterable[str], vnodes: int = 64) -> None:
+        self.members = sorted(set(members))
+        points = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(vnodes)
+        )
+        self._keys = [key for key, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+def init_db() -> None:
+    Base.metadata.create_all(bind=get_engine())
+
+
+class Membership:
+    """This replica's heartbeat row and the set of live replicas.
+
+    :meth:`start` heartbeats from a thread of its own, so a crawl that
+    takes longer than ``ttl`` does not drop the replica out of the ring and
+    hand its feeds to the others mid-crawl.
+    """
+
+    def __init__(
+        self,
+        member_id: str,
+        ttl: float = 30.0,
+        clock: Callable[[], datetime] = _utcnow,
+    ) -> None:
+        self.member_id = member_id
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> "Membership":
+        default_id = f"{socket.gethostname()}-{os.getpid()}"
+        return cls(
+            member_id=os.getenv(MEMBER_ENV_VAR, default_id),
+            ttl=float(os.getenv(TTL_ENV_VAR, "30")),
+        )
+
+    def heartbeat(self) -> None:
+        with self._lock:
+            self._write_heartbeat()
+
+    def _write_heartbeat(self) -> None:
+        with session_scope() as db:
+            db.merge(
+                CrawlerMember(
+                    member_id=self.member_id, heartbeat_at=self._clock()
+                )
+            )
+
+    def start(self, interval: Optional[float] = None) -> "Membership":
+        """Heartbeat every ``interval`` seconds (default ``ttl / 3``) on a
+        daemon thread until :meth:`leave`."""
+        interval = interval or max(1.0, self.ttl / 3)
+
+        def beat() -> None:
+            while not self._stopped.wait(interval):
+                try:
+                    with self._lock:
+                        # Checked again here, as leave() may have run.
+                        if not self._stopped.is_set():
+                            self._write_heartbeat()
+                except Exception:
+                    logger.warning("Crawler heartbeat failed", exc_info=True)
+
+        self._stopped.clear()
+        self.heartbeat()
+        threading.Thread(
+            target=beat, name="crawler-heartbeat", daemon=True
+        ).start()
+        return self
+
+    def live_members(self) -> List[str]:
+        cutoff = self._clock() - timedelta(seconds=self.ttl)
+        with session_scope() as db:
+            query = select(CrawlerMember.member_id).where(
+                CrawlerMember.heartbeat_at >= cutoff
+            )
+            members = db.execute(query).scalars().all()
+        # Our own row may not be visible yet; we are alive by definition.
+        return sorted(set(members) | {self.member_id})
+
+    def leave(self) -> None:
+        # Stop the heartbeat thread first, so it cannot write the row back.
+        with self._lock:
+            self._stopped.set()
+            with session_scope() as db:
+                db.execute(
+                    delete(CrawlerMember).where(
+                        CrawlerMember.member_id == self.member_id
+                    )
+                )
+
+
+class FeedSharder:
+    """Pick the feeds this replica owns among the live members."""
+
+    def __init__(self, membership: Membership, vnodes: int = 64) -> None:
+        self.membership = membership
+        self.vnodes = vnodes
+        self._ring: Optional[HashRing] = None
+
+    def assign(self, feeds: Sequence[str]) -> List[str]:
+        self.membership.heartbeat()
+        members = self.membership.live_members()
+        if self._ring is None or self._ring.members != members:
+            logger.info(
+                "Crawler membership changed",
+                extra={
+                    "members": members,
+                    "member_id": self.membership.member_id,
+                },
+            )
+            self._ring = HashRing(members, self.vnodes)
+        me = self.membership.member_id
+        return [feed for feed in feeds if self._ring.owner(feed) == me]
+
+
+class SeenStore:
+    """URLs published by any replica, shared through the database."""
+
+    def __init__(
+        self,
+        retention_days: float = 30.0,
+        clock: Callable[[], datetime] = _utcnow,
+    ) -> None:
+        self.retention_days = retention_days
+        self._clock = clock
+
+    @classmethod
+    def from_env(cls) -> "SeenStore":
+        return cls(retention_days=float(os.getenv(RETENTION_ENV_VAR, "30")))
+
+    def claim(self, urls: Sequence[str]) -> List[str]:
+        """Record ``urls`` as seen and return those nobody had seen before.
+
+        Claims are inserts on the primary key, so when two replicas race for
+        the same URL exactly one of them gets it.
+        """
+        if not urls:
+            return []
+        hashes: Dict[str, str] = {url_hash(url): url for url in urls}
+        with session_scope() as db:
+            query = select(SeenUrl.url_hash).where(
+                SeenUrl.url_hash.in_(hashes)
+            )
+            known = set(db.execute(query).scalars().all())
+        fresh = [h for h in hashes if h not in known]
+        now = self._clock()
+        try:
+            with session_scope() as db:
+                db.add_all(
+                    [SeenUrl(url_hash=h, created_at=now) for h in fresh]
+                )
+            claimed = fresh
+        except IntegrityError:
+            # Another replica claimed some of them meanwhile; go one by one.
+            claimed = []
+            for h in fresh:
+                try:
+                    with session_scope() as db:
+                        db.add(SeenUrl(url_hash=h, created_at=now))
+                    claimed.append(h)
+                except IntegrityError:
+                    pass
+        claimed_urls = {hashes[h] for h in claimed}
+        return [url for url in urls if url in claimed_urls]
+
+    def prune(self) -> int:
+        cutoff = self._clock() - timedelta(days=self.retention_days)
+        with session_scope() as db:
+            result = db.execute(
+                delete(SeenUrl).where(SeenUrl.created_at < cutoff)
+            )
+        return result.rowcount
+
+
+def sharding_enabled() -> bool:
+    return os.getenv(ENABLED_ENV_VAR, "true").lower() in ("1", "true", "yes")
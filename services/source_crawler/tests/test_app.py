@@ -1,9 +1,11 @@
 import logging
+import time
 import types
 
 import pytest
 from common_utils import configure_logging
 import services.source_crawler.app as app
+from common_utils.tracing import parse_traceparent
 from services.source_crawler.app import fetch_and_publish
 
 
@@ -77,6 +79,8 @@ def test_fetch_and_publish_logs_and_skips_on_parse_error(monkeypatch, caplog):
 
 def test_main_initial_run(monkeypatch):
     monkeypatch.setenv(app.FEEDS_ENV_VAR, "http://example.com/feed")
+    monkeypatch.setenv("METRICS_PORT", "0")
+    monkeypatch.setenv("CRAWLER_SHARDING", "false")
     monkeypatch.setenv(app.INTERVAL_ENV_VAR, "1")
 
     dummy_conn = DummyConnection(DummyChannel())
@@ -85,7 +89,8 @@ def test_main_initial_run(monkeypatch):
 
     fetch_called = {"count": 0}
 
-    def fake_fetch(conn, feeds, seen, logger):
+    def fake_fetch(conn, feeds, seen, logger, prioritize=None):
+        assert isinstance(prioritize, app.Prioritizer)
         fetch_called["count"] += 1
         assert feeds == ["http://example.com/feed"]
 
@@ -104,3 +109,70 @@ def test_main_initial_run(monkeypatch):
 
     assert fetch_called["count"] == 1
     assert run_called["count"] == 1
+
+
+def test_fetch_and_publish_passes_feed_language(monkeypatch):
+    logger = configure_logging()
+    published = []
+
+    class RecordingChannel(DummyChannel):
+        def basic_publish(self, exchange, routing_key, body, properties=None):
+            published.append(properties.headers)
+
+    def parse(url):
+        return types.SimpleNamespace(
+            feed={"language": "en-us"},
+            entries=[{"link": "http://example.com/a"}],
+        )
+
+    monkeypatch.setattr("services.source_crawler.app.feedparser.parse", parse)
+    fetch_and_publish(
+        DummyConnection(RecordingChannel()), ["feed"], set(), logger
+    )
+
+    assert published[0]["language"] == "en-us"
+    assert parse_traceparent(published[0]["traceparent"]) is not None
+
+
+def test_fetch_and_publish_routes_entries_to_lanes(monkeypatch):
+    logger = configure_logging()
+    now = 1_700_000_000
+    channel = DummyChannel()
+    prioritize = app.Prioritizer(
+        priority_feeds=["http://wire/feed"],
+        keywords=["Breaking"],
+        clock=lambda: now,
+    )
+
+    def parse(url):
+        if url == "http://wire/feed":
+            return types.SimpleNamespace(entries=[{"link": "http://wire/1"}])
+        return types.SimpleNamespace(
+            entries=[
+                {"link": "http://example.com/a", "title": "BREAKING: quake"},
+                {
+                    "link": "http://example.com/b",
+                    "published_parsed": time.gmtime(now - 3 * 86400),
+                },
+                {
+                    "link": "http://example.com/c",
+                    "published_parsed": time.gmtime(now - 60),
+                },
+            ]
+        )
+
+    monkeypatch.setattr("services.source_crawler.app.feedparser.parse", parse)
+    fetch_and_publish(
+        DummyConnection(channel),
+        ["http://wire/feed", "http://example.com/feed"],
+        set(),
+        logger,
+        prioritize=prioritize,
+    )
+
+    assert channel.messages == [
+        ("url.new.high", b"http://wire/1"),
+        ("url.new.high", b"http://example.com/a"),
+        ("url.new.low", b"http://example.com/b"),
+        ("url.new", b"http://example.com/c"),
+    ]
@@ -0,0 +1,110 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.source_crawler import sharding
+from services.source_crawler.models import Base
+
+
+@pytest.fixture
+def db(monkeypatch, sqlite_db):
+    sqlite_db.create_all(Base.metadata)
+    monkeypatch.setattr(sharding, "session_scope", sqlite_db.session_scope)
+    return sqlite_db.Session
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2024, 1, 1)
+
+    def __call__(self):
+        return self.now
+
+
+FEEDS = [f"http://feeds.example/{i}" for i in range(200)]
+
+
+def test_ring_moves_few_feeds_when_a_member_joins():
+    two = sharding.HashRing(["a", "b"])
+    three = sharding.HashRing(["a", "b", "c"])
+
+    owners = {feed: two.owner(feed) for feed in FEEDS}
+    assert 60 < sum(1 for owner in owners.values() if owner == "a") < 140
+    moved = [feed for feed in FEEDS if three.owner(feed) != owners[feed]]
+    # Only feeds taken over by the new member change hands.
+    assert all(three.owner(feed) == "c" for feed in moved)
+    assert 30 < len(moved) < 110
+
+
+def test_replicas_split_feeds_and_take_over_when_one_leaves(db):
+    clock = Clock()
+    a = sharding.FeedSharder(sharding.Membership("a", ttl=30, clock=clock))
+    b = sharding.FeedSharder(sharding.Membership("b", ttl=30, clock=clock))
+
+    a.membership.heartbeat()
+    mine_b = b.assign(FEEDS)
+    mine_a = a.assign(FEEDS)
+    assert set(mine_a).isdisjoint(mine_b)
+    assert sorted(mine_a + mine_b) == sorted(FEEDS)
+
+    b.membership.leave()
+    assert a.assign(FEEDS) == FEEDS
+
+    # A replica that stops heartbeating drops out after the TTL.
+    b.membership.heartbeat()
+    assert len(a.assign(FEEDS)) < len(FEEDS)
+    clock.now += timedelta(seconds=31)
+    assert a.assign(FEEDS) == FEEDS
+
+
+def test_heartbeat_thread_keeps_a_replica_through_a_long_crawl(
+    monkeypatch, sqlite_file_db
+):
+    sqlite_file_db.create_all(Base.metadata)
+    monkeypatch.setattr(
+        sharding, "session_scope", sqlite_file_db.session_scope
+    )
+    a = sharding.Membership("a", ttl=0.3).start(interval=0.05)
+    b = sharding.FeedSharder(sharding.Membership("b", ttl=0.3))
+    mine = b.assign(FEEDS)
+
+    # A crawl on a's main thread that runs for over twice the TTL.
+    time.sleep(0.7)
+    assert b.assign(FEEDS) == mine
+
+    a.leave()
+    time.sleep(0.4)
+    assert b.assign(FEEDS) == FEEDS
+
+
+def test_seen_store_claims_each_url_once(db):
+    clock = Clock()
+    store = sharding.SeenStore(retention_days=1, clock=clock)
+
+    urls = ["http://x/1", "http://x/2"]
+    assert store.claim(urls) == urls
+    assert store.claim(["http://x/2", "http://x/3"]) == ["http://x/3"]
+
+    clock.now += timedelta(days=2)
+    assert store.prune() == 3
+    assert store.claim(["http://x/1"]) == ["http://x/1"]
+
+
+def test_claim_falls_back_to_single_inserts_on_race(db):
+    def racing_clock():
+        # Another replica claims x/1 between our lookup and our insert.
+        with db() as session:
+            key = sharding.url_hash("http://x/1")
+            if not session.get(sharding.SeenUrl, key):
+                session.add(
+                    sharding.SeenUrl(
+                        url_hash=key, created_at=datetime(2024, 1, 1)
+                    )
+                )
+                session.commit()
+        return datetime(2024, 1, 1)
+
+    store = sharding.SeenStore(clock=racing_clock)
+
+    assert store.claim(["http://x/1", "http://x/2"]) == ["http://x/2"]
@@ -1,9 +1,40 @@
+import asyncio
+import calendar
+import functools
 import json
 import os
 import threading
+import time
 
-from common_utils import configure_logging, decrypt_env_var, get_rabbitmq_connection
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
+from common_utils import (
+    configure_logging,
+    decrypt_env_var,
+    get_rabbitmq_connection,
+    session_scope,
+)
+from common_utils import lanes
+from common_utils.health import (
+    Health,
+    broker_check,
+    database_check,
+    watch_queues,
+)
+from common_utils.metrics import InstrumentedChannel, start_metrics_server
+from common_utils.profiling import configure_profiling, timed
+from common_utils.send_scheduler import PRIORITY_ADMIN, SendScheduler
+from common_utils.tracing import (
+    configure_tracing,
+    extract,
+    get_tracer,
+    inject,
+    parse_traceparent,
+)
+from common_utils.telegram_payload import render_article, render_digest
+from services.core_engine import status
+from services.core_engine.models import Article
+from sqlalchemy import select
+import pika
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     Application,
     CallbackQueryHandler,
@@ -16,8 +47,218 @@ QUEUE_INPUT = "article.processed"
 QUEUE_APPROVED = "article.approved"
 QUEUE_REJECTED = "article.rejected"
 
+PREFETCH_ENV_VAR = "ADMIN_PREFETCH"
+
+APPROVE_ALL = "approve_all"
+
 ADMIN_IDS: set[int] = set()
+# Articles whose approval buttons are still showing, per admin:
+# admin id -> {article id: message id}. Only touched on the bot's loop.
+VISIBLE: dict[int, dict[int, int]] = {}
+
+
+def approval_keyboard(article_id) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(
+                    "Approve", callback_data=f"approve:{article_id}"
+                ),
+                InlineKeyboardButton(
+                    "Reject", callback_data=f"reject:{article_id}"
+                ),
+            ],
+            [
+                InlineKeyboardButton(
+                    "Approve all visible", callback_data=APPROVE_ALL
+                )
+            ],
+        ]
+    )
+
+
+async def notify_admins(
+    bot,
+    admin_ids,
+    text,
+    reply_markup,
+    scheduler: SendScheduler,
+    logger,
+    article_id=None,
+) -> None:
+    """Send ``text`` to every admin concurrently.
+
+    Sends go through ``scheduler`` in the admin lane, which keeps them
+    within Telegram's limits, and a failure for one chat is logged without
+    affecting the others. With an ``article_id`` each delivered message is
+    remembered in ``VISIBLE`` for "approve all visible".
+    """
+
+    async def send(admin_id: int) -> None:
+        try:
+            sent = await scheduler.send(
+                bot.send_message,
+                admin_id,
+                PRIORITY_ADMIN,
+                text=text,
+                reply_markup=reply_markup,
+            )
+        except Exception:
+            logger.exception(
+                "Failed to notify admin", extra={"admin_id": admin_id}
+            )
+            return
+        if article_id is not None:
+            message_id = getattr(sent, "message_id", None)
+            VISIBLE.setdefault(admin_id, {})[article_id] = message_id
+
+    await asyncio.gather(*(send(admin_id) for admin_id in admin_ids))
+
+
+def approved_message(article_id: int) -> dict:
+    """Build the ``article.approved`` message with the rendered payload.
+
+    Rendering once here means the publisher does not touch the database.
+    """
+    with session_scope() as db:
+        article = db.get(Article, article_id)
+        if article is None:
+            return {"id": article_id}
+        return {
+            "id": article_id,
+            "payload": render_article(article),
+            "summary": article.summary,
+            "source_url": article.source_url,
+        }
+
+
+def approved_batch_message(article_ids: list[int]) -> dict:
+    """Build the ``article.approved`` digest message for ``article_ids``."""
+    with session_scope() as db:
+        articles = db.execute(
+            select(Article)
+            .where(Article.id.in_(article_ids))
+            .order_by(Article.id)
+        ).scalars()
+        payload = render_digest((a.summary, a.source_url) for a in articles)
+    return {"ids": article_ids, "payload": payload}
+
+
+def article_traces(article_ids: list[int]) -> dict:
+    """Trace context, creation time and lane stored for ``article_ids``."""
+    with session_scope() as db:
+        rows = db.execute(
+            select(
+                Article.id,
+                Article.traceparent,
+                Article.created_at,
+                Article.priority,
+            ).where(Article.id.in_(article_ids))
+        ).all()
+    return {
+        row.id: (
+            parse_traceparent(row.traceparent),
+            row.created_at,
+            row.priority,
+        )
+        for row in rows
+    }
+
+
+@timed("forward_decision")
+def forward_decision(action: str, article_id: str) -> None:
+    """Publish an admin's approve/reject decision to RabbitMQ.
+
+    ``article_id`` is a comma-separated list for ``approve_all``. The
+    decision continues the article's trace; a batch approval starts a new
+    trace linked to each article's. Approvals go to the lane of
+    ``article.approved`` the article came in on; a batch takes the most
+    urgent lane among its articles.
+    """
+    ids = [int(x) for x in article_id.split(",")]
+    traces = article_traces(ids)
+    created_at = None
+    if action == APPROVE_ALL:
+        queue_name = QUEUE_APPROVED
+        parent = None
+        links = [context for context, _, _ in traces.values() if context]
+        found = {lanes.normalize_lane(lane) for _, _, lane in traces.values()}
+        lane = next(
+            (lane for lane in lanes.LANES if lane in found), lanes.NORMAL
+        )
+        body = json.dumps(approved_batch_message(ids)).encode()
+    else:
+        parent, created_at, lane = traces.get(ids[0], (None, None, None))
+        lane = lanes.normalize_lane(lane)
+        links = None
+        if action == "approve":
+            queue_name = QUEUE_APPROVED
+            body = json.dumps(approved_message(ids[0])).encode()
+        else:
+            queue_name = QUEUE_REJECTED
+            body = article_id.encode()
+    with get_tracer().start_span(
+        f"bot.{action}",
+        parent=parent,
+        links=links,
+        attributes={"article.ids": article_id},
+    ) as span:
+        if created_at is not None:
+            # created_at is a naive UTC timestamp.
+            waited = time.time() - calendar.timegm(created_at.timetuple())
+            span.set_attribute("approval.wait_seconds", int(waited))
+        conn = get_rabbitmq_connection()
+        channel = InstrumentedChannel(conn.channel())
+        if queue_name == QUEUE_APPROVED:
+            queue_name = lanes.lane_queue(QUEUE_APPROVED, lane)
+        channel.queue_declare(queue=queue_name, durable=True)
+        channel.basic_publish(
+            exchange="",
+            routing_key=queue_name,
+            body=body,
+            properties=pika.BasicProperties(
+                headers=inject({lanes.HEADER: lane}),
+                timestamp=int(time.time()),
+            ),
+        )
+        channel.close()
+        conn.close()
+
+
+DECISIONS = {
+    "approve": status.APPROVED,
+    APPROVE_ALL: status.APPROVED,
+    "reject": status.REJECTED,
+}
+
 
+def record_decision(action: str, article_ids: list[int]) -> list[int]:
+    """Move the articles to the decided state and return those that moved.
+
+    Articles another admin (or an earlier click) already decided are left
+    out, so each decision is forwarded once.
+    """
+    with session_scope() as db:
+        return status.transition_many(db, article_ids, DECISIONS[action])
+
+
+def undo_approval(article_ids: list[int]) -> None:
+    with session_scope() as db:
+        status.transition_many(db, article_ids, status.PENDING_APPROVAL)
+
+
+def decide(action: str, article_ids: list[int]) -> list[int]:
+    """Record and forward a decision; return the ids it applied to."""
+    decided = record_decision(action, article_ids)
+    if decided:
+        try:
+            forward_decision(action, ",".join(map(str, decided)))
+        except Exception:
+            if DECISIONS[action] == status.APPROVED:
+                # Let the admin approve again rather than lose the article.
+                undo_approval(decided)
+            raise
+    return decided
 
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -32,15 +273,51 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     await query.answer()
     data = query.data or ""
-    action, article_id = data.split(":", 1)
-    queue_name = QUEUE_APPROVED if action == "approve" else QUEUE_REJECTED
-    conn = get_rabbitmq_connection()
-    channel = conn.channel()
-    channel.queue_declare(queue=queue_name, durable=True)
-    channel.basic_publish(exchange="", routing_key=queue_name, body=article_id.encode())
-    channel.close()
-    conn.close()
+    if data == APPROVE_ALL:
+        article_ids = sorted(VISIBLE.get(user.id, {}))
+        if not article_ids:
+            return
+        action = APPROVE_ALL
+    else:
+        action, article_id = data.split(":", 1)
+        article_ids = [int(article_id)]
+    # DB and broker calls block, so keep them off the event loop.
+    await asyncio.to_thread(decide, action, article_ids)
+    # Also when nothing was decided: the buttons are stale.
     await query.edit_message_reply_markup(reply_markup=None)
+    await retire_buttons(
+        context.bot, article_ids, context.bot_data.get("scheduler")
+    )
+
+
+async def retire_buttons(bot, article_ids, scheduler=None) -> None:
+    """Forget decided articles and remove their buttons for every admin."""
+    edits = []
+    for admin_id, visible in VISIBLE.items():
+        for article_id in article_ids:
+            message_id = visible.pop(article_id, None)
+            if message_id is not None:
+                edits.append((admin_id, message_id))
+
+    async def clear(admin_id: int, message_id: int) -> None:
+        kwargs = {"message_id": message_id, "reply_markup": None}
+        try:
+            if scheduler is None:
+                await bot.edit_message_reply_markup(chat_id=admin_id, **kwargs)
+            else:
+                await scheduler.send(
+                    bot.edit_message_reply_markup,
+                    admin_id,
+                    PRIORITY_ADMIN,
+                    **kwargs,
+                )
+        except Exception:
+            # Already edited (e.g. the message the admin clicked) or deleted.
+            pass
+
+    await asyncio.gather(
+        *(clear(admin_id, message_id) for admin_id, message_id in edits)
+    )
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -54,6 +331,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 def main() -> None:
     logger = configure_logging()
     logger.info("Telegram bot service starting")
+    start_metrics_server()
+    configure_tracing("telegram_bot")
+    configure_profiling("telegram_bot")
 
     token = decrypt_env_var("TELEGRAM_BOT_TOKEN")
     admin_ids_raw = os.getenv("TELEGRAM_ADMIN_IDS", "")
@@ -69,26 +349,47 @@ def main() -> None:
     ADMIN_IDS = {int(x) for x in admin_ids_raw.split(",") if x.strip()}
 
 
-    application = Application.builder().token(token).build()
+    loop_ready = threading.Event()
+    app_loop: dict = {}
+
+    async def capture_loop(app: Application) -> None:
+        app_loop["loop"] = asyncio.get_running_loop()
+        loop_ready.set()
+
+    application = (
+        Application.builder().token(token).post_init(capture_loop).build()
+    )
     application.add_handler(CallbackQueryHandler(handle_callback))
     application.add_handler(MessageHandler(filters.ALL, handle_message))
 
     def run_webhook() -> None:
+        # The application owns its event loop in this thread; the RabbitMQ
+        # consumer below hands notifications to it.
+        asyncio.set_event_loop(asyncio.new_event_loop())
         application.run_webhook(
             listen="0.0.0.0",
             port=int(os.getenv("PORT", "8080")),
             webhook_url=webhook_url,
             secret_token=webhook_secret,
+            stop_signals=None,
         )
 
     thread = threading.Thread(target=run_webhook, daemon=True)
     thread.start()
-
-    bot = Bot(token=token)
+    loop_ready.wait()
+    loop = app_loop["loop"]
+    scheduler = SendScheduler()
+    scheduler.start(loop)
+    application.bot_data["scheduler"] = scheduler
 
     conn = get_rabbitmq_connection()
-    channel = conn.channel()
+    channel = InstrumentedChannel(conn.channel())
     channel.queue_declare(queue=QUEUE_INPUT, durable=True)
+    health = Health.from_env().register()
+    health.add_check("database", database_check)
+    health.add_check("broker", broker_check(conn))
+    watch_queues(conn, [QUEUE_INPUT], health)
+    channel.basic_qos(prefetch_count=int(os.getenv(PREFETCH_ENV_VAR, "16")))
 
     def callback(ch, method, properties, body):
         try:
@@ -97,25 +398,42 @@ def main() -> None:
             logger.warning("Received invalid JSON", extra={"body": body})
             ch.basic_ack(delivery_tag=method.delivery_tag)
             return
-        article_id = str(message.get("id", ""))
+        article_id = message.get("id")
         summary = message.get("summary", "")
-        keyboard = InlineKeyboardMarkup(
-            [
-                [
-                    InlineKeyboardButton("Approve", callback_data=f"approve:{article_id}"),
-                    InlineKeyboardButton("Reject", callback_data=f"reject:{article_id}"),
-                ]
-            ]
-        )
-        for admin_id in ADMIN_IDS:
-            bot.send_message(chat_id=admin_id, text=summary, reply_markup=keyboard)
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        keyboard = approval_keyboard(article_id)
+        parent = extract(getattr(properties, "headers", None))
+
+        async def notify():
+            with get_tracer().start_span(
+                "bot.notify_admins",
+                parent=parent,
+                attributes={"article.id": article_id},
+            ):
+                await notify_admins(
+                    application.bot,
+                    ADMIN_IDS,
+                    summary,
+                    keyboard,
+                    scheduler,
+                    logger,
+                    article_id,
+                )
+
+        health.beat()
+        health.started()
+        future = asyncio.run_coroutine_threadsafe(notify(), loop)
+        future.add_done_callback(lambda _: health.finished())
+        # pika channels are not thread-safe, so the ack is handed back to the
+        # connection's own thread once every admin has been tried.
+        ack = functools.partial(ch.basic_ack, delivery_tag=method.delivery_tag)
+        future.add_done_callback(lambda _: conn.add_callback_threadsafe(ack))
 
     channel.basic_consume(queue=QUEUE_INPUT, on_message_callback=callback)
 
     try:
         channel.start_consuming()
     finally:
+        scheduler.stop()
         channel.close()
         conn.close()
 
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+
+import services.telegram_bot.app as app
+from common_utils.send_scheduler import SendScheduler
+
+
+class SlowBot:
+    def __init__(self):
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if chat_id == 1:
+                raise RuntimeError("chat gone")
+            await asyncio.sleep(0.5 if chat_id == 2 else 0.01)
+            self.sent.append(chat_id)
+        finally:
+            self.in_flight -= 1
+
+
+async def test_notify_admins_sends_concurrently_and_isolates_failures():
+    bot = SlowBot()
+    scheduler = SendScheduler()
+    scheduler.start(asyncio.get_running_loop())
+    logger = logging.getLogger("test")
+
+    await app.notify_admins(
+        bot, [1, 2, 3, 4, 5], "summary", None, scheduler, logger
+    )
+    scheduler.stop()
+
+    assert sorted(bot.sent) == [2, 3, 4, 5]
+    # The slow chat does not hold up the rest: it finishes last.
+    assert bot.sent[-1] == 2
+    assert bot.max_in_flight > 1
+
+
+def test_approved_message_carries_rendered_payload(monkeypatch, sqlite_db):
+    from services.core_engine.models import Article, Base
+
+    sqlite_db.create_all(Base.metadata)
+    with sqlite_db.session_scope() as session:
+        session.add(
+            Article(
+                source_url="http://example.com",
+                content="body",
+                translated_content="translated",
+            )
+        )
+    monkeypatch.setattr(app, "session_scope", sqlite_db.session_scope)
+
+    assert app.approved_message(1) == {
+        "id": 1,
+        "payload": {"parts": ["translated"], "parse_mode": None},
+        "summary": None,
+        "source_url": "http://example.com",
+    }
+    assert app.approved_message(2) == {"id": 2}
+
+
+async def test_approve_all_forwards_visible_articles_and_clears_buttons(
+    monkeypatch,
+):
+    from types import SimpleNamespace
+
+    class Bot:
+        def __init__(self):
+            self.next_id = 100
+            self.cleared = []
+
+        async def send_message(self, chat_id, text, reply_markup=None):
+            self.next_id += 1
+            return SimpleNamespace(message_id=self.next_id)
+
+        async def edit_message_reply_markup(
+            self, chat_id, message_id, reply_markup=None
+        ):
+            self.cleared.append((chat_id, message_id))
+
+    monkeypatch.setattr(app, "VISIBLE", {})
+    monkeypatch.setattr(app, "ADMIN_IDS", {1, 2})
+    bot = Bot()
+    scheduler = SendScheduler()
+    scheduler.start(asyncio.get_running_loop())
+    logger = logging.getLogger("test")
+    for article_id in (7, 3):
+        await app.notify_admins(
+            bot, [1, 2], "s", None, scheduler, logger, article_id
+        )
+    scheduler.stop()
+
+    forwarded = []
+    monkeypatch.setattr(app, "record_decision", lambda action, ids: ids)
+    monkeypatch.setattr(
+        app,
+        "forward_decision",
+        lambda action, ids: forwarded.append((action, ids)),
+    )
+
+    async def answer():
+        pass
+
+    async def edit_message_reply_markup(reply_markup=None):
+        pass
+
+    query = SimpleNamespace(
+        data=app.APPROVE_ALL,
+        answer=answer,
+        edit_message_reply_markup=edit_message_reply_markup,
+    )
+    update = SimpleNamespace(
+        callback_query=query, effective_user=SimpleNamespace(id=1)
+    )
+    context = SimpleNamespace(bot=bot, bot_data={})
+
+    await app.handle_callback(update, context)
+
+    assert forwarded == [(app.APPROVE_ALL, "3,7")]
+    assert app.VISIBLE == {1: {}, 2: {}}
+    assert len(bot.cleared) == 4
+
+
+def test_decide_forwards_each_decision_once(monkeypatch, sqlite_db):
+    import pytest
+
+    from services.core_engine import status
+    from services.core_engine.models import Article, Base
+
+    sqlite_db.create_all(Base.metadata)
+    with sqlite_db.session_scope() as session:
+        session.add_all(
+            Article(source_url=f"http://e.com/{i}", content="c")
+            for i in range(3)
+        )
+    monkeypatch.setattr(app, "session_scope", sqlite_db.session_scope)
+    forwarded = []
+    monkeypatch.setattr(
+        app,
+        "forward_decision",
+        lambda action, ids: forwarded.append((action, ids)),
+    )
+
+    assert app.decide("approve", [1]) == [1]
+    # A second click, or another admin approving everything, skips article 1.
+    assert app.decide("approve", [1]) == []
+    assert app.decide(app.APPROVE_ALL, [1, 2]) == [2]
+    assert forwarded == [("approve", "1"), (app.APPROVE_ALL, "2")]
+
+    def broker_down(action, ids):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(app, "forward_decision", broker_down)
+    with pytest.raises(ConnectionError):
+        app.decide("approve", [3])
+
+    with sqlite_db.Session() as session:
+        states = dict(session.query(Article.id, Article.status))
+    assert states == {
+        1: status.APPROVED,
+        2: status.APPROVED,
+        3: status.PENDING_APPROVAL,
+    }